@@ -0,0 +1,481 @@
+#-----------------------------------------------------------------------
+# BENCHMARKS OF BOTH WEBAPPS: python benchmark.py
+'''
+Runs both webapps under plain CPython with the stand-in of js_stub and
+measures
+- the frame update of webapp_1 against the grid size, per cell and instanced
+- the frames and the latency of webapp_1 while its sliders are scrubbed
+- the frustum culling of chunks against the cells, and a grid at the largest size
+- the expansion and the turtle of the L-system of webapp_2 against the depth
+- the crossings of the javascript boundary per frame, per cell and per tree
+- the frames it takes to build the forest of webapp_2 and the longest one
+- the branches the level of detail of webapp_2 draws against the distance
+- building the forest and a template against loading their snapshots
+- the time from main() to the first frame and the scripts of both pages
+Every number that has a limit in THRESHOLDS is checked, the script exits
+with status 1 if one of them is exceeded. The crossings are exact, the times
+depend on the machine and have generous limits.
+Every benchmark starts the pages it needs with start_page() and can run on
+its own, tests/test_benchmark.py runs each of them as a test under pytest.
+'''
+import os
+import re
+import sys
+import time
+import numpy as np
+import js_stub
+js_stub.install()
+from js_stub import recorder, run_frames
+from pyodide.ffi import to_js
+import webapp_1
+import webapp_2
+from snapshot import SnapshotCache, MemoryStore
+from spatial_chunks import ChunkCuller, tile_chunks, chunk_order, chunk_spheres
+from lsystem import TREE, system, turtle, turtle_segments, turtle_vertices, turtle_bounds, branch_count
+
+GRID_SIZES = (1, 10, 30, 100)
+CULL_SIZES = (100, 300, 1000)
+DEPTHS = range(1, 9)
+# fixed limits, a run above one of them is a regression
+THRESHOLDS = {
+    # a frame without a change must not touch the scene
+    "idle crossings": 20,
+    # a new rotation in the instanced mode is one upload per chunk on screen,
+    # at any grid size; the crossings of an idle frame are not counted
+    "instanced transform crossings per chunk": 5,
+    "per cell transform crossings per cell": 12,
+    "per cell transform ms 10x10": 50,
+    "instanced transform ms 100x100": 50,
+    "per cell layout ms 10x10": 200,
+    # scrubbing only builds the latest values, in steps of a few milliseconds;
+    # the per cell mode still moves every cell in the frame it commits
+    "per cell scrub max frame ms": 50,
+    "instanced scrub max frame ms": 50,
+    "per cell scrub latency ms": 100,
+    "instanced scrub latency ms": 50,
+    # one numpy test of all chunks per frame, not one per cell
+    "cull ms 1000x1000": 5,
+    # the cells of the chunks off screen are not moved in the frame
+    "instanced transform ms 300x300": 50,
+    "lsystem ms depth 7": 1000,
+    "stream ms depth 7": 1000,
+    # at least a million symbols per second
+    "array ns per symbol depth 8": 1000,
+    # one geometry, one transfer and one object per forest
+    "tree crossings": 10,
+    # repeated trees and subtrees are uploaded once
+    "instanced forest kB": 100,
+    # the forest is built over several frames, none of them may stall
+    "buffer forest max frame ms": 50,
+    # a new level of detail only moves draw ranges, one call per tree
+    "tree lod crossings": 40,
+    # a forest that was built before is uploaded in one frame
+    "snapshot forest frames": 1,
+    "snapshot forest ms": 200,
+    # three.js and OrbitControls, each once, the rest is loaded when needed
+    "duplicate scripts": 0,
+    "scripts before python": 3,
+    "webapp_1 first frame ms": 2000,
+    "webapp_2 first frame ms": 2000,
+}
+
+
+'''
+MEASURE
+runs a function and counts the crossings it makes
+parameters: function: without arguments
+returns: milliseconds and crossings'''
+def measure(function):
+    recorder.reset()
+    start = time.perf_counter()
+    function()
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, recorder.total()
+
+
+# the milliseconds from main() to the first frame of the started pages
+_first_frame_ms = {}
+
+'''
+START_PAGE
+runs main() of a webapp and its first frame, once per process
+parameters: webapp: webapp_1 or webapp_2
+returns: milliseconds from main() to the first frame'''
+def start_page(webapp):
+    if webapp.__name__ not in _first_frame_ms:
+        start = time.perf_counter()
+        webapp.main()
+        if webapp is webapp_1:
+            # a release of something that is not tracked frees nothing, stop there
+            webapp_1.resources.strict = True
+        run_frames(1)
+        _first_frame_ms[webapp.__name__] = (time.perf_counter() - start) * 1000
+    return _first_frame_ms[webapp.__name__]
+
+
+# the frames until the grid shows the changes
+def frame_after(*changes):
+    def run():
+        for field, value in changes:
+            webapp_1.geom_params.set(field, value)
+        webapp_1.scheduler.invalidate()
+        run_frames(1)
+        while webapp_1.rebuild.busy:
+            run_frames(1)
+    return run
+
+
+# milliseconds, crossings and frames until the grid shows the changes
+def measure_frames(*changes):
+    first_frame = webapp_1.profiler.frame_count
+    ms, calls = measure(frame_after(*changes))
+    return ms, calls, webapp_1.profiler.frame_count - first_frame
+
+
+'''
+BENCHMARK_GRID
+frame update of webapp_1 after a new grid size (layout), a new rotation
+(transform) and without a change (idle)
+returns: dictionary name -> value'''
+def benchmark_grid():
+    results = {}
+    results["webapp_1 first frame ms"] = start_page(webapp_1)
+    print("first frame {:.2f} ms after main()\n".format(results["webapp_1 first frame ms"]))
+    print("{:<10}{:>7}{:>13}{:>11}{:>16}{:>11}{:>12}".format(
+        "mode", "grid", "layout ms", "crossings", "transform ms", "crossings", "idle calls"))
+    for instanced in (False, True):
+        mode = "instanced" if instanced else "per cell"
+        frame_after(("x", 1), ("y", 1))()
+        webapp_1.set_instanced(instanced)
+        run_frames(1)
+        # the per cell mode only draws grids up to PER_CELL_MAX
+        sizes = [size for size in GRID_SIZES if instanced or size <= webapp_1.PER_CELL_MAX]
+        for size in sizes:
+            cells = size * (size + 1)
+            layout_ms, layout_calls, _ = measure_frames(("x", size), ("y", size))
+            # best of three rotations, the first one may still allocate
+            transforms = [measure_frames(("rotation_x", angle)) for angle in (10, 20, 30)]
+            transform_ms = min(ms for ms, _, _ in transforms)
+            _, idle_calls, _ = measure_frames()
+            # a rebuild that took more frames also has the crossings of an
+            # idle frame more than once
+            _, transform_calls, frames = transforms[-1]
+            transform_calls -= idle_calls * (frames - 1)
+            print("{:<10}{:>7}{:>13.2f}{:>11}{:>16.2f}{:>11}{:>12}".format(
+                mode, "{0}x{0}".format(size), layout_ms, layout_calls, transform_ms, transform_calls, idle_calls))
+
+            results["idle crossings"] = max(results.get("idle crossings", 0), idle_calls)
+            if instanced:
+                chunks = max(webapp_1.culler.visible_count, 1)
+                results["instanced transform crossings per chunk"] = max(
+                    results.get("instanced transform crossings per chunk", 0), (transform_calls - idle_calls) / chunks)
+            else:
+                results["per cell transform crossings per cell"] = max(
+                    results.get("per cell transform crossings per cell", 0), (transform_calls - idle_calls) / cells)
+            if size == sizes[-1]:
+                results[mode + " transform ms {0}x{0}".format(size)] = transform_ms
+                results[mode + " layout ms {0}x{0}".format(size)] = layout_ms
+    return results
+
+
+'''
+BENCHMARK_SCRUB
+the grid size and the rotation sliders of webapp_1 scrubbed with several
+values per frame, then released. Only the latest values are built, the
+rebuilds that were overtaken are cancelled.
+returns: dictionary name -> value'''
+def benchmark_scrub():
+    results = {}
+    start_page(webapp_1)
+    print("\n{:<10}{:>8}{:>9}{:>11}{:>11}{:>16}{:>13}{:>9}".format(
+        "mode", "inputs", "started", "cancelled", "completed", "max frame ms", "latency ms", "frames"))
+    for instanced in (False, True):
+        # the per cell mode is scrubbed within its largest grid
+        low, high = (30, 61) if instanced else (1, webapp_1.PER_CELL_MAX)
+        frame_after(("x", low), ("y", low), ("rotation_x", 0))()
+        webapp_1.set_instanced(instanced)
+        frame_after()()
+        rebuild = webapp_1.rebuild
+        started, cancelled, completed = rebuild.started, rebuild.cancelled, rebuild.completed
+        first_frame = webapp_1.profiler.frame_count
+        inputs = 0
+        for frame in range(30):
+            # a drag delivers a few values between two frames
+            for value in range(3):
+                size = low + (frame + value) % (high - low + 1)
+                for field, value in (("x", size), ("y", size), ("rotation_x", 3 * size)):
+                    webapp_1.geom_params.set(field, value)
+                    rebuild.request()
+                    inputs += 1
+            webapp_1.scheduler.invalidate()
+            run_frames(1)
+        while rebuild.busy:
+            run_frames(1)
+        frames = list(webapp_1.profiler.frames)[first_frame - webapp_1.profiler.frame_count:]
+        max_frame_ms = max(frame["duration"] for frame in frames) * 1000
+        mode = "instanced" if instanced else "per cell"
+        print("{:<10}{:>8}{:>9}{:>11}{:>11}{:>16.2f}{:>13.2f}{:>9}".format(
+            mode, inputs, rebuild.started - started, rebuild.cancelled - cancelled,
+            rebuild.completed - completed, max_frame_ms, rebuild.latency_ms, rebuild.latency_frames))
+        if webapp_1.cell_keys != webapp_1.cell_indices(size, size) and not instanced:
+            raise AssertionError("the grid does not show the last values")
+        results[mode + " scrub max frame ms"] = max_frame_ms
+        results[mode + " scrub latency ms"] = rebuild.latency_ms
+    return results
+
+
+'''
+BENCHMARK_CULLING
+the culling of the chunks of a grid of cells against the grid size, and
+webapp_1 at the largest size of its sliders with the camera inside the grid
+returns: dictionary name -> value'''
+def benchmark_culling():
+    results = {}
+    start_page(webapp_1)
+    print("\n{:<11}{:>9}{:>8}{:>10}{:>9}".format("grid", "cells", "chunks", "visible", "cull ms"))
+    # the camera moves in every frame, every frame tests all chunks
+    camera = js_stub.THREE.PerspectiveCamera.new(75, 16 / 9, 0.1, 1000)
+    views = []
+    for frame in range(10):
+        camera.position.z = 50 + frame
+        camera.updateMatrixWorld()
+        views.append(js_stub.THREE.Matrix4.new().multiplyMatrices(
+            camera.projectionMatrix, camera.matrixWorldInverse).elements.to_py())
+    for size in CULL_SIZES:
+        indices = np.indices((size, size)).reshape(2, -1).T
+        keys, chunks = tile_chunks(indices, webapp_1.CHUNK_CELLS)
+        order, starts = chunk_order(chunks, len(keys))
+        centers = np.column_stack((indices * 2.0 - size, np.zeros(len(indices))))
+        culler = ChunkCuller()
+        culler.set_spheres(*chunk_spheres(centers[order], 1.0, starts))
+        start = time.perf_counter()
+        for elements in views:
+            culler.update(elements)
+        cull_ms = (time.perf_counter() - start) * 1000 / len(views)
+        print("{:<11}{:>9}{:>8}{:>10}{:>9.3f}".format(
+            "{0}x{0}".format(size), len(indices), len(culler), culler.visible_count, cull_ms))
+        results["cull ms {0}x{0}".format(size)] = cull_ms
+    webapp_1.set_instanced(True)
+    frame_after(("x", 300), ("y", 300))()
+    transform_ms = min(measure(frame_after(("rotation_x", angle)))[0] for angle in (10, 20, 30))
+    print("instanced 300x300: {}, transform {:.2f} ms".format(webapp_1.culler.report(), transform_ms))
+    results["instanced transform ms 300x300"] = transform_ms
+    frame_after(("x", 10), ("y", 10), ("rotation_x", 0))()
+    return results
+
+
+'''
+BENCHMARK_LSYSTEM
+expansion of the axiom and the turtle against the depth, and the turtle
+reading the symbols from LSystem.stream() instead of the expanded string and
+the array turtle writing into a buffer that is allocated up front.
+The length and the bounds of the tree are also computed from the rules alone.
+returns: dictionary name -> value'''
+def benchmark_lsystem():
+    results = {}
+    print("\n{:<7}{:>10}{:>11}{:>13}{:>11}{:>11}{:>10}{:>13}{:>13}".format(
+        "depth", "symbols", "branches", "expand ms", "turtle ms", "stream ms", "array ms",
+        "symbols/s", "analytic ms"))
+    for depth in DEPTHS:
+        start = time.perf_counter()
+        axiom = system(0, depth, "d")
+        expand_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        segments = turtle_segments(axiom, (0, -20, 0))
+        turtle_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for _ in turtle(TREE.stream("d", depth), (0, -20, 0)):
+            pass
+        stream_ms = (time.perf_counter() - start) * 1000
+        buffer = np.empty((2 * branch_count("d", depth), 3), dtype=np.float32)
+        start = time.perf_counter()
+        turtle_vertices(axiom, (0, -20, 0), buffer)
+        array_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        length = TREE.length("d", depth)
+        turtle_bounds("d", depth)
+        analytic_ms = (time.perf_counter() - start) * 1000
+        if length != len(axiom):
+            raise AssertionError("analytic length {} != {}".format(length, len(axiom)))
+        rate = len(axiom) / max(array_ms, 1e-3) * 1000
+        print("{:<7}{:>10}{:>11}{:>13.2f}{:>11.2f}{:>11.2f}{:>10.2f}{:>13.2e}{:>13.2f}".format(
+            depth, len(axiom), len(segments), expand_ms, turtle_ms, stream_ms, array_ms, rate, analytic_ms))
+        results["lsystem ms depth {}".format(depth)] = expand_ms + turtle_ms
+        results["stream ms depth {}".format(depth)] = stream_ms
+        results["array ns per symbol depth {}".format(depth)] = array_ms * 1e6 / len(axiom)
+    return results
+
+
+'''
+BENCHMARK_TREES
+crossings of webapp_2 for drawing one tree against the depth, the branches
+are one buffer, so the crossings must not grow with the tree
+returns: dictionary name -> value'''
+def benchmark_trees():
+    results = {}
+    results["webapp_2 first frame ms"] = start_page(webapp_2)
+    print("\nfirst frame {:.2f} ms after main()".format(results["webapp_2 first frame ms"]))
+    print("\n{:<7}{:>11}{:>11}{:>10}".format("depth", "branches", "crossings", "ms"))
+    for depth in range(1, 8):
+        branches = branch_count("d", depth)
+        axiom = TREE.expand("d", depth)
+        trees = []
+        ms, calls = measure(lambda: trees.append(draw_tree(axiom, (0, -20, 0))))
+        webapp_2.scene.remove(trees[0])
+        print("{:<7}{:>11}{:>11}{:>10.2f}".format(depth, branches, calls, ms))
+        results["tree crossings"] = max(results.get("tree crossings", 0), calls)
+
+    # the forest of main(), as one buffer and as instanced subtrees, built
+    # over as many frames as it takes
+    print("\n{:<11}{:>10}{:>11}{:>14}{:>9}{:>16}".format(
+        "forest", "ms", "crossings", "uploaded kB", "frames", "max frame ms"))
+    for instanced in (False, True):
+        webapp_2.instanced_trees = instanced
+        webapp_2.profiler.frames.clear()
+        ms, calls = measure(build_forest_frames)
+        mode = "instanced" if instanced else "buffer"
+        frames = [frame["duration"] * 1000 for frame in webapp_2.profiler.frames]
+        print("{:<11}{:>10.2f}{:>11}{:>14.1f}{:>9}{:>16.2f}".format(
+            mode, ms, calls, recorder.transfer_bytes / 1024, len(frames), max(frames)))
+        results[mode + " forest kB"] = recorder.transfer_bytes / 1024
+        results[mode + " forest max frame ms"] = max(frames)
+
+    # the buffer is ordered by depth, far trees only draw a prefix of it
+    webapp_2.instanced_trees = False
+    build_forest_frames()
+    print("\n{:<11}{:>11}{:>11}{:>11}".format("distance", "segments", "of", "crossings"))
+    for distance in (50, 500, 2000, 8000):
+        webapp_2.camera.position.z = distance
+        webapp_2.scheduler.invalidate()
+        _, calls = measure(lambda: run_frames(1))
+        samples = webapp_2.profiler.frames[-1]["samples"]
+        print("{:<11}{:>11}{:>11}{:>11}".format(distance, samples["segments"], samples["segments full"], calls))
+        results["tree lod crossings"] = max(results.get("tree lod crossings", 0), calls)
+    webapp_2.camera.position.z = 50
+    return results
+
+
+'''
+DRAW_TREE
+draws the branches of one tree as one LineSegments in the scene of webapp_2,
+the tree is one buffer, one transfer and one object
+parameters: axiom: string, initial_point: (x, y, z)
+returns: the LineSegments object'''
+def draw_tree(axiom, initial_point):
+    geometry = js_stub.THREE.BufferGeometry.new()
+    vertices = turtle_vertices(axiom, initial_point)
+    geometry.setAttribute('position', js_stub.THREE.BufferAttribute.new(to_js(vertices.ravel()), 3))
+    tree = js_stub.THREE.LineSegments.new(geometry, webapp_2.line_material)
+    webapp_2.scene.add(tree)
+    return tree
+
+
+def build_forest_frames():
+    webapp_2.build_forest()
+    while webapp_2.forest_build is not None:
+        run_frames(1)
+
+
+'''
+BENCHMARK_SNAPSHOTS
+the forest buffer of webapp_2 and a fine template of webapp_1, generated with
+an empty snapshot store and then loaded from it. The loaded buffers have to
+be the ones that were generated.
+returns: dictionary name -> value'''
+def benchmark_snapshots():
+    results = {}
+    start_page(webapp_1)
+    start_page(webapp_2)
+    print("\n{:<11}{:>10}{:>10}{:>9}{:>10}".format("snapshot", "build ms", "load ms", "frames", "kB"))
+    webapp_2.instanced_trees = False
+    template_key = ("capsule", 1.0, 2.0, 128, 32)
+    runs = (("forest", webapp_2, build_forest_frames, lambda: webapp_2.forest_position.array.to_py()),
+            ("template", webapp_1, lambda: None, lambda: tessellate_and_save(template_key).positions))
+    for name, webapp, build, result in runs:
+        store = MemoryStore()
+        webapp.snapshots = SnapshotCache(store)
+        build_ms, built = measure_result(build, result)
+        first_frame = len(webapp_2.profiler.frames)
+        load_ms, loaded = measure_result(build, result)
+        frames = len(webapp_2.profiler.frames) - first_frame
+        if not np.array_equal(built, loaded) or webapp.snapshots.hits != 1:
+            raise AssertionError("the {} was not loaded from its snapshot".format(name))
+        size = sum(len(store.get(key)) for key in store._data) / 1024
+        print("{:<11}{:>10.2f}{:>10.2f}{:>9}{:>10.1f}".format(name, build_ms, load_ms, frames, size))
+        results["snapshot {} ms".format(name)] = load_ms
+        results["snapshot {} frames".format(name)] = frames
+    return results
+
+
+# a template of webapp_1 like the rebuild commits it and the next frame saves it
+def tessellate_and_save(key):
+    data = webapp_1.tessellate(key)
+    webapp_1.save_template(key)
+    return data
+
+
+# milliseconds of build() and result(), and a copy of the result
+def measure_result(build, result):
+    start = time.perf_counter()
+    build()
+    value = np.array(result())
+    return (time.perf_counter() - start) * 1000, value
+
+
+'''
+BENCHMARK_PAGES
+the scripts the pages load before python runs, every script is parsed once
+and the post-processing and dat.gui are left to runtime.load_scripts()
+returns: dictionary name -> value'''
+def benchmark_pages():
+    results = {}
+    print("\n{:<15}{:>9}{:>12}".format("page", "scripts", "duplicates"))
+    for page in ("webapp_1.html", "webapp_2.html"):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), page)) as file:
+            scripts = re.findall(r'<script[^>]*\ssrc="([^"]+)"', file.read())
+        duplicates = len(scripts) - len(set(scripts))
+        print("{:<15}{:>9}{:>12}".format(page, len(scripts), duplicates))
+        results["duplicate scripts"] = results.get("duplicate scripts", 0) + duplicates
+        results["scripts before python"] = max(results.get("scripts before python", 0), len(scripts))
+    return results
+
+
+'''
+REGRESSIONS
+parameters: results: dictionary name -> value of the benchmarks
+returns: dictionary name -> (value, limit) of the values above their limit'''
+def regressions(results):
+    return {name: (value, THRESHOLDS[name]) for name, value in results.items()
+            if name in THRESHOLDS and value > THRESHOLDS[name]}
+
+
+# the milliseconds and the frames a build takes depend on the machine, the
+# crossings, bytes and scripts are the same in every run
+def is_timing(name):
+    return any(unit in name.split() for unit in ("ms", "ns", "frames"))
+
+
+def check(results):
+    failed = []
+    print("\n{:<42}{:>12}{:>12}".format("threshold", "value", "limit"))
+    for name, limit in THRESHOLDS.items():
+        value = results.get(name)
+        if value is None:
+            continue
+        status = "" if value <= limit else "  REGRESSION"
+        print("{:<42}{:>12.2f}{:>12}{}".format(name, value, limit, status))
+        if status:
+            failed.append(name)
+    return failed
+
+
+if __name__ == "__main__":
+    results = {}
+    results.update(benchmark_grid())
+    results.update(benchmark_scrub())
+    results.update(benchmark_culling())
+    results.update(benchmark_lsystem())
+    results.update(benchmark_trees())
+    results.update(benchmark_snapshots())
+    results.update(benchmark_pages())
+    sys.exit(1 if check(results) else 0)
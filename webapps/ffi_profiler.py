@@ -0,0 +1,347 @@
+#-----------------------------------------------------------------------
+# PROFILER OF THE PYTHON <-> JAVASCRIPT BOUNDARY FOR BOTH WEBAPPS
+'''
+Counts every crossing of the pyodide boundary: attribute reads and writes
+on javascript objects, calls and constructors, to_js() and to_py()
+conversions, proxies made with create_proxy() and the calls javascript makes
+back into them. Every crossing is counted per call site (file, line and
+function of the python code) and per frame of a FrameProfiler, and the
+proxies that were never destroyed are kept with the site that made them.
+
+It is opt-in: install() puts a counting wrapper in front of the `js` and
+`pyodide.ffi` modules, so it has to run before the webapp imports them. In
+the browser this happens with ?ffi in the page url, under CPython the same
+report comes from the stand-in of js_stub:
+    python ffi_profiler.py webapp_1 120
+'''
+from collections import Counter
+import os
+import sys
+import types
+
+# crossings that are counted
+GET = "get"
+SET = "set"
+CALL = "call"
+NEW = "new"
+TO_JS = "to_js"
+TO_PY = "to_py"
+PROXY = "proxy"
+CALLBACK = "callback"
+KINDS = (GET, SET, CALL, NEW, TO_JS, TO_PY, PROXY, CALLBACK)
+
+# results of javascript that come back as python values
+_PLAIN = (bool, int, float, complex, str, bytes, type(None))
+
+
+'''
+FFIPROFILER
+parameters: profiler: FrameProfiler that gets the crossings of every frame as
+counters, can also be attached later
+'''
+class FfiProfiler:
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        # (site, kind, path) -> count, all crossings and the ones inside frames
+        self.crossings = Counter()
+        self.frame_crossings = Counter()
+        self.transfer_bytes = 0
+        # id -> (proxy, site) of the proxies that are not destroyed yet
+        self._proxies = {}
+        self._frames_at_reset = 0
+
+    def attach(self, profiler):
+        self.profiler = profiler
+        self._frames_at_reset = profiler.frame_count
+
+    def reset(self):
+        self.crossings.clear()
+        self.frame_crossings.clear()
+        self.transfer_bytes = 0
+        if self.profiler is not None:
+            self._frames_at_reset = self.profiler.frame_count
+
+    '''
+    COUNT
+    records one crossing at the python code that called the wrapper
+    parameters: kind: one of KINDS, path: what was crossed, e.g.
+    "THREE.Vector3.new", depth: frames between the caller and this method
+    site: string, instead of the caller'''
+    def count(self, kind, path, depth=2, site=None):
+        key = (site or _site(_caller(depth + 1)), kind, path)
+        self.crossings[key] += 1
+        if self.profiler is not None and self.profiler.in_frame:
+            self.frame_crossings[key] += 1
+            self.profiler.count("ffi " + kind)
+
+    def frames(self):
+        if self.profiler is None:
+            return 0
+        return self.profiler.frame_count - self._frames_at_reset
+
+    '''
+    LIVE_PROXIES
+    returns: list of (site, count) of the proxies that were created and
+    not destroyed, most first'''
+    def live_proxies(self):
+        for key, (proxy, _) in list(self._proxies.items()):
+            if _destroyed(proxy):
+                del self._proxies[key]
+        return Counter(site for _, site in self._proxies.values()).most_common()
+
+    '''
+    RANKING
+    the call sites with the most crossings
+    returns: list of (site, total, per frame, {kind: count}, the most
+    frequent path), most crossings first'''
+    def ranking(self):
+        frames = self.frames()
+        sites = {}
+        for (site, kind, path), count in self.crossings.items():
+            total, kinds, paths = sites.setdefault(site, [0, Counter(), Counter()])
+            sites[site][0] = total + count
+            kinds[kind] += count
+            paths[path] += count
+        in_frames = Counter()
+        for (site, _, _), count in self.frame_crossings.items():
+            in_frames[site] += count
+        ranking = [(site, total, in_frames[site] / frames if frames else 0.0, dict(kinds),
+                    paths.most_common(1)[0][0])
+                   for site, (total, kinds, paths) in sites.items()]
+        return sorted(ranking, key=lambda entry: entry[1], reverse=True)
+
+    '''
+    REPORT
+    parameters: limit: int, number of call sites
+    returns: string with the totals per kind, the ranked call sites and the
+    live proxies'''
+    def report(self, limit=20):
+        kinds = Counter()
+        for (_, kind, _), count in self.crossings.items():
+            kinds[kind] += count
+        frames = self.frames()
+        lines = ["{} crossings in {} frames, {:.0f} kB to javascript".format(
+            sum(kinds.values()), frames, self.transfer_bytes / 1024)]
+        lines.append("  ".join("{} {}".format(kind, kinds[kind]) for kind in KINDS if kinds[kind]))
+        lines.append("")
+        lines.append("{:>8} {:>9}  {:<36}{}".format("total", "/ frame", "site", "most crossed"))
+        for site, total, per_frame, _, path in self.ranking()[:limit]:
+            lines.append("{:>8} {:>9.1f}  {:<36}{}".format(total, per_frame, site, path))
+        live = self.live_proxies()
+        if live:
+            lines.append("")
+            lines.append("{} proxies not destroyed".format(sum(count for _, count in live)))
+            for site, count in live:
+                lines.append("{:>8}  {}".format(count, site))
+        return "\n".join(lines)
+
+    '''
+    WRAP
+    parameters: value: anything that came from javascript, path: its name
+    returns: a counting JsWrapper for javascript objects, the value itself
+    for python values'''
+    def wrap(self, value, path):
+        if isinstance(value, _PLAIN) or isinstance(value, JsWrapper):
+            return value
+        return JsWrapper(value, path, self)
+
+    def to_js(self, to_js):
+        def wrapper(value, *args, **kwargs):
+            self.count(TO_JS, type(value).__name__)
+            self.transfer_bytes += getattr(value, "nbytes", 0)
+            return to_js(_unwrap(value), *args, **kwargs)
+        return wrapper
+
+    def create_proxy(self, create_proxy):
+        def wrapper(function, *args, **kwargs):
+            name = getattr(function, "__qualname__", type(function).__name__)
+            self.count(PROXY, name)
+            code = getattr(function, "__code__", None)
+            site = "{}:{} {}".format(os.path.basename(code.co_filename), code.co_firstlineno,
+                                     code.co_name) if code else name
+            def callback(*values):
+                # javascript calling back into python is a crossing as well,
+                # counted at the function that is called
+                self.count(CALLBACK, name, site=site)
+                return function(*(self.wrap(value, "event") for value in values))
+            proxy = create_proxy(callback, *args, **kwargs)
+            self._proxies[id(proxy)] = (proxy, _site(_caller(2)))
+            return proxy
+        return wrapper
+
+
+'''
+JSWRAPPER
+stands in front of a javascript object and counts what python does with it.
+Objects that come out of it are wrapped again, objects that go into it are
+unwrapped, so javascript never sees a wrapper.
+'''
+class JsWrapper:
+    __slots__ = ("_target", "_path", "_ffi")
+
+    def __init__(self, target, path, ffi):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_path", path)
+        object.__setattr__(self, "_ffi", ffi)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        path = self._path + "." + name
+        self._ffi.count(GET, path)
+        value = getattr(self._target, name)
+        if name == "to_py":
+            return _Conversion(value, path, self._ffi)
+        return self._ffi.wrap(value, path)
+
+    def __setattr__(self, name, value):
+        self._ffi.count(SET, self._path + "." + name)
+        setattr(self._target, name, _unwrap(value))
+
+    def __call__(self, *args, **kwargs):
+        kind = NEW if self._path.endswith(".new") else CALL
+        self._ffi.count(kind, self._path)
+        value = self._target(*[_unwrap(arg) for arg in args],
+                             **{name: _unwrap(arg) for name, arg in kwargs.items()})
+        return self._ffi.wrap(value, self._path + "()")
+
+    def __getitem__(self, index):
+        self._ffi.count(GET, self._path + "[]")
+        return self._ffi.wrap(self._target[_unwrap(index)], self._path + "[]")
+
+    def __setitem__(self, index, value):
+        self._ffi.count(SET, self._path + "[]")
+        self._target[_unwrap(index)] = _unwrap(value)
+
+    def __len__(self):
+        self._ffi.count(GET, self._path + ".length")
+        return len(self._target)
+
+    def __iter__(self):
+        for value in self._target:
+            self._ffi.count(GET, self._path + "[]")
+            yield self._ffi.wrap(value, self._path + "[]")
+
+    def __bool__(self):
+        return bool(self._target)
+
+    def __repr__(self):
+        return repr(self._target)
+
+
+# to_py() of a wrapped object, its result is python and is not wrapped
+class _Conversion:
+    __slots__ = ("_function", "_path", "_ffi")
+
+    def __init__(self, function, path, ffi):
+        self._function = function
+        self._path = path
+        self._ffi = ffi
+
+    def __call__(self, *args, **kwargs):
+        self._ffi.count(TO_PY, self._path)
+        return self._function(*args, **kwargs)
+
+
+def _unwrap(value):
+    if isinstance(value, JsWrapper):
+        return object.__getattribute__(value, "_target")
+    return value
+
+
+# the profilers wrap functions themselves, e.g. FrameProfiler.counted()
+_WRAPPER_FILES = ("ffi_profiler.py", "frame_profiler.py")
+
+
+# the first frame outside of the wrappers, depth frames above the caller
+def _caller(depth):
+    frame = sys._getframe(depth)
+    while frame.f_back is not None and os.path.basename(frame.f_code.co_filename) in _WRAPPER_FILES:
+        frame = frame.f_back
+    return frame
+
+
+def _site(frame):
+    code = frame.f_code
+    return "{}:{} {}".format(os.path.basename(code.co_filename), frame.f_lineno, code.co_name)
+
+
+# a destroyed proxy can no longer be unwrapped
+def _destroyed(proxy):
+    try:
+        proxy.unwrap()
+    except Exception:
+        return True
+    return False
+
+
+#-----------------------------------------------------------------------
+# INSTALLATION
+_installed = None
+
+
+'''
+INSTALL
+puts the counting wrappers in front of the `js` and `pyodide.ffi` modules,
+only the modules that import them afterwards are counted
+parameters: profiler: FrameProfiler, can also be attached later
+returns: the FfiProfiler, the same one if it is already installed'''
+def install(profiler=None):
+    global _installed
+    if _installed is not None:
+        return _installed
+    import js
+    import pyodide.ffi
+    ffi = FfiProfiler(profiler)
+    wrapped_js = types.ModuleType("js")
+    wrapped_js.__getattr__ = lambda name: ffi.wrap(getattr(js, name), name)
+    wrapped_ffi = types.ModuleType("pyodide.ffi")
+    wrapped_ffi.__dict__.update({name: value for name, value in vars(pyodide.ffi).items()
+                                 if not name.startswith("__")})
+    wrapped_ffi.to_js = ffi.to_js(pyodide.ffi.to_js)
+    wrapped_ffi.create_proxy = ffi.create_proxy(pyodide.ffi.create_proxy)
+    sys.modules["js"] = wrapped_js
+    sys.modules["pyodide.ffi"] = wrapped_ffi
+    _installed = ffi
+    return ffi
+
+
+'''
+INSTALL_IF_REQUESTED
+installs the profiler if the page was opened with ?ffi, e.g.
+webapp_2.html?ffi
+returns: the FfiProfiler or None'''
+def install_if_requested():
+    if _installed is not None:
+        return _installed
+    from js import window
+    search = window.location.search
+    if isinstance(search, str) and "ffi" in search:
+        return install()
+    return None
+
+
+#-----------------------------------------------------------------------
+# REPORT UNDER CPYTHON: python ffi_profiler.py webapp_1 120
+def main(argv):
+    name = argv[1] if len(argv) > 1 else "webapp_1"
+    frames = int(argv[2]) if len(argv) > 2 else 120
+    try:
+        import js
+    except ImportError:
+        import js_stub
+        js_stub.install()
+    from js_stub import run_frames
+    ffi = install()
+    webapp = __import__(name)
+    ffi.attach(webapp.profiler)
+    webapp.main()
+    for _ in range(frames):
+        # every frame is drawn, as if the camera was moving
+        webapp.scheduler.invalidate()
+        run_frames(1)
+    print(ffi.report())
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,95 @@
+#-----------------------------------------------------------------------
+# FOREST BUILDER FOR WEBAPP 2
+'''
+Builds the vertex buffer of a whole forest. The length of every tree is known
+from the rules (lsystem.branch_count), so the buffer is allocated once and
+every tree gets its slice before anything is expanded. The trees are built
+from their repeated subtrees in small pieces (forest_chunks()), so the page
+can spread the work over several frames.
+The branches of every tree are ordered by depth, so a prefix of a tree is a
+coarser version of it (tree_levels()).
+'''
+import numpy as np
+from lsystem import (LSystem, TREE, TREE_RULES, SUBTREE_LEVELS, branch_count, depth_counts, instance_plan,
+                     instance_depths, subtree, subtree_bounds)
+
+
+'''
+TREE_OFFSETS
+the first vertex of every tree in the forest buffer
+parameters: specs: list of (axiom, depth, base point), rules: rule table
+returns: int array (len(specs) + 1,), the last entry is the vertex count'''
+def tree_offsets(specs, rules=TREE_RULES):
+    lsystem = _lsystem(rules)
+    counts = [2 * branch_count(axiom, depth, lsystem) for axiom, depth, _ in specs]
+    return np.concatenate(([0], np.cumsum(counts, dtype=np.int64)))
+
+
+# one LSystem per rule table
+_lsystems = {tuple(sorted(TREE_RULES.items())): TREE}
+def _lsystem(rules):
+    key = tuple(sorted(rules.items()))
+    if key not in _lsystems:
+        _lsystems[key] = LSystem(rules)
+    return _lsystems[key]
+
+
+'''
+TREE_LEVELS
+where the depths of every tree start in the forest buffer. The branches of a
+tree are ordered by depth (lsystem.depth_order()), so drawing only the
+vertices up to levels[k + 1] draws the tree cut off after k forks.
+parameters: specs: list of (axiom, depth, base point), rules: rule table
+returns: list of int arrays, one per tree, the first vertex of every depth
+relative to the tree and the vertex count of the tree at the end'''
+def tree_levels(specs, rules=TREE_RULES):
+    lsystem = _lsystem(rules)
+    return [np.concatenate(([0], np.cumsum(2 * depth_counts(axiom, depth, lsystem=lsystem))))
+            for axiom, depth, _ in specs]
+
+
+'''
+FOREST_CHUNKS
+the vertices of a forest in small pieces, to build it over several frames.
+Every tree is split into its repeated subtrees (lsystem.instance_plan()) and
+a piece is a batch of placed subtrees, so a deep tree does not make one
+piece take much longer than the others. The branches of a tree come depth by
+depth like in tree_levels(), a subtree adds the branches of each of its
+depths to the depth it is placed at plus that depth. The pieces fill the
+forest buffer in the order they come.
+parameters: specs: list of (axiom, depth, base point)
+chunk_rows: int, about the number of vertices per piece
+returns: generator of (first vertex, float32 array (rows, 3))'''
+def forest_chunks(specs, chunk_rows=16384, split=SUBTREE_LEVELS, rules=TREE_RULES):
+    lsystem = _lsystem(rules)
+    offset = 0
+    pieces, rows = [], 0
+    for axiom, depth, base in specs:
+        base = np.asarray(base, dtype=np.float32)
+        plan = instance_plan(axiom, depth, split, lsystem)
+        depths = instance_depths(axiom, depth, split, lsystem)
+        subtrees = {key: (subtree(key[0], key[1], lsystem)[0], subtree_bounds(key[0], key[1], lsystem))
+                    for key in plan}
+        deepest = max((int(depths[key].max()) + len(bounds) - 2 for key, (_, bounds) in subtrees.items()),
+                      default=-1)
+        for level in range(deepest + 1):
+            for key, (local, bounds) in subtrees.items():
+                for local_level in range(min(level + 1, len(bounds) - 1)):
+                    matrices = plan[key][depths[key] == level - local_level]
+                    points = local[2 * bounds[local_level]:2 * bounds[local_level + 1]]
+                    if not len(matrices) or not len(points):
+                        continue
+                    points = np.c_[points, np.ones(len(points), dtype=np.float32)]
+                    batch = max(1, chunk_rows // len(points))
+                    for first in range(0, len(matrices), batch):
+                        # the matrices are stored transposed: point @ matrix
+                        placed = np.einsum("vi,nij->nvj", points, matrices[first:first + batch])[..., :3]
+                        pieces.append(placed.reshape(-1, 3) + base)
+                        rows += len(pieces[-1])
+                        # small pieces are sent together
+                        if rows >= chunk_rows:
+                            yield offset, np.concatenate(pieces)
+                            offset += rows
+                            pieces, rows = [], 0
+    if pieces:
+        yield offset, np.concatenate(pieces)
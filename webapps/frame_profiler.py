@@ -0,0 +1,164 @@
+#-----------------------------------------------------------------------
+# FRAME PROFILER FOR BOTH WEBAPPS
+'''
+Times the phases of every frame (updating the geometry, the controls, the
+composer) and of the startup in main(), and keeps counters and samples per
+frame, e.g. the draw calls from renderer.info or the number of proxies that
+were created. The recorded frames can be summarised for the HUD and exported
+as a Chrome trace (chrome://tracing, Perfetto) to compare two builds.
+'''
+from collections import deque
+from contextlib import contextmanager
+import json
+import time
+
+# phases outside of a frame belong to the startup
+STARTUP = "startup"
+FRAME = "frame"
+
+
+'''
+FRAMEPROFILER
+parameters: max_frames: int, number of frames that are kept
+clock: function returning seconds, time.perf_counter by default
+origin: time of the clock that is 0, e.g. the start of the page load, now
+by default
+'''
+class FrameProfiler:
+    def __init__(self, max_frames=600, clock=time.perf_counter, origin=None):
+        self.clock = clock
+        self.origin = clock() if origin is None else origin
+        # (name, category, start, duration) in seconds since origin
+        self.startup = []
+        # dictionaries with start, duration, phases, counters, samples
+        self.frames = deque(maxlen=max_frames)
+        self._frame = None
+        # all frames, also the ones that no longer fit into frames
+        self.frame_count = 0
+        # counters that are counted outside of a frame go to the next one
+        self._carry = {}
+        self._last_lap = self.now()
+
+    def now(self):
+        return self.clock() - self.origin
+
+    def begin_frame(self):
+        self._frame = {"start": self.now(), "duration": 0.0, "phases": [],
+                       "counters": self._carry, "samples": {}}
+        self._carry = {}
+
+    def end_frame(self):
+        frame = self._frame
+        if frame is None:
+            return
+        frame["duration"] = self.now() - frame["start"]
+        self.frames.append(frame)
+        self.frame_count += 1
+        self._frame = None
+
+    @property
+    def in_frame(self):
+        return self._frame is not None
+
+    '''
+    PHASE
+    context manager that times a block, inside a frame it is a phase of the
+    frame, outside of a frame a phase of the startup
+    parameters: name: string'''
+    @contextmanager
+    def phase(self, name):
+        start = self.now()
+        try:
+            yield
+        finally:
+            duration = self.now() - start
+            if self._frame is not None:
+                self._frame["phases"].append((name, start, duration))
+            else:
+                self.startup.append((name, STARTUP, start, duration))
+
+    '''
+    MARK
+    records a point in time of the startup, e.g. the first frame
+    parameters: name: string, at: seconds since the origin, now by default'''
+    def mark(self, name, at=None):
+        self.startup.append((name, STARTUP, self.now() if at is None else at, 0.0))
+
+    '''
+    LAP
+    records a phase of the startup from the previous lap until now, so the
+    steps of main() can be timed without wrapping them in a block
+    parameters: name: string'''
+    def lap(self, name):
+        now = self.now()
+        self.startup.append((name, STARTUP, self._last_lap, now - self._last_lap))
+        self._last_lap = now
+
+    def count(self, name, amount=1):
+        counters = self._frame["counters"] if self._frame is not None else self._carry
+        counters[name] = counters.get(name, 0) + amount
+
+    def sample(self, name, value):
+        if self._frame is not None:
+            self._frame["samples"][name] = value
+
+    '''
+    COUNTED
+    wraps a function so that every call is counted, e.g. create_proxy
+    parameters: name: string, function: the function to wrap
+    returns: the wrapped function'''
+    def counted(self, name, function):
+        def wrapper(*args, **kwargs):
+            self.count(name)
+            return function(*args, **kwargs)
+        return wrapper
+
+    '''
+    SUMMARY
+    averages of the last frames for the HUD
+    parameters: frames: int, number of frames to average
+    returns: dictionary with the frame time, the time of every phase and the
+    counters and samples, all per frame'''
+    def summary(self, frames=60):
+        recent = list(self.frames)[-frames:]
+        if not recent:
+            return {}
+        n = len(recent)
+        result = {"frame_ms": sum(f["duration"] for f in recent) * 1000 / n, "phases": {},
+                  "counters": {}, "samples": dict(recent[-1]["samples"])}
+        for frame in recent:
+            for name, _, duration in frame["phases"]:
+                result["phases"][name] = result["phases"].get(name, 0.0) + duration * 1000 / n
+            for name, value in frame["counters"].items():
+                result["counters"][name] = result["counters"].get(name, 0) + value / n
+        return result
+
+    def startup_ms(self):
+        return [(name, start * 1000, duration * 1000) for name, _, start, duration in self.startup]
+
+    '''
+    TRACE_EVENTS
+    returns: list of events in the Chrome trace event format, durations are
+    complete events ("X") and counters and samples counter events ("C")'''
+    def trace_events(self):
+        events = []
+        for name, category, start, duration in self.startup:
+            events.append(_complete(name, category, start, duration, tid=0))
+        for frame in self.frames:
+            events.append(_complete(FRAME, FRAME, frame["start"], frame["duration"], tid=1))
+            for name, start, duration in frame["phases"]:
+                events.append(_complete(name, FRAME, start, duration, tid=1))
+            values = dict(frame["samples"])
+            values.update(frame["counters"])
+            for name, value in values.items():
+                events.append({"name": name, "ph": "C", "ts": frame["start"] * 1e6,
+                               "pid": 1, "args": {name: value}})
+        return events
+
+    def export_json(self):
+        return json.dumps({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"})
+
+
+def _complete(name, category, start, duration, tid):
+    return {"name": name, "cat": category, "ph": "X", "ts": start * 1e6,
+            "dur": duration * 1e6, "pid": 1, "tid": tid}
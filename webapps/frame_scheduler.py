@@ -0,0 +1,138 @@
+#-----------------------------------------------------------------------
+# FRAME SCHEDULER FOR BOTH WEBAPPS
+'''
+Instead of asking for a new animation frame in every frame, the webapps call
+invalidate() whenever something on screen changes (camera, parameters, window
+size). The scheduler then draws one frame with a single proxy that lives as
+long as the page. A static scene is not drawn at all and a hidden tab does
+not draw until it is visible again.
+'''
+# Import javascript modules
+from js import window, document
+# Import pyscript / pyodide modules
+from pyodide.ffi import create_proxy
+# Import python module
+import time
+
+
+'''
+FRAMESCHEDULER
+draws a frame on demand
+parameters: draw: function without arguments that renders the scene
+budget_ms: float, time one frame may take, 60 frames per second by default
+create_proxy: function that makes the proxies, e.g. counted by the profiler
+'''
+class FrameScheduler:
+    def __init__(self, draw, budget_ms=1000 / 60, create_proxy=create_proxy):
+        self.draw = draw
+        self.budget_ms = budget_ms
+        # a frame is requested from the browser
+        self._pending = False
+        # something changed that is not drawn yet
+        self._invalid = False
+        self._hidden = bool(document.hidden)
+        self._frame_start = None
+        # statistics of the drawn frames
+        self.frames = 0
+        self.over_budget = 0
+        self.last_ms = 0.0
+        self.average_ms = 0.0
+        # time since the previous frame if that one asked for this frame while
+        # it was drawn, so the browser drew both back to back. None otherwise,
+        # e.g. after an input event that came some time after a frame.
+        self.interval_ms = None
+        self._last_timestamp = None
+        self._continued = False
+        # one proxy for all frames instead of one per frame
+        self._frame_proxy = create_proxy(self._frame)
+        self._visibility_proxy = create_proxy(self._on_visibility)
+        document.addEventListener('visibilitychange', self._visibility_proxy)
+
+    '''
+    INVALIDATE
+    marks the frame as outdated and asks for one animation frame.
+    Can be used as event listener, the arguments are ignored.'''
+    def invalidate(self, *args):
+        self._invalid = True
+        if self._pending or self._hidden:
+            return
+        self._pending = True
+        window.requestAnimationFrame(self._frame_proxy)
+
+    '''
+    REMAINING_MS
+    returns: float, the time left in the budget of the current frame'''
+    def remaining_ms(self):
+        if self._frame_start is None:
+            return self.budget_ms
+        return self.budget_ms - (time.perf_counter() - self._frame_start) * 1000
+
+    def _frame(self, timestamp):
+        self._pending = False
+        if self._continued and self._last_timestamp is not None:
+            self.interval_ms = timestamp - self._last_timestamp
+        else:
+            self.interval_ms = None
+        self._last_timestamp = timestamp
+        self._invalid = False
+        self._frame_start = time.perf_counter()
+        try:
+            self.draw()
+        finally:
+            elapsed = (time.perf_counter() - self._frame_start) * 1000
+            self._frame_start = None
+            self._continued = self._pending
+        self.frames += 1
+        self.last_ms = elapsed
+        self.average_ms = elapsed if self.frames == 1 else 0.9 * self.average_ms + 0.1 * elapsed
+        if elapsed > self.budget_ms:
+            self.over_budget += 1
+
+    def _on_visibility(self, *args):
+        self._hidden = bool(document.hidden)
+        # draw what was missed while the tab was hidden
+        if not self._hidden and self._invalid:
+            self.invalidate()
+
+    def destroy(self):
+        document.removeEventListener('visibilitychange', self._visibility_proxy)
+        self._visibility_proxy.destroy()
+        self._frame_proxy.destroy()
+
+
+'''
+REFRESHPROBE
+measures the refresh interval of the display: for a number of animation
+frames it only keeps the timestamps the browser hands in and draws nothing.
+A frame can come late but never early, so the shortest interval is the
+refresh interval, also if the page was busy during some of them.
+parameters: create_proxy: function that makes the proxy, e.g. counted by the
+profiler, frames: int, number of intervals that are measured
+'''
+class RefreshProbe:
+    def __init__(self, create_proxy=create_proxy, frames=60):
+        self.interval_ms = None
+        self._frames = frames
+        self._last_timestamp = None
+        self._proxy = create_proxy(self._frame)
+        self._request = window.requestAnimationFrame(self._proxy)
+
+    def _frame(self, timestamp):
+        self._request = None
+        if self._last_timestamp is not None and timestamp > self._last_timestamp:
+            interval = timestamp - self._last_timestamp
+            self.interval_ms = interval if self.interval_ms is None else min(self.interval_ms, interval)
+            self._frames -= 1
+        self._last_timestamp = timestamp
+        if self._frames > 0:
+            self._request = window.requestAnimationFrame(self._proxy)
+        else:
+            self.destroy()
+
+    def destroy(self):
+        if self._request is not None:
+            window.cancelAnimationFrame(self._request)
+            self._request = None
+        if self._proxy is not None:
+            self._proxy.destroy()
+            self._proxy = None
@@ -0,0 +1,105 @@
+#-----------------------------------------------------------------------
+# TEMPLATE CACHE FOR THE GRID GEOMETRIES
+'''
+All cells of the grid share one shape, so the shape is only built once per
+set of shape parameters. Scrubbing a slider back and forth hits the cache
+instead of tessellating again. The least recently used templates are evicted
+and their geometries disposed, so the cache does not grow without limit.
+Templates that are on screen are pinned and never evicted, the cache holds
+more than its capacity while they do not fit.
+'''
+from collections import OrderedDict
+
+
+'''
+TEMPLATE_KEY
+the parameters that change the vertices of the shape, placement is not part
+of the key because it is applied as a transform
+parameters: params: object with the geometry parameters as attributes
+returns: tuple (type, radius, height or length, radial_segments, capSubdivisions)'''
+def template_key(params):
+    if params.type == "capsule":
+        return ("capsule", params.radius, params.length, params.radial_segments, params.capSubdivisions)
+    return ("cylinder", params.radius, params.height, params.radial_segments, 0)
+
+
+'''
+DISPOSE_TEMPLATE
+default eviction: dispose every geometry of the template
+parameters: value: tuple of three.js geometries'''
+def dispose_template(value):
+    for geometry in value:
+        geometry.dispose()
+
+
+'''
+TEMPLATECACHE
+least recently used cache of templates
+parameters: build: function key -> template, called on a miss
+capacity: int, number of templates that are kept
+on_evict: function template -> None, called for every evicted template
+'''
+class TemplateCache:
+    def __init__(self, build, capacity=8, on_evict=dispose_template):
+        self.build = build
+        self.capacity = capacity
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._templates = OrderedDict()
+        # owner -> keys that must not be evicted
+        self._pins = {}
+
+    def __len__(self):
+        return len(self._templates)
+
+    def __contains__(self, key):
+        return key in self._templates
+
+    '''
+    GET
+    returns the template for a key, building it on a miss
+    parameters: key: tuple from template_key()'''
+    def get(self, key):
+        if key in self._templates:
+            self.hits += 1
+            self._templates.move_to_end(key)
+            return self._templates[key]
+        self.misses += 1
+        template = self.build(key)
+        self._templates[key] = template
+        self._evict(keep=key)
+        return template
+
+    '''
+    PIN
+    keeps templates from being evicted, e.g. the ones the scene draws, in
+    place of the keys the same owner pinned before
+    parameters: owner: any hashable name, keys: iterable of keys, may be empty'''
+    def pin(self, owner, keys):
+        self._pins[owner] = frozenset(keys)
+        self._evict()
+
+    # the least recently used templates that are not pinned, and not the one
+    # that was just used, until the capacity is reached
+    def _evict(self, keep=None):
+        pinned = set().union(*self._pins.values())
+        if keep is not None:
+            pinned.add(keep)
+        for key in list(self._templates):
+            if len(self._templates) <= self.capacity:
+                break
+            if key not in pinned:
+                self.on_evict(self._templates.pop(key))
+
+    def clear(self):
+        while self._templates:
+            _, old = self._templates.popitem(last=False)
+            self.on_evict(old)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._templates),
+                "pinned": len(set().union(*self._pins.values()))}
+
+    def report(self):
+        return "{} hits / {} misses".format(self.hits, self.misses)
@@ -0,0 +1,107 @@
+#-----------------------------------------------------------------------
+# GPU RESOURCE MANAGER
+'''
+three.js only frees the buffers of a geometry on the GPU when dispose() is
+called, and a proxy made with create_proxy lives until destroy() is called.
+Everything the webapp creates is registered here and released through here,
+so replacing a geometry or removing a cell frees it right away and the live
+counts show whether a long session stays flat.
+
+Resources are known by the python object that track() returned. In pyodide
+every read of a javascript attribute, e.g. `mesh.geometry`, gives a new
+proxy that the manager has never seen, so the owner has to keep the tracked
+object and release that one.
+'''
+
+#-----------------------------------------------------------------------
+# KINDS OF RESOURCES
+GEOMETRY = "geometry"
+MATERIAL = "material"
+OBJECT = "object"
+PROXY = "proxy"
+KINDS = (GEOMETRY, MATERIAL, OBJECT, PROXY)
+
+
+'''
+RESOURCEMANAGER
+owns the three.js geometries, materials, scene objects and pyodide proxies
+of a webapp
+parameters: strict: bool, release() of a resource that is not tracked raises
+KeyError instead of only being counted, for debugging
+'''
+class ResourceManager:
+    def __init__(self, strict=False):
+        self.strict = strict
+        # id -> (resource, kind, estimated bytes)
+        self._live = {}
+        self.created = dict.fromkeys(KINDS, 0)
+        self.released = dict.fromkeys(KINDS, 0)
+        # release() calls for resources that were not tracked or are released
+        self.untracked = 0
+
+    '''
+    TRACK
+    registers a resource, returns it so it can wrap the constructor call
+    parameters: resource: javascript object or proxy
+    kind: one of KINDS
+    nbytes: int, estimated size of the buffers on the GPU'''
+    def track(self, resource, kind, nbytes=0):
+        key = id(resource)
+        if key not in self._live:
+            self.created[kind] += 1
+        self._live[key] = (resource, kind, nbytes)
+        return resource
+
+    def owns(self, resource):
+        return id(resource) in self._live
+
+    '''
+    RELEASE
+    frees a resource: geometries and materials are disposed, objects are
+    removed from their parent and proxies destroyed. A resource that is not
+    tracked is not freed, it is counted in `untracked`.
+    parameters: resource: the object track() returned'''
+    def release(self, resource):
+        entry = self._live.pop(id(resource), None)
+        if entry is None:
+            self.untracked += 1
+            if self.strict:
+                raise KeyError("release() of an untracked resource: {!r}".format(resource))
+            return
+        resource, kind, _ = entry
+        if kind == PROXY:
+            resource.destroy()
+        elif kind == OBJECT:
+            resource.removeFromParent()
+            # an InstancedMesh owns the buffer of its instance matrices
+            dispose = getattr(resource, "dispose", None)
+            if dispose is not None:
+                dispose()
+        else:
+            resource.dispose()
+        self.released[kind] += 1
+
+    def release_all(self, resources):
+        for resource in resources:
+            self.release(resource)
+
+    '''
+    STATS
+    returns: dictionary with the live count of every kind and the
+    estimated bytes of all live buffers'''
+    def stats(self):
+        counts = dict.fromkeys(KINDS, 0)
+        nbytes = 0
+        for _, kind, size in self._live.values():
+            counts[kind] += 1
+            nbytes += size
+        counts["bytes"] = nbytes
+        return counts
+
+    def report(self):
+        stats = self.stats()
+        report = "{} geom / {} obj / {} proxy / {:.0f} kB".format(
+            stats[GEOMETRY], stats[OBJECT], stats[PROXY], stats["bytes"] / 1024)
+        if self.untracked:
+            report += " / {} untracked".format(self.untracked)
+        return report
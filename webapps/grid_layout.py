@@ -0,0 +1,120 @@
+#-----------------------------------------------------------------------
+# GRID LAYOUT FOR WEBAPP 1
+'''
+Placement of the cells of the geometry grid, in plain python.
+Cell (i, 0) is the geometry of the outer loop: moved by radius*i*2 on the
+x-axis and rotated around the x-axis by rotation_x/x*i.
+Cell (i, j+1) is the clone of cell (i, j): moved by radius*2 on the z-axis and
+rotated around the x-axis by rotation_y/y*j.
+Every cell is therefore a rotation around the x-axis plus a translation, which
+can be set on the mesh instead of baking it into the vertices.
+'''
+import math
+import numpy as np
+
+
+'''
+CELL_INDICES
+parameters: x, y: int, grid size from the GUI
+returns: list of (i, j) keys, x*(y+1) cells'''
+def cell_indices(x, y):
+    return [(i, j) for i in range(x) for j in range(y + 1)]
+
+
+'''
+RECONCILE
+brings a dictionary of cells to a new set of keys: only vanished keys are
+removed and only new keys are created, surviving cells are kept as they are
+parameters: cells: dictionary key -> cell, changed in place
+keys: the wanted keys, new cells are created in this order
+create: function key -> cell, remove: function cell -> None
+returns: lists of the added and the removed keys'''
+def reconcile(cells, keys, create, remove):
+    target = set(keys)
+    removed = [key for key in cells if key not in target]
+    for key in removed:
+        remove(cells.pop(key))
+    added = [key for key in keys if key not in cells]
+    for key in added:
+        cells[key] = create(key)
+    return added, removed
+
+
+'''
+CELL_PLACEMENTS
+computes the position and the x-rotation of every cell
+parameters: x, y: int, grid size
+radius: float, spacing of the cells
+rotation_x, rotation_y: float, rotation in degrees
+returns: dictionary (i, j) -> (px, py, pz, angle)'''
+def cell_placements(x, y, radius, rotation_x, rotation_y):
+    step_x = math.radians(rotation_x) / x
+    step_y = math.radians(rotation_y) / y
+    # the y/z offset and the added angle of the clones do not depend on i
+    column = [(0.0, 0.0, 0.0)]
+    py, pz, angle = 0.0, 0.0, 0.0
+    for j in range(y):
+        # translate(0, 0, radius*2) then rotateX(step_y*j)
+        b = step_y * j
+        pz += radius * 2
+        py, pz = (py * math.cos(b) - pz * math.sin(b),
+                  py * math.sin(b) + pz * math.cos(b))
+        angle += b
+        column.append((py, pz, angle))
+
+    placements = {}
+    for i in range(x):
+        # the x-axis is not changed by a rotation around it
+        px = radius * i * 2
+        a = step_x * i
+        for j, (py, pz, b) in enumerate(column):
+            placements[(i, j)] = (px, py, pz, a + b)
+    return placements
+
+
+'''
+PLACEMENT_MATRICES
+computes the matrices of all cells in one vectorized step.
+A rotation around the x-axis acts on (y, z) like a multiplication of the
+complex number y + iz with e^(i*angle), so the chain of clones becomes a
+cumulative sum instead of a loop.
+parameters: same as cell_placements()
+returns: float32 array (N, 4, 4) in the order of cell_indices(). Every matrix
+is stored transposed, so matrices.ravel() is the column major layout of
+Matrix4.elements and can be handed to three.js in one transfer.'''
+def placement_matrices(x, y, radius, rotation_x, rotation_y):
+    # angle of the outer loop per column i, added angle of the clones per row j
+    angle_x = math.radians(rotation_x) / x * np.arange(x)
+    steps_y = math.radians(rotation_y) / y * np.arange(y)
+    angle_y = np.concatenate(([0.0], np.cumsum(steps_y)))
+    # q_j = e^(i*angle_y[j]) * sum over m < j of i*2*radius*e^(-i*angle_y[m])
+    inner = np.concatenate(([0.0], np.cumsum(np.exp(-1j * angle_y[:-1]))))
+    q = 2j * radius * np.exp(1j * angle_y) * inner
+
+    angle = (angle_x[:, None] + angle_y[None, :]).ravel()
+    cos = np.cos(angle)
+    sin = np.sin(angle)
+    matrices = np.zeros((x * (y + 1), 4, 4), dtype=np.float32)
+    matrices[:, 0, 0] = 1
+    matrices[:, 1, 1] = cos
+    matrices[:, 1, 2] = sin
+    matrices[:, 2, 1] = -sin
+    matrices[:, 2, 2] = cos
+    matrices[:, 3, 0] = np.repeat(radius * 2 * np.arange(x), y + 1)
+    matrices[:, 3, 1] = np.tile(q.real, x)
+    matrices[:, 3, 2] = np.tile(q.imag, x)
+    matrices[:, 3, 3] = 1
+    return matrices
+
+
+#-----------------------------------------------------------------------
+# BENCHMARK: python -m grid_layout
+if __name__ == "__main__":
+    import timeit
+    for size in (1, 10, 100):
+        args = (size, size, 5, 45, 30)
+        loops = max(1, 1000 // size)
+        loop_time = timeit.timeit(lambda: cell_placements(*args), number=loops) / loops
+        numpy_time = timeit.timeit(lambda: placement_matrices(*args), number=loops) / loops
+        print("{0}x{0}: cell_placements {1:.3f} ms, placement_matrices {2:.3f} ms".format(
+            size, loop_time * 1000, numpy_time * 1000))
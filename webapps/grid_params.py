@@ -0,0 +1,105 @@
+#-----------------------------------------------------------------------
+# PARAMETER STORE FOR THE GEOMETRY GRID OF WEBAPP 1
+'''
+The GUI writes every slider value into this store. The store remembers which
+fields changed since the last frame, so the render loop only rebuilds the part
+of the scene that depends on them. Reading a value is plain python, so an
+unchanged frame costs no calls into javascript.
+'''
+
+#-----------------------------------------------------------------------
+# REBUILD STAGES
+# vertices of the shared template shape
+GEOMETRY = "geometry"
+# number of cells in the grid
+LAYOUT = "layout"
+# position and rotation of every cell
+TRANSFORM = "transform"
+
+# which stages depend on which parameter
+DEPENDENCIES = {
+    "radius": (GEOMETRY, TRANSFORM),
+    "height": (GEOMETRY,),
+    "length": (GEOMETRY,),
+    "capSubdivisions": (GEOMETRY,),
+    "radial_segments": (GEOMETRY,),
+    "x": (LAYOUT, TRANSFORM),
+    "y": (LAYOUT, TRANSFORM),
+    "rotation_x": (TRANSFORM,),
+    "rotation_y": (TRANSFORM,),
+}
+
+# sliders without a step deliver floats, these fields are counts
+INTEGER_FIELDS = ("x", "y", "radial_segments", "capSubdivisions")
+
+#-----------------------------------------------------------------------
+'''
+PARAMSTORE
+holds the geometry parameters and tracks changes between frames.
+parameters: params: dictionary with the initial parameters
+values can be read as attributes, e.g. store.radius
+'''
+class ParamStore:
+    def __init__(self, params):
+        self._values = {}
+        self._changed = set()
+        for field, value in params.items():
+            self._values[field] = self._coerce(field, value)
+        # nothing is built yet, so the first frame needs everything
+        self._changed.update(self._values)
+
+    def __getattr__(self, field):
+        try:
+            return self.__dict__["_values"][field]
+        except KeyError:
+            raise AttributeError(field) from None
+
+    def _coerce(self, field, value):
+        if field in INTEGER_FIELDS:
+            return int(value)
+        return value
+
+    '''
+    SET
+    store a new value, only a real change marks the field as dirty
+    parameters: field: string, value: new value of the field'''
+    def set(self, field, value):
+        value = self._coerce(field, value)
+        if self._values.get(field) == value:
+            return
+        self._values[field] = value
+        self._changed.add(field)
+
+    '''
+    UPDATE
+    store several values at once, e.g. from a javascript object
+    parameters: params: dictionary of field and value'''
+    def update(self, params):
+        for field, value in params.items():
+            self.set(field, value)
+
+    '''
+    TOUCH
+    marks fields as dirty without changing them, e.g. after the scene was
+    cleared. Without arguments every field is marked.
+    parameters: fields: strings'''
+    def touch(self, *fields):
+        self._changed.update(fields or self._values)
+
+    @property
+    def dirty(self):
+        return bool(self._changed)
+
+    def as_dict(self):
+        return dict(self._values)
+
+    '''
+    CONSUME
+    hands out the changes of the current frame and resets the tracking
+    returns: set of rebuild stages (GEOMETRY, LAYOUT, TRANSFORM)'''
+    def consume(self):
+        stages = set()
+        for field in self._changed:
+            stages.update(DEPENDENCIES.get(field, ()))
+        self._changed.clear()
+        return stages
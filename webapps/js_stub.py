@@ -0,0 +1,591 @@
+#-----------------------------------------------------------------------
+# STAND-IN FOR THE BROWSER
+'''
+A small python stand-in for the `js` and `pyodide.ffi` modules, so the
+webapps can be imported and driven under plain CPython, e.g. by benchmark.py.
+Nothing is drawn. The three.js classes the webapps read back from (vectors,
+matrices, buffer geometries, scene objects) keep their state in python, every
+other object accepts any attribute and any call.
+
+Every call into javascript, every constructor, every attribute write and
+every to_js() transfer is counted in `recorder`, which is the cost the
+pyodide boundary adds in the browser. Attribute reads are not counted.
+
+usage:
+    import js_stub
+    js_stub.install()
+    import webapp_1
+'''
+from collections import Counter
+import math
+import sys
+import types
+import numpy as np
+
+
+'''
+RECORDER
+counts the crossings of the boundary between python and javascript
+'''
+class Recorder:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.calls = Counter()
+        self.allocations = Counter()
+        self.writes = 0
+        self.transfers = 0
+        self.transfer_bytes = 0
+        self.proxies = 0
+
+    def total(self):
+        return sum(self.calls.values()) + sum(self.allocations.values()) + self.writes + self.transfers
+
+    def report(self):
+        return "{} calls / {} new / {} writes / {} transfers ({:.0f} kB)".format(
+            sum(self.calls.values()), sum(self.allocations.values()), self.writes,
+            self.transfers, self.transfer_bytes / 1024)
+
+
+recorder = Recorder()
+
+
+# counts a method of a stand-in class as one call into javascript
+def _call(method):
+    name = method.__name__
+    def wrapper(self, *args, **kwargs):
+        recorder.calls[type(self).__name__ + "." + name] += 1
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+
+#-----------------------------------------------------------------------
+# GENERIC OBJECTS
+'''
+JSOBJECT
+any javascript object: unknown attributes are created on first read, calls
+return a new object and `new` creates an instance of the class of the name
+parameters: name: string, used for the counters
+'''
+class JsObject:
+    def __init__(self, name="Object", **attributes):
+        self.__dict__["_name"] = name
+        self.__dict__.update(attributes)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        child = JsObject(self._name + "." + name)
+        self.__dict__[name] = child
+        return child
+
+    def __setattr__(self, name, value):
+        recorder.writes += 1
+        self.__dict__[name] = value
+
+    def __call__(self, *args, **kwargs):
+        recorder.calls[self._name] += 1
+        return JsObject(self._name + "()")
+
+    def new(self, *args):
+        short_name = self._name.rsplit(".", 1)[-1]
+        recorder.allocations[short_name] += 1
+        cls = CLASSES.get(short_name)
+        if cls is None:
+            return JsObject(short_name)
+        return cls(*args)
+
+    def __repr__(self):
+        return "<js {}>".format(self._name)
+
+
+class JsArray(list):
+    @property
+    def length(self):
+        return len(self)
+
+    def to_py(self):
+        return list(self)
+
+
+class JsMap(dict):
+    def to_py(self):
+        return dict(self)
+
+
+'''
+TYPEDARRAY
+a Float32Array, Uint32Array, ... backed by a copy of a numpy array
+'''
+class TypedArray:
+    def __init__(self, array):
+        self.array = np.array(array)
+
+    @property
+    def length(self):
+        return len(self.array)
+
+    @property
+    def byteLength(self):
+        return self.array.nbytes
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    @_call
+    def set(self, source, offset=0):
+        source = source.array if isinstance(source, TypedArray) else np.asarray(source)
+        self.array[offset:offset + len(source)] = source
+
+    def to_py(self):
+        return self.array
+
+
+#-----------------------------------------------------------------------
+# THREE.JS CLASSES THAT ARE READ BACK
+class Vector3(JsObject):
+    def __init__(self, x=0, y=0, z=0):
+        super().__init__("Vector3", x=x, y=y, z=z)
+
+    @_call
+    def set(self, x, y, z):
+        self.__dict__.update(x=x, y=y, z=z)
+        return self
+
+    @_call
+    def add(self, v):
+        self.__dict__.update(x=self.x + v.x, y=self.y + v.y, z=self.z + v.z)
+        return self
+
+    @_call
+    def clone(self):
+        return Vector3(self.x, self.y, self.z)
+
+    @_call
+    def applyAxisAngle(self, axis, angle):
+        # Rodrigues' rotation around a unit axis
+        k = np.array([axis.x, axis.y, axis.z], dtype=float)
+        v = np.array([self.x, self.y, self.z], dtype=float)
+        v = v * math.cos(angle) + np.cross(k, v) * math.sin(angle) + k * k.dot(v) * (1 - math.cos(angle))
+        self.__dict__.update(x=float(v[0]), y=float(v[1]), z=float(v[2]))
+        return self
+
+    @_call
+    def toArray(self):
+        return JsArray([self.x, self.y, self.z])
+
+
+class Matrix4(JsObject):
+    def __init__(self):
+        super().__init__("Matrix4", elements=TypedArray(np.eye(4, dtype=np.float32).ravel()))
+
+    @_call
+    def fromArray(self, array, offset=0):
+        self.elements.array[:] = array[offset:offset + 16]
+        return self
+
+    @_call
+    def multiplyMatrices(self, a, b):
+        # the elements are column major
+        product = a.elements.array.reshape(4, 4).T @ b.elements.array.reshape(4, 4).T
+        self.elements.array[:] = product.T.ravel()
+        return self
+
+
+class BufferAttribute(JsObject):
+    def __init__(self, array, itemSize, normalized=False):
+        if isinstance(array, int):
+            # like new Float32Array(length)
+            array = TypedArray(np.zeros(array, dtype=np.float32))
+        elif not isinstance(array, TypedArray):
+            array = TypedArray(array)
+        super().__init__("BufferAttribute", array=array, itemSize=itemSize,
+                         count=len(array) // itemSize, needsUpdate=False)
+
+
+class BufferGeometry(JsObject):
+    def __init__(self):
+        super().__init__("BufferGeometry", attributes=JsObject("attributes"), index=None,
+                         drawRange=JsObject("drawRange", start=0, count=math.inf))
+
+    @_call
+    def setAttribute(self, name, attribute):
+        self.attributes.__dict__[name] = attribute
+        return self
+
+    @_call
+    def getAttribute(self, name):
+        return self.attributes.__dict__.get(name)
+
+    @_call
+    def deleteAttribute(self, name):
+        self.attributes.__dict__.pop(name, None)
+        return self
+
+    @_call
+    def setIndex(self, index):
+        if index is not None and not isinstance(index, BufferAttribute):
+            index = BufferAttribute(index, 1)
+        self.__dict__["index"] = index
+        return self
+
+    @_call
+    def setDrawRange(self, start, count):
+        self.drawRange.__dict__.update(start=start, count=count)
+
+    @_call
+    def setFromPoints(self, points):
+        positions = [(p.x, p.y, p.z) for p in points]
+        self.attributes.__dict__["position"] = BufferAttribute(np.array(positions, dtype=np.float32).ravel(), 3)
+        return self
+
+    @_call
+    def rotateX(self, angle):
+        return self
+
+    @_call
+    def dispose(self):
+        pass
+
+
+class InstancedBufferGeometry(BufferGeometry):
+    def __init__(self):
+        super().__init__()
+        self.__dict__.update(_name="InstancedBufferGeometry", instanceCount=math.inf)
+
+
+class PlaneGeometry(BufferGeometry):
+    def __init__(self, width=1, height=1, *args):
+        super().__init__()
+        w, h = width / 2, height / 2
+        positions = np.array([-w, h, 0, w, h, 0, -w, -h, 0, w, -h, 0], dtype=np.float32)
+        self.attributes.__dict__.update(position=BufferAttribute(positions, 3),
+                                        normal=BufferAttribute(np.tile([0, 0, 1], 4).astype(np.float32), 3),
+                                        uv=BufferAttribute(np.array([0, 1, 1, 1, 0, 0, 1, 0], dtype=np.float32), 2))
+        self.__dict__["index"] = BufferAttribute(np.array([0, 2, 1, 2, 3, 1], dtype=np.uint16), 1)
+
+
+class Object3D(JsObject):
+    def __init__(self, name="Object3D", **attributes):
+        super().__init__(name, position=Vector3(), rotation=Vector3(), scale=Vector3(1, 1, 1),
+                         matrix=Matrix4(), matrixAutoUpdate=True, matrixWorldNeedsUpdate=False,
+                         frustumCulled=True, parent=None, children=[], **attributes)
+
+    @_call
+    def add(self, child):
+        if child.parent is not None:
+            child.parent.children.remove(child)
+        child.__dict__["parent"] = self
+        self.children.append(child)
+        return self
+
+    @_call
+    def remove(self, child):
+        if child in self.children:
+            self.children.remove(child)
+            child.__dict__["parent"] = None
+        return self
+
+    @_call
+    def removeFromParent(self):
+        if self.parent is not None:
+            self.parent.children.remove(self)
+            self.__dict__["parent"] = None
+        return self
+
+
+class Scene(Object3D):
+    def __init__(self):
+        super().__init__("Scene")
+
+
+class Group(Object3D):
+    def __init__(self):
+        super().__init__("Group")
+
+
+class Mesh(Object3D):
+    def __init__(self, geometry=None, material=None):
+        super().__init__("Mesh", geometry=geometry, material=material)
+
+
+class Line(Object3D):
+    def __init__(self, geometry=None, material=None):
+        super().__init__("Line", geometry=geometry, material=material)
+
+
+class LineSegments(Object3D):
+    def __init__(self, geometry=None, material=None):
+        super().__init__("LineSegments", geometry=geometry, material=material)
+
+
+class InstancedMesh(Object3D):
+    def __init__(self, geometry, material, count):
+        matrices = BufferAttribute(np.tile(np.eye(4, dtype=np.float32).ravel(), count), 16)
+        super().__init__("InstancedMesh", geometry=geometry, material=material, count=count,
+                         instanceMatrix=matrices)
+
+    @_call
+    def dispose(self):
+        pass
+
+
+# looks down the negative z axis from its position, it is never rotated
+class PerspectiveCamera(Object3D):
+    def __init__(self, fov=50, aspect=1, near=0.1, far=2000):
+        super().__init__("PerspectiveCamera", fov=fov, aspect=aspect, near=near, far=far,
+                         projectionMatrix=Matrix4(), matrixWorldInverse=Matrix4())
+        self.updateProjectionMatrix()
+
+    @_call
+    def updateProjectionMatrix(self):
+        top = self.near * math.tan(math.radians(self.fov) / 2)
+        right = top * self.aspect
+        depth = self.far - self.near
+        projection = np.array([[self.near / right, 0, 0, 0],
+                               [0, self.near / top, 0, 0],
+                               [0, 0, -(self.far + self.near) / depth, -2 * self.far * self.near / depth],
+                               [0, 0, -1, 0]], dtype=np.float32)
+        self.projectionMatrix.elements.array[:] = projection.T.ravel()
+
+    @_call
+    def updateMatrixWorld(self, force=False):
+        inverse = np.eye(4, dtype=np.float32)
+        inverse[:3, 3] = [-self.position.x, -self.position.y, -self.position.z]
+        self.matrixWorldInverse.elements.array[:] = inverse.T.ravel()
+
+
+# a WebGL 2 context without timer queries, like in Firefox and Safari
+class WebGLContext(JsObject):
+    def __init__(self):
+        super().__init__("WebGL2RenderingContext")
+
+    @_call
+    def getExtension(self, name):
+        return None
+
+
+class WebGLRenderer(JsObject):
+    def __init__(self, *args):
+        super().__init__("WebGLRenderer", _context=WebGLContext())
+
+    @_call
+    def getContext(self):
+        return self._context
+
+
+# classes with state in python, every other name is a JsObject
+CLASSES = {cls.__name__: cls for cls in (
+    Vector3, Matrix4, BufferAttribute, BufferGeometry, InstancedBufferGeometry, PlaneGeometry,
+    Object3D, Scene, Group, Mesh, Line, LineSegments, InstancedMesh, PerspectiveCamera, WebGLRenderer)}
+CLASSES["Float32BufferAttribute"] = BufferAttribute
+CLASSES["InstancedBufferAttribute"] = BufferAttribute
+
+
+#-----------------------------------------------------------------------
+# GLOBALS OF THE PAGE
+# window.localStorage, strings under string keys, kept for the process
+class Storage(JsObject):
+    def __init__(self):
+        super().__init__("localStorage")
+        self.__dict__["_items"] = {}
+
+    @property
+    def length(self):
+        return len(self._items)
+
+    @_call
+    def getItem(self, key):
+        return self._items.get(key)
+
+    @_call
+    def setItem(self, key, value):
+        self._items[key] = str(value)
+
+    @_call
+    def removeItem(self, key):
+        self._items.pop(key, None)
+
+    @_call
+    def key(self, index):
+        keys = list(self._items)
+        return keys[index] if index < len(keys) else None
+
+
+class Window(JsObject):
+    def __init__(self, width=1280, height=720, pixel_ratio=1):
+        super().__init__("window", innerWidth=width, innerHeight=height, devicePixelRatio=pixel_ratio,
+                         localStorage=Storage())
+        # request id -> callback of the next frame
+        self.__dict__["_frame_callbacks"] = {}
+        self.__dict__["_request_id"] = 0
+        self.__dict__["_time"] = 0.0
+
+    @_call
+    def requestAnimationFrame(self, callback):
+        self.__dict__["_request_id"] += 1
+        self._frame_callbacks[self._request_id] = callback
+        return self._request_id
+
+    @_call
+    def cancelAnimationFrame(self, request_id):
+        self._frame_callbacks.pop(request_id, None)
+
+
+class ObjectNamespace(JsObject):
+    def __init__(self):
+        super().__init__("Object")
+
+    @_call
+    def fromEntries(self, entries):
+        entries = entries.items() if isinstance(entries, dict) else entries
+        return JsObject("Object", **dict(entries))
+
+    @_call
+    def keys(self, obj):
+        return JsArray(name for name in obj.__dict__ if not name.startswith("_"))
+
+
+class Proxy:
+    def __init__(self, function):
+        self.function = function
+        self.destroyed = False
+        recorder.proxies += 1
+
+    def __call__(self, *args):
+        return self.unwrap()(*args)
+
+    def destroy(self):
+        self.destroyed = True
+        recorder.proxies -= 1
+
+    # like pyodide, a destroyed proxy cannot be used any more
+    def unwrap(self):
+        if self.destroyed:
+            raise RuntimeError("the proxy was destroyed")
+        return self.function
+
+
+def create_proxy(function):
+    return Proxy(function)
+
+
+def to_js(value, **kwargs):
+    recorder.transfers += 1
+    if isinstance(value, np.ndarray):
+        recorder.transfer_bytes += value.nbytes
+        return TypedArray(value)
+    if isinstance(value, dict):
+        return JsMap(value)
+    if isinstance(value, (list, tuple)):
+        return JsArray(value)
+    return value
+
+
+'''
+DOCUMENT
+scripts that are added to the head of the page load before the next frame,
+like on a fast network, and then call their onload. The urls in
+head.failing call their onerror instead, like a script the network lost.
+'''
+class Head(JsObject):
+    def __init__(self):
+        super().__init__("document.head")
+        self.__dict__["_loading"] = []
+        self.__dict__["failing"] = set()
+
+    @_call
+    def appendChild(self, element):
+        if element._name == "script":
+            self._loading.append(element)
+        return element
+
+
+class Document(JsObject):
+    def __init__(self):
+        super().__init__("document", hidden=False, head=Head())
+
+    @_call
+    def createElement(self, tag):
+        return JsObject(tag)
+
+    # a script that loads the next one in its onload gets it loaded as well
+    def _load_scripts(self):
+        while self.head._loading:
+            script = self.head._loading.pop(0)
+            kind = "error" if script.__dict__.get("src") in self.head.failing else "load"
+            handler = script.__dict__.get("on" + kind)
+            if handler is not None:
+                handler(JsObject("Event", type=kind))
+
+
+class Performance(JsObject):
+    def __init__(self):
+        super().__init__("performance")
+
+    @_call
+    def now(self):
+        return window._time
+
+    @_call
+    def getEntriesByName(self, name):
+        # nothing was downloaded
+        return JsArray()
+
+
+THREE = JsObject("THREE")
+window = Window()
+document = Document()
+Object = ObjectNamespace()
+console = JsObject("console")
+performance = Performance()
+
+
+'''
+RUN_FRAMES
+calls the animation frame callbacks the page asked for, like the browser does
+once per display refresh
+parameters: count: int, maximum number of frames
+interval_ms: float, time between two frames
+returns: int, number of frames that were drawn'''
+def run_frames(count=1, interval_ms=1000 / 60):
+    drawn = 0
+    for _ in range(count):
+        callbacks = list(window._frame_callbacks.values())
+        window._frame_callbacks.clear()
+        # scripts that were added to the page load between two frames
+        loading = bool(document.head._loading)
+        if not callbacks and not loading:
+            break
+        window.__dict__["_time"] += interval_ms
+        for callback in callbacks:
+            callback(window._time)
+        drawn += 1 if callbacks else 0
+        document._load_scripts()
+    return drawn
+
+
+'''
+INSTALL
+registers the stand-in as the modules `js`, `pyodide` and `pyodide.ffi`.
+Names that are not defined here resolve to a JsObject.'''
+def install():
+    js = types.ModuleType("js")
+    js.THREE = THREE
+    js.window = window
+    js.document = document
+    js.Object = Object
+    js.console = console
+    js.performance = performance
+    js.__getattr__ = lambda name: JsObject(name)
+    ffi = types.ModuleType("pyodide.ffi")
+    ffi.create_proxy = create_proxy
+    ffi.to_js = to_js
+    pyodide = types.ModuleType("pyodide")
+    pyodide.ffi = ffi
+    sys.modules.update({"js": js, "pyodide": pyodide, "pyodide.ffi": ffi})
@@ -0,0 +1,94 @@
+#-----------------------------------------------------------------------
+# LEVEL OF DETAIL FOR THE GRID GEOMETRIES
+'''
+Cells that are far away from the camera cover only a few pixels on screen,
+so they are drawn with a coarser tessellation. Every template has up to four
+tiers of radial_segments (and capSubdivisions for capsules) and every cell
+picks a tier from its projected size. A hysteresis band around the thresholds
+keeps cells from switching back and forth at a border.
+'''
+import math
+import numpy as np
+
+# the GUI does not allow fewer segments
+MIN_RADIAL_SEGMENTS = 4
+MIN_CAP_SUBDIVISIONS = 1
+
+
+'''
+TIER_KEYS
+the template keys of the tiers of a shape, from fine to coarse. Every tier
+halves the segments until the minimum is reached, equal tiers are dropped.
+parameters: key: tuple from geometry_cache.template_key()
+count: int, maximum number of tiers
+returns: list of template keys, the first one is the key itself'''
+def tier_keys(key, count=4):
+    shape, radius, height, radial_segments, cap_subdivisions = key
+    keys = []
+    for tier in range(count):
+        segments = max(MIN_RADIAL_SEGMENTS, int(radial_segments) >> tier)
+        caps = cap_subdivisions
+        if shape == "capsule":
+            caps = max(MIN_CAP_SUBDIVISIONS, int(cap_subdivisions) >> tier)
+        tier_key = (shape, radius, height, segments, caps)
+        if tier_key not in keys:
+            keys.append(tier_key)
+    return keys
+
+
+'''
+BOUNDING_RADIUS
+radius of the sphere around the shape of a template key
+returns: float'''
+def bounding_radius(key):
+    shape, radius, height, _, _ = key
+    if shape == "capsule":
+        return radius + height / 2
+    return math.hypot(radius, height / 2)
+
+
+'''
+PROJECTED_SIZES
+radius in pixels of the bounding spheres of all cells on screen
+parameters: centers: array (n, 3) of the cell positions
+eye: (x, y, z) of the camera, radius: float, bounding radius of one cell
+fov: float, vertical field of view in degrees, viewport_height: pixels
+returns: float array (n,)'''
+def projected_sizes(centers, eye, radius, fov, viewport_height):
+    distance = np.linalg.norm(centers - np.asarray(eye, dtype=np.float64), axis=1)
+    # a cell the camera is inside of counts as very large
+    distance = np.maximum(distance, 1e-6)
+    focal = viewport_height / 2 / math.tan(math.radians(fov) / 2)
+    return radius / distance * focal
+
+
+'''
+LODSELECTOR
+chooses a tier per cell from its projected size
+parameters: thresholds: pixel sizes from fine to coarse, a cell smaller than
+thresholds[k] uses at least tier k+1
+hysteresis: float, relative band around every threshold
+'''
+class LodSelector:
+    def __init__(self, thresholds=(120, 50, 20), hysteresis=0.15):
+        # searchsorted needs ascending values
+        self._thresholds = np.asarray(sorted(thresholds), dtype=np.float64)
+        self.hysteresis = hysteresis
+
+    def _tier(self, sizes, scale, tiers):
+        # number of thresholds the size is below of
+        below = len(self._thresholds) - np.searchsorted(self._thresholds * scale, sizes, side="right")
+        return np.minimum(below, tiers - 1)
+
+    '''
+    SELECT
+    parameters: sizes: array (n,) of projected sizes
+    current: int array (n,) of the current tiers, -1 for cells without a tier
+    tiers: int, number of tiers the template has
+    returns: int array (n,) of the new tiers'''
+    def select(self, sizes, current, tiers):
+        # becoming finer needs a size clearly above the threshold, becoming
+        # coarser one clearly below it
+        coarsest = self._tier(sizes, 1 + self.hysteresis, tiers)
+        finest = self._tier(sizes, 1 - self.hysteresis, tiers)
+        return np.clip(current, finest, coarsest)
@@ -0,0 +1,625 @@
+#-----------------------------------------------------------------------
+# L-SYSTEM OF WEBAPP 2
+'''
+The rules, the string rewriting and the turtle of the trees, in plain python
+so they can run and be measured without a browser. webapp_2 only turns the
+segments of the turtle into three.js lines.
+'''
+from functools import lru_cache
+import math
+import numpy as np
+
+# the turtle turns around the z-axis by this angle for "c" and "e"
+TURN_ANGLE = math.pi / 7
+# the first step of the turtle, straight up
+STEP = (0.0, 15.0, 0.0)
+# longest derivation that is drawn, deeper trees are refused up front
+MAX_SYMBOLS = 10 ** 7
+
+
+#-----------------------------------------------------------------------
+# RULE TABLES
+# every symbol of a table has a rule, constants are replaced by themselves
+COORDINATE_RULES = {"g": "gg", "h": "hh", "i": "ii", "k": "kk"}
+TREE_RULES = {"d": "abcdfbedfabedfcd", "a": "aa", "b": "b", "c": "c", "e": "e", "f": "f"}
+
+
+'''
+LSYSTEM
+an L-system compiled from a rule table. A whole generation is rewritten with
+str.translate() in C instead of concatenating the string symbol by symbol,
+and the generations are expanded in a loop, so the depth is not limited by
+the recursion limit. stream() hands out the symbols of a derivation one after
+another without building the whole string.
+parameters: rules: dictionary symbol -> replacement string
+chunk_size: int, longest expansion of one symbol that stream() keeps cached
+'''
+class LSystem:
+    def __init__(self, rules, chunk_size=4096):
+        for replacement in rules.values():
+            missing = set(replacement) - set(rules)
+            if missing:
+                raise ValueError("no rule for the symbols {}".format(sorted(missing)))
+        self.rules = dict(rules)
+        self.chunk_size = chunk_size
+        self._table = str.maketrans(self.rules)
+        # _levels[n][symbol] is the symbol expanded n times, None if too long
+        self._levels = [{symbol: symbol for symbol in self.rules}]
+
+    def _check(self, axiom):
+        missing = set(axiom) - set(self.rules)
+        if missing:
+            raise ValueError("no rule for the symbols {}".format(sorted(missing)))
+
+    '''
+    EXPAND
+    parameters: axiom: string, depth: int, number of generations
+    returns: string of the last generation'''
+    def expand(self, axiom, depth):
+        self._check(axiom)
+        for _ in range(depth):
+            axiom = axiom.translate(self._table)
+        return axiom
+
+    # short expansions of every symbol, built bottom up once per level
+    def _expansions(self, levels):
+        while len(self._levels) <= levels:
+            below = self._levels[-1]
+            level = {}
+            for symbol, replacement in self.rules.items():
+                parts = [below[child] for child in replacement]
+                if None in parts or sum(map(len, parts)) > self.chunk_size:
+                    level[symbol] = None
+                else:
+                    level[symbol] = "".join(parts)
+            self._levels.append(level)
+        return self._levels[levels]
+
+    '''
+    CHUNKS
+    the last generation in pieces: a depth first walk over the derivation
+    tree with one iterator per generation, subtrees that are short enough
+    come out as one cached string
+    parameters: axiom: string, depth: int
+    returns: generator of strings'''
+    def chunks(self, axiom, depth):
+        self._check(axiom)
+        stack = [(iter(axiom), depth)]
+        while stack:
+            symbols, levels = stack[-1]
+            expansions = self._expansions(levels)
+            for symbol in symbols:
+                expansion = expansions[symbol]
+                if expansion is not None:
+                    yield expansion
+                else:
+                    stack.append((iter(self.rules[symbol]), levels - 1))
+                    break
+            else:
+                stack.pop()
+
+    '''
+    STREAM
+    the symbols of the last generation one by one, the memory stays bounded
+    by the depth and the chunk size
+    parameters: axiom: string, depth: int
+    returns: generator of symbols'''
+    def stream(self, axiom, depth):
+        for chunk in self.chunks(axiom, depth):
+            yield from chunk
+
+    '''
+    COUNTS
+    how often every symbol occurs in the last generation, without expanding:
+    with the production matrix M (M[i][j] = number of symbol j in the rule of
+    symbol i) the counts are counts(axiom) * M^depth, and the power takes
+    log2(depth) matrix products with exact python integers
+    parameters: axiom: string, depth: int
+    returns: dictionary symbol -> int'''
+    def counts(self, axiom, depth):
+        self._check(axiom)
+        symbols = list(self.rules)
+        matrix = np.array([[self.rules[row].count(column) for column in symbols] for row in symbols],
+                          dtype=object)
+        power = np.identity(len(symbols), dtype=object)
+        while depth > 0:
+            if depth & 1:
+                power = power.dot(matrix)
+            matrix = matrix.dot(matrix)
+            depth >>= 1
+        vector = np.array([axiom.count(symbol) for symbol in symbols], dtype=object)
+        return dict(zip(symbols, vector.dot(power)))
+
+    def length(self, axiom, depth):
+        return sum(self.counts(axiom, depth).values())
+
+    '''
+    CHECK_SIZE
+    refuses a derivation that is too long before anything is expanded
+    parameters: axiom: string, depth: int, max_symbols: int'''
+    def check_size(self, axiom, depth, max_symbols=MAX_SYMBOLS):
+        length = self.length(axiom, depth)
+        if length > max_symbols:
+            raise ValueError("depth {} of {!r} has {} symbols, more than {}".format(
+                depth, axiom, length, max_symbols))
+
+
+COORDINATES = LSystem(COORDINATE_RULES)
+TREE = LSystem(TREE_RULES)
+
+
+'''
+COORDINATE_OFFSET
+the same as use_coordinates(translate_coordinates(0, iterations, axiom)),
+from the symbol counts instead of the expanded string
+parameters: axiom: string, iterations: int
+returns: start_g, start_h'''
+def coordinate_offset(axiom, iterations):
+    counts = COORDINATES.counts(axiom, max(1, iterations))
+    return 25 * (counts["g"] - counts["i"]), 10 * (counts["h"] - counts["k"])
+
+
+''' GENERATE_COORDINATES
+define rules for coordinates for draw_system.
+parameters: symbol: input string symbol to generate output string
+returns: output string'''
+def generate_coordinates(symbol):
+    return COORDINATE_RULES.get(symbol)
+
+'''
+TRANSLATE_COORDINATES
+creates a string of coordinates for later tree creation.
+parameters:
+current_iteration: int, initially 0
+max_iterations: int, defining how many iterations we want
+axiom: string, axiom to start the string creation with
+'''
+def translate_coordinates(current_iteration, max_iterations, axiom):
+    # at least one iteration, like the recursive version
+    return COORDINATES.expand(axiom, max(1, max_iterations - current_iteration))
+'''
+USE_COORDINATES
+function that uses the previously created axiom for coordinate creation.
+parameters: axiom: string
+returns: start_g: int, to be used for tree placement on x-axis
+start_h: int, to be used for tree placement on second axis'''
+def use_coordinates(axiom):
+    start_g = 0
+    start_h = 0
+    for symbol in axiom:
+        if symbol == "g":
+            start_g = start_g + 25
+        if symbol == "h":
+            start_h = start_h + 10
+        if symbol == "i":
+            start_g = start_g - 25
+        if symbol == "k":
+            start_h = start_h - 10
+    return start_g, start_h
+
+
+#-----------------------------------------------------------------------
+'''
+GENERATE
+define the rules to be used in the L-system
+params: symbol: string
+returns: string or symbol (string)'''
+def generate(symbol):
+    return TREE_RULES.get(symbol)
+
+'''SYSTEM
+expands an AXIOM from current_iteration up to max_iterations with the rules of generate()
+'''
+def system(current_iteration, max_iterations, axiom):
+    return TREE.expand(axiom, max(1, max_iterations - current_iteration))
+
+'''
+TURTLE
+interprets the symbols of an axiom like the first draw_system() of webapp_2
+did, with tuples instead of THREE.Vector3: "a" and "d" draw one branch, "b" saves the state,
+"c" and "e" turn around the z-axis and "f" goes back to the last saved state
+parameters: axiom: string or any iterable of symbols, e.g. LSystem.stream()
+initial_point: (x, y, z)
+returns: generator of (start, end) points of the branches'''
+def turtle(axiom, initial_point):
+    x, y, z = initial_point
+    dx, dy, dz = STEP
+    cos = math.cos(TURN_ANGLE)
+    sin = math.sin(TURN_ANGLE)
+    old_states = []
+    for symbol in axiom:
+        if symbol == "a" or symbol == "d":
+            start = (x, y, z)
+            x, y, z = x + dx, y + dy, z + dz
+            yield start, (x, y, z)
+        elif symbol == "b":
+            old_states.append((x, y, z, dx, dy, dz))
+        # same rotation as Vector3.applyAxisAngle around (0, 0, 1)
+        elif symbol == "c":
+            dx, dy = dx * cos - dy * sin, dx * sin + dy * cos
+        elif symbol == "e":
+            dx, dy = dx * cos + dy * sin, -dx * sin + dy * cos
+        elif symbol == "f":
+            x, y, z, dx, dy, dz = old_states.pop()
+
+
+'''
+BRANCH_COUNT
+number of branches the turtle draws for a derivation, e.g. to allocate the
+vertex buffer before the turtle runs
+parameters: axiom: string, depth: int
+returns: int'''
+def branch_count(axiom, depth, lsystem=TREE):
+    counts = lsystem.counts(axiom, depth)
+    return counts.get("a", 0) + counts.get("d", 0)
+
+
+'''
+TURTLE_BOUNDS
+the box around all branches of a derivation, without expanding it.
+The turtle only turns by TURN_ANGLE, so it can only head into one of
+2*pi/TURN_ANGLE directions. For every symbol, generation and heading the
+turn, the displacement and the box of its expansion are built from the
+generation below, which takes depth steps instead of one per symbol.
+"b" and "f" must be constants and pair up inside every rule.
+parameters: axiom: string, depth: int, initial_point: (x, y, z)
+returns: (x, y, z) minimum and maximum of the box, None if nothing is drawn'''
+def turtle_bounds(axiom, depth, initial_point=(0, 0, 0), lsystem=TREE):
+    headings = round(2 * math.pi / TURN_ANGLE)
+    if not math.isclose(headings * TURN_ANGLE, 2 * math.pi):
+        raise ValueError("the turn angle does not divide the full circle")
+    directions = [(STEP[0] * math.cos(n * TURN_ANGLE) - STEP[1] * math.sin(n * TURN_ANGLE),
+                   STEP[0] * math.sin(n * TURN_ANGLE) + STEP[1] * math.cos(n * TURN_ANGLE))
+                  for n in range(headings)]
+    empty = (math.inf, math.inf, -math.inf, -math.inf)
+
+    # effects[symbol][heading] = (turn, dx, dy, box) of generation 0
+    effects = {}
+    for symbol in lsystem.rules:
+        if symbol == "a" or symbol == "d":
+            effects[symbol] = [(0, dx, dy, (min(0, dx), min(0, dy), max(0, dx), max(0, dy)))
+                               for dx, dy in directions]
+        else:
+            turn = {"c": 1, "e": -1}.get(symbol, 0)
+            effects[symbol] = [(turn, 0.0, 0.0, empty)] * headings
+    for symbol in ("b", "f"):
+        if lsystem.rules.get(symbol, symbol) != symbol:
+            raise ValueError("{!r} has to be a constant".format(symbol))
+
+    def compose(symbols, heading, effects):
+        turn, x, y = 0, 0.0, 0.0
+        box = empty
+        saved = []
+        for symbol in symbols:
+            if symbol == "b":
+                saved.append((turn, x, y))
+            elif symbol == "f":
+                if not saved:
+                    raise ValueError("{!r} goes back to a state it did not save".format(symbols))
+                turn, x, y = saved.pop()
+            else:
+                t, dx, dy, (x0, y0, x1, y1) = effects[symbol][(heading + turn) % headings]
+                box = (min(box[0], x + x0), min(box[1], y + y0), max(box[2], x + x1), max(box[3], y + y1))
+                x, y, turn = x + dx, y + dy, turn + t
+        return turn % headings, x, y, box
+
+    for _ in range(depth):
+        # "b" and "f" are never looked up, compose() handles them itself
+        effects = {symbol: [compose(replacement, heading, effects) for heading in range(headings)]
+                   for symbol, replacement in lsystem.rules.items() if symbol not in "bf"}
+    _, _, _, (x0, y0, x1, y1) = compose(axiom, 0, effects)
+    if x0 > x1:
+        return None
+    px, py, pz = initial_point
+    return (px + x0, py + y0, pz), (px + x1, py + y1, pz)
+
+
+'''
+TURTLE_SEGMENTS
+returns: list of (start, end) points of all branches of turtle()'''
+def turtle_segments(axiom, initial_point):
+    return list(turtle(axiom, initial_point))
+
+
+#-----------------------------------------------------------------------
+# ARRAY TURTLE
+# symbols of the turtle as bytes
+_DRAW = (ord("a"), ord("d"))
+_PUSH, _POP, _LEFT, _RIGHT = ord("b"), ord("f"), ord("c"), ord("e")
+
+
+'''
+_BRACKETS
+pairs every "b" with its "f". For every pair, "f" has to undo the symbols
+between them that are not inside an inner pair, i.e. the symbols one level
+deeper than the pair. Sorted by level, these symbols are a contiguous run,
+so their sum is a difference of one cumulative sum and all pairs of all
+levels are done at once.
+parameters: push, pop: bool arrays (n,) of the "b" and "f" symbols
+returns: the sort order of the symbols by depth, the closing index and the
+start and end of the run in the sort order of every closed pair'''
+def _brackets(push, pop):
+    n = len(push)
+    # nesting depth after every symbol, a pair has the depth outside of it
+    depth = np.cumsum(push.astype(np.int32) - pop)
+    if n and depth.min() < 0:
+        raise ValueError("the turtle goes back to a state it did not save")
+    open_count = int(depth[-1]) if n else 0
+    # sorted by level, "b" and "f" alternate. The "b" that are never closed
+    # get a closing "f" after the end.
+    brackets = np.flatnonzero(push | pop)
+    levels = depth[brackets] - push[brackets]
+    if open_count:
+        brackets = np.concatenate((brackets, n + np.arange(open_count)))
+        levels = np.concatenate((levels, np.arange(open_count - 1, -1, -1)))
+    pairs = np.lexsort((brackets, levels))
+    opens, closes = brackets[pairs[0::2]], brackets[pairs[1::2]]
+    levels = levels[pairs[0::2]]
+    closed = closes < n
+    opens, closes, levels = opens[closed], closes[closed], levels[closed]
+    # the stable sort keeps the order of the symbols within a depth, a small
+    # integer type lets numpy use a radix sort
+    small = depth.astype(np.int16) if open_count < 2 ** 15 and depth.max(initial=0) < 2 ** 15 else depth
+    order = np.argsort(small, kind="stable")
+    stride = np.int64(n + 1)
+    keys = depth[order] * stride + order
+    inner = (levels.astype(np.int64) + 1) * stride
+    start = np.searchsorted(keys, inner + opens, side="right")
+    end = np.searchsorted(keys, inner + closes, side="left")
+    return order, closes, start, end
+
+
+# the sum of values over the runs of _brackets()
+def _run_sums(values, order, start, end):
+    sums = np.empty(len(values) + 1, dtype=values.dtype)
+    sums[0] = 0
+    np.cumsum(values[order], out=sums[1:])
+    return sums[end] - sums[start]
+
+
+'''
+TURTLE_VERTICES
+the same branches as turtle(), computed with arrays instead of one python
+step per symbol. The heading is a cumulative sum of the turns and the
+position a cumulative sum of the steps, and every "f" gets the correction that
+brings the turtle back to the state of its "b". x and y are one complex
+number, so a step is STEP rotated by the precomputed rotation of its heading.
+parameters: axiom: string, initial_point: (x, y, z)
+out: float32 array (2 * branches, 3) to write into, e.g. sized with
+branch_count(), a new array if None
+returns: float32 array (2 * branches, 3), two vertices per branch'''
+def turtle_vertices(axiom, initial_point=(0, 0, 0), out=None):
+    codes = np.frombuffer(axiom.encode("ascii"), dtype=np.uint8)
+    draw = (codes == _DRAW[0]) | (codes == _DRAW[1])
+    push = codes == _PUSH
+    pop = codes == _POP
+    order, closes, start, end = _brackets(push, pop)
+
+    heading = (codes == _LEFT).astype(np.int32) - (codes == _RIGHT)
+    heading[closes] -= _run_sums(heading, order, start, end)
+    np.cumsum(heading, out=heading)
+
+    # one rotation of STEP per heading the turtle can have
+    low = heading.min(initial=0)
+    rotations = np.exp(1j * TURN_ANGLE * np.arange(low, heading.max(initial=0) + 1)) * complex(STEP[0], STEP[1])
+    steps = rotations[heading - low]
+    steps[~draw] = 0
+    moves = steps.copy()
+    moves[closes] -= _run_sums(steps, order, start, end)
+    position = np.cumsum(moves)
+
+    ends = position[draw]
+    branches = len(ends)
+    if out is None:
+        out = np.empty((2 * branches, 3), dtype=np.float32)
+    out = out[:2 * branches]
+    x, y, z = initial_point
+    out[1::2, 0] = ends.real + x
+    out[1::2, 1] = ends.imag + y
+    ends -= steps[draw]
+    out[0::2, 0] = ends.real + x
+    out[0::2, 1] = ends.imag + y
+    # the turtle only turns around the z-axis, z moves by the same amount per step
+    if STEP[2]:
+        lift = draw * float(STEP[2])
+        climb = lift.copy()
+        climb[closes] -= _run_sums(lift, order, start, end)
+        heights = np.cumsum(climb)[draw] + z
+        out[1::2, 2] = heights
+        out[0::2, 2] = heights - STEP[2]
+    else:
+        out[:, 2] = z
+    return out
+
+
+'''
+BRANCH_DEPTHS
+the depth of every branch, the number of states saved with "b" and not yet
+restored with "f" when it is drawn. The trunk has depth 0, every fork one
+more, so the branches of depth <= k are the tree cut off after k forks.
+parameters: axiom: string
+returns: int32 array (branches,) in the order of turtle_vertices()'''
+def branch_depths(axiom):
+    codes = np.frombuffer(axiom.encode("ascii"), dtype=np.uint8)
+    depth = np.cumsum((codes == _PUSH).astype(np.int32) - (codes == _POP))
+    return depth[(codes == _DRAW[0]) | (codes == _DRAW[1])]
+
+
+'''
+DEPTH_ORDER
+sorts the branches by depth, keeping the turtle order within a depth. A
+vertex buffer in this order draws a coarser tree when only a prefix of it is
+drawn, e.g. with BufferGeometry.setDrawRange().
+parameters: depths: int array from branch_depths()
+returns: int array, the branches in depth order'''
+def depth_order(depths):
+    small = depths.astype(np.int16) if depths.max(initial=0) < 2 ** 15 else depths
+    return np.argsort(small, kind="stable")
+
+
+#-----------------------------------------------------------------------
+# REPEATED SUBTREES
+# the last generations of a tree are drawn once per symbol and placed by
+# transform, every "d" of a generation grows into the same subtree
+SUBTREE_LEVELS = 3
+
+
+'''
+SUBTREE
+the branches of one symbol expanded `levels` times, drawn from the origin
+with heading 0, and what the subword does to the turtle. Cached by the
+symbol, the levels and the turtle parameters, so every repeated subword of
+every tree goes through the turtle only once. The branches are ordered by
+their depth like in depth_order().
+parameters: symbol: string, levels: int
+returns: float32 vertices (2 * branches, 3), the number of turns and the
+displacement (dx, dy, dz) of the turtle'''
+def subtree(symbol, levels, lsystem=TREE):
+    return _subtree(symbol, levels, lsystem, STEP, TURN_ANGLE)[:3]
+
+
+'''
+SUBTREE_BOUNDS
+where the depths of the branches of subtree() start
+parameters: symbol: string, levels: int
+returns: int array, the branches of depth k are [bounds[k], bounds[k + 1])'''
+def subtree_bounds(symbol, levels, lsystem=TREE):
+    return _subtree(symbol, levels, lsystem, STEP, TURN_ANGLE)[3]
+
+@lru_cache(maxsize=256)
+def _subtree(symbol, levels, lsystem, step, turn_angle):
+    axiom = lsystem.expand(symbol, levels)
+    depths = branch_depths(axiom)
+    order = depth_order(depths)
+    vertices = turtle_vertices(axiom).reshape(-1, 2, 3)[order].reshape(-1, 3)
+    vertices.flags.writeable = False
+    bounds = np.searchsorted(depths[order], np.arange(depths.max(initial=-1) + 2))
+    bounds.flags.writeable = False
+    turn, x, y, z = 0, 0.0, 0.0, 0.0
+    saved = []
+    for letter in axiom:
+        if letter == "a" or letter == "d":
+            angle = turn * turn_angle
+            x += step[0] * math.cos(angle) - step[1] * math.sin(angle)
+            y += step[0] * math.sin(angle) + step[1] * math.cos(angle)
+            z += step[2]
+        elif letter == "b":
+            saved.append((turn, x, y, z))
+        elif letter == "c":
+            turn += 1
+        elif letter == "e":
+            turn -= 1
+        elif letter == "f":
+            turn, x, y, z = saved.pop()
+    return vertices, turn, (x, y, z), bounds
+
+
+'''
+PLACEMENT_MATRICES
+matrices of a rotation around the z-axis followed by a translation, stored
+transposed like grid_layout.placement_matrices(), so matrices.ravel() is the
+layout of Matrix4.elements
+parameters: placements: array (m, 4) of x, y, z and the angle
+returns: float32 array (m, 4, 4)'''
+def placement_matrices(placements):
+    placements = np.asarray(placements, dtype=np.float64).reshape(-1, 4)
+    cos = np.cos(placements[:, 3])
+    sin = np.sin(placements[:, 3])
+    matrices = np.zeros((len(placements), 4, 4), dtype=np.float32)
+    matrices[:, 0, 0] = cos
+    matrices[:, 0, 1] = sin
+    matrices[:, 1, 0] = -sin
+    matrices[:, 1, 1] = cos
+    matrices[:, 2, 2] = 1
+    matrices[:, 3, :3] = placements[:, :3]
+    matrices[:, 3, 3] = 1
+    return matrices
+
+
+'''
+INSTANCE_PLAN
+splits a tree into repeated subtrees: the generation `split` levels above
+the last one is walked with the turtle, and every symbol of it becomes a
+reference to subtree(symbol, split) at the state of the turtle. Cached by the
+axiom, the depth, the split and the turtle parameters.
+parameters: axiom: string, depth: int, split: int, levels per subtree
+returns: dictionary (symbol, levels) -> float32 matrices (m, 4, 4) relative
+to the base point of the tree'''
+def instance_plan(axiom, depth, split=SUBTREE_LEVELS, lsystem=TREE):
+    return _instance_plan(axiom, depth, split, lsystem, STEP, TURN_ANGLE)[0]
+
+
+'''
+INSTANCE_DEPTHS
+the depth at which every subtree of instance_plan() is placed, the depth of
+a branch in the tree is this plus its depth in the subtree
+parameters: axiom: string, depth: int, split: int, levels per subtree
+returns: dictionary (symbol, levels) -> int array (m,)'''
+def instance_depths(axiom, depth, split=SUBTREE_LEVELS, lsystem=TREE):
+    return _instance_plan(axiom, depth, split, lsystem, STEP, TURN_ANGLE)[1]
+
+@lru_cache(maxsize=64)
+def _instance_plan(axiom, depth, split, lsystem, step, turn_angle):
+    for symbol in ("b", "f"):
+        if lsystem.rules.get(symbol, symbol) != symbol:
+            raise ValueError("{!r} has to be a constant".format(symbol))
+    levels = min(split, depth)
+    turn, x, y, z = 0, 0.0, 0.0, 0.0
+    saved = []
+    placements = {}
+    depths = {}
+    for symbol in lsystem.expand(axiom, depth - levels):
+        if symbol == "b":
+            saved.append((turn, x, y, z))
+        elif symbol == "f":
+            if not saved:
+                raise ValueError("the turtle goes back to a state it did not save")
+            turn, x, y, z = saved.pop()
+        else:
+            vertices, turns, (dx, dy, dz), _ = _subtree(symbol, levels, lsystem, step, turn_angle)
+            angle = turn * turn_angle
+            if len(vertices):
+                placements.setdefault((symbol, levels), []).append((x, y, z, angle))
+                depths.setdefault((symbol, levels), []).append(len(saved))
+            x, y = x + dx * math.cos(angle) - dy * math.sin(angle), y + dx * math.sin(angle) + dy * math.cos(angle)
+            z += dz
+            turn += turns
+    return ({key: placement_matrices(value) for key, value in placements.items()},
+            {key: np.array(value, dtype=np.int32) for key, value in depths.items()})
+
+
+'''
+DEPTH_COUNTS
+number of branches at every depth of a tree, from the subtrees of
+instance_plan() without running the turtle over the whole tree
+parameters: axiom: string, depth: int, split: int, levels per subtree
+returns: int array, the branches of depth 0, 1, ...'''
+def depth_counts(axiom, depth, split=SUBTREE_LEVELS, lsystem=TREE):
+    counts = np.zeros(1, dtype=np.int64)
+    for key, depths in instance_depths(axiom, depth, split, lsystem).items():
+        local = np.diff(subtree_bounds(key[0], key[1], lsystem))
+        placed = np.bincount(depths)
+        tree = np.convolve(placed, local)
+        if len(tree) > len(counts):
+            counts = np.pad(counts, (0, len(tree) - len(counts)))
+        counts[:len(tree)] += tree
+    return counts
+
+
+'''
+FOREST_INSTANCES
+the subtrees of a whole forest: trees that are the same apart from their base
+point and subtrees that repeat inside or across trees share one vertex buffer
+parameters: specs: list of (axiom, depth, (x, y, z) base point)
+split: int, levels per subtree
+returns: dictionary (symbol, levels) -> (float32 vertices (2 * branches, 3),
+float32 matrices (instances, 4, 4))'''
+def forest_instances(specs, split=SUBTREE_LEVELS, lsystem=TREE):
+    matrices = {}
+    for axiom, depth, base in specs:
+        for key, local in instance_plan(axiom, depth, split, lsystem).items():
+            placed = local.copy()
+            placed[:, 3, :3] += np.asarray(base, dtype=np.float32)
+            matrices.setdefault(key, []).append(placed)
+    return {key: (subtree(key[0], key[1], lsystem)[0], np.concatenate(value))
+            for key, value in matrices.items()}
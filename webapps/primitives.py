@@ -0,0 +1,232 @@
+#-----------------------------------------------------------------------
+# VERTEX GENERATORS FOR THE GRID GEOMETRIES
+'''
+NumPy versions of the three.js (r145) CylinderGeometry, CapsuleGeometry and
+EdgesGeometry. They produce the same vertices, normals and triangles as the
+javascript constructors, so a template can be built, cached and tested in
+plain python and handed to a BufferGeometry with one transfer per attribute.
+'''
+from collections import namedtuple
+import math
+import numpy as np
+
+'''
+PRIMITIVE
+positions, normals: float32 arrays (n, 3)
+indices: uint16 or uint32 array of the triangles, three per face
+edges: flat index pairs into positions, the lines of EdgesGeometry'''
+Primitive = namedtuple("Primitive", "positions normals indices edges")
+
+# a change of the vertices, normals or indices the generators produce
+# increases this, the snapshots of the older ones are not loaded again
+PRIMITIVES_VERSION = 1
+# three.js switches to 32 bit indices above this vertex index
+MAX_UINT16 = 65535
+
+
+def _index_array(indices, vertex_count):
+    dtype = np.uint32 if vertex_count - 1 > MAX_UINT16 else np.uint16
+    return np.asarray(indices, dtype=dtype).ravel()
+
+
+'''
+CYLINDER
+same tessellation as THREE.CylinderGeometry(radius, radius, height,
+radial_segments) with one height segment and closed caps
+returns: Primitive'''
+def cylinder(radius, height, radial_segments):
+    segments = int(math.floor(radial_segments))
+    half = height / 2
+    theta = np.arange(segments + 1) / segments * (2 * math.pi)
+    sin = np.sin(theta)
+    cos = np.cos(theta)
+    ring = np.arange(segments + 1)
+
+    # torso: top row then bottom row, the seam vertex is doubled
+    torso = np.empty((2, segments + 1, 3))
+    torso[:, :, 0] = radius * sin
+    torso[0, :, 1] = half
+    torso[1, :, 1] = -half
+    torso[:, :, 2] = radius * cos
+    torso_normals = np.empty_like(torso)
+    torso_normals[:, :, 0] = sin
+    torso_normals[:, :, 1] = 0
+    torso_normals[:, :, 2] = cos
+    a = ring[:-1]
+    b = a + segments + 1
+    c = b + 1
+    d = a + 1
+    torso_faces = np.stack([a, b, d, b, c, d], axis=1).reshape(-1, 3)
+
+    positions = [torso.reshape(-1, 3)]
+    normals = [torso_normals.reshape(-1, 3)]
+    faces = [torso_faces]
+    start = 2 * (segments + 1)
+    for sign in (1, -1):
+        # one center vertex per segment, then the rim
+        cap = np.zeros((2 * segments + 1, 3))
+        cap[:, 1] = half * sign
+        cap[segments:, 0] = radius * sin
+        cap[segments:, 2] = radius * cos
+        cap_normals = np.zeros_like(cap)
+        cap_normals[:, 1] = sign
+        center = start + ring[:-1]
+        rim = start + segments + ring[:-1]
+        if sign == 1:
+            cap_faces = np.stack([rim, rim + 1, center], axis=1)
+        else:
+            cap_faces = np.stack([rim + 1, rim, center], axis=1)
+        positions.append(cap)
+        normals.append(cap_normals)
+        faces.append(cap_faces)
+        start += len(cap)
+
+    return _primitive(np.concatenate(positions), np.concatenate(normals), np.concatenate(faces))
+
+
+'''
+CAPSULE_PROFILE
+the points of the Path that THREE.CapsuleGeometry turns around the y-axis:
+a quarter arc at the bottom, a straight line and a quarter arc at the top
+returns: float array (4*cap_subdivisions+2, 2)'''
+def capsule_profile(radius, length, cap_subdivisions):
+    resolution = 2 * cap_subdivisions
+    t = np.arange(resolution + 1) / resolution
+    bottom_angle = math.pi * 1.5 + t * (math.pi * 0.5)
+    bottom = np.stack([radius * np.cos(bottom_angle), -length / 2 + radius * np.sin(bottom_angle)], axis=1)
+    top_angle = t * (math.pi * 0.5)
+    top = np.stack([radius * np.cos(top_angle), length / 2 + radius * np.sin(top_angle)], axis=1)
+    # the line between the arcs adds no point of its own, its end is the
+    # first point of the top arc
+    return np.concatenate([bottom, top])
+
+
+'''
+LATHE
+same tessellation as THREE.LatheGeometry(points, segments)
+parameters: points: array (n, 2) of the profile, segments: int
+returns: Primitive'''
+def lathe(points, segments):
+    segments = int(math.floor(segments))
+    count = len(points)
+    # normals of the profile, averaged between neighbouring segments like three.js
+    delta = np.diff(points, axis=0)
+    seg_normals = np.stack([delta[:, 1], -delta[:, 0]], axis=1)
+    profile_normals = np.empty((count, 2))
+    profile_normals[0] = seg_normals[0] / np.linalg.norm(seg_normals[0])
+    summed = seg_normals[1:] + seg_normals[:-1]
+    profile_normals[1:-1] = summed / np.linalg.norm(summed, axis=1)[:, None]
+    # three.js keeps the last segment normal without normalizing it
+    profile_normals[-1] = seg_normals[-1]
+
+    phi = np.arange(segments + 1) * (1.0 / segments) * (2 * math.pi)
+    sin = np.sin(phi)[:, None]
+    cos = np.cos(phi)[:, None]
+    positions = np.empty((segments + 1, count, 3))
+    positions[:, :, 0] = points[:, 0] * sin
+    positions[:, :, 1] = points[:, 1]
+    positions[:, :, 2] = points[:, 0] * cos
+    normals = np.empty_like(positions)
+    normals[:, :, 0] = profile_normals[:, 0] * sin
+    normals[:, :, 1] = profile_normals[:, 1]
+    normals[:, :, 2] = profile_normals[:, 0] * cos
+
+    base = (np.arange(count - 1)[None, :] + np.arange(segments)[:, None] * count).ravel()
+    a = base
+    b = base + count
+    c = base + count + 1
+    d = base + 1
+    faces = np.stack([a, b, d, c, d, b], axis=1).reshape(-1, 3)
+    return _primitive(positions.reshape(-1, 3), normals.reshape(-1, 3), faces)
+
+
+'''
+CAPSULE
+same tessellation as THREE.CapsuleGeometry(radius, length, cap_subdivisions,
+radial_segments)
+returns: Primitive'''
+def capsule(radius, length, cap_subdivisions, radial_segments):
+    return lathe(capsule_profile(radius, length, int(cap_subdivisions)), radial_segments)
+
+
+'''
+EDGE_PAIRS
+the lines THREE.EdgesGeometry draws: edges between faces that meet at more
+than threshold_angle degrees and edges with only one face. Vertices are
+matched by their position rounded to 4 decimals, like in three.js.
+The half edges are grouped by the two vertices they join. An edge of one or
+two faces is decided with arrays, only the edges shared by more faces go
+through the loop of three.js.
+parameters: positions: float32 array (n, 3), faces: int array (f, 3)
+returns: uint32 array (m, 2) of vertex index pairs, in the three.js order'''
+def edge_pairs(positions, faces, threshold_angle=1):
+    threshold_dot = math.cos(math.radians(threshold_angle))
+    faces = np.asarray(faces).reshape(-1, 3)
+    corners = positions.astype(np.float64)[faces]
+    # face normal (c - b) x (a - b)
+    normals = np.cross(corners[:, 2] - corners[:, 1], corners[:, 0] - corners[:, 1])
+    lengths = np.linalg.norm(normals, axis=1)
+    normals[lengths > 0] /= lengths[lengths > 0, None]
+    # javascript Math.round rounds halves up
+    keys = np.floor(positions.astype(np.float64) * 1e4 + 0.5).astype(np.int64)
+    # the same number for the same rounded position
+    rows = np.lexsort(keys.T)
+    new_row = np.concatenate(([True], (keys[rows[1:]] != keys[rows[:-1]]).any(axis=1)))
+    hashes = np.empty(len(keys), dtype=np.int64)
+    hashes[rows] = np.cumsum(new_row) - 1
+    hashes = hashes[faces]
+    # skip degenerate faces
+    valid = (hashes[:, 0] != hashes[:, 1]) & (hashes[:, 1] != hashes[:, 2]) & (hashes[:, 2] != hashes[:, 0])
+    hashes, faces, normals = hashes[valid], faces[valid], normals[valid]
+    if not len(faces):
+        return np.zeros((0, 2), dtype=np.uint32)
+
+    # half edge j of every face from corner j to corner j + 1, in the order
+    # three.js visits them
+    starts, ends = hashes.ravel(), np.roll(hashes, -1, axis=1).ravel()
+    pairs = np.stack((faces.ravel(), np.roll(faces, -1, axis=1).ravel()), axis=1)
+    face_of = np.repeat(np.arange(len(faces)), 3)
+    edge_keys = np.minimum(starts, ends) * np.int64(len(keys)) + np.maximum(starts, ends)
+    # the half edges of an edge one after another, in the order of visit
+    order = np.argsort(edge_keys, kind="stable")
+    sorted_keys = edge_keys[order]
+    first = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    counts = np.diff(np.append(first, len(order)))
+
+    heads = order[first]
+    seconds = order[np.minimum(first + 1, len(order) - 1)]
+    # two faces in opposite directions: the second half edge draws the edge
+    # if the faces are not flat
+    two_faces = (counts == 2) & (starts[heads] != starts[seconds])
+    # one face, or two in the same direction: the first half edge is kept as
+    # an edge of a single face
+    kept = heads[(counts == 1) | ((counts == 2) & ~two_faces)]
+    one, two = heads[two_faces], seconds[two_faces]
+    dots = np.einsum("ij,ij->i", normals[face_of[one]], normals[face_of[two]])
+    drawn = two[dots <= threshold_dot]
+
+    # edges of more than two faces, the loop of THREE.EdgesGeometry
+    shared = []
+    edge_data = {}
+    for index in np.sort(order[np.repeat(counts > 2, counts)]).tolist():
+        edge = (starts[index], ends[index])
+        reverse = (edge[1], edge[0])
+        other = edge_data.get(reverse)
+        if other is not None:
+            if np.dot(normals[face_of[index]], normals[face_of[other]]) <= threshold_dot:
+                shared.append(index)
+            edge_data[reverse] = None
+        elif edge not in edge_data:
+            edge_data[edge] = index
+    single = [index for index in edge_data.values() if index is not None]
+    drawn = np.sort(np.concatenate((drawn, np.array(shared, dtype=drawn.dtype))))
+    kept = np.sort(np.concatenate((kept, np.array(single, dtype=kept.dtype))))
+    # the edges between faces as they are found, then the edges of a single face
+    return pairs[np.concatenate((drawn, kept))].astype(np.uint32).reshape(-1, 2)
+
+
+def _primitive(positions, normals, faces):
+    positions = positions.astype(np.float32)
+    normals = normals.astype(np.float32)
+    edges = edge_pairs(positions, faces)
+    return Primitive(positions, normals, _index_array(faces, len(positions)), _index_array(edges, len(positions)))
@@ -0,0 +1,102 @@
+#-----------------------------------------------------------------------
+# ON-SCREEN HUD AND TRACE DOWNLOAD FOR THE FRAME PROFILER
+'''
+Shows the summary of a FrameProfiler in a small overlay and saves the
+recorded frames as a Chrome trace file. The HUD is hidden until it is
+switched on, and only rewritten a few times per second.
+'''
+# Import javascript modules
+from js import document, Object, Blob, URL
+# Import pyscript / pyodide modules
+from pyodide.ffi import to_js
+# Import python module
+import time
+
+
+'''
+SAMPLE_RENDERER
+writes the statistics of renderer.info into the current frame. The renderer
+has to be created with info.autoReset = False and reset once per frame,
+otherwise only the last pass of the composer is counted.
+parameters: profiler: FrameProfiler, renderer: THREE.WebGLRenderer'''
+def sample_renderer(profiler, renderer):
+    info = renderer.info
+    profiler.sample("draw calls", info.render.calls)
+    profiler.sample("triangles", info.render.triangles)
+    profiler.sample("geometries", info.memory.geometries)
+    profiler.sample("textures", info.memory.textures)
+
+
+'''
+PROFILERHUD
+parameters: profiler: FrameProfiler, interval: float, seconds between two
+updates of the text
+'''
+class ProfilerHud:
+    def __init__(self, profiler, interval=0.25):
+        self.profiler = profiler
+        self.interval = interval
+        self.visible = False
+        self._last_update = 0.0
+        self.element = document.createElement('pre')
+        style = self.element.style
+        style.position = 'fixed'
+        style.left = '8px'
+        style.bottom = '8px'
+        style.margin = '0'
+        style.padding = '6px'
+        style.font = '11px monospace'
+        style.color = '#0f0'
+        style.background = 'rgba(0, 0, 0, 0.6)'
+        style.pointerEvents = 'none'
+        style.display = 'none'
+        document.body.appendChild(self.element)
+
+    def toggle(self, *args):
+        self.set_visible(not self.visible)
+
+    def set_visible(self, visible):
+        self.visible = bool(visible)
+        self.element.style.display = 'block' if self.visible else 'none'
+        self._last_update = 0.0
+        self.update()
+
+    '''
+    UPDATE
+    rewrites the text if the HUD is visible and the interval has passed'''
+    def update(self):
+        now = time.perf_counter()
+        if not self.visible or now - self._last_update < self.interval:
+            return
+        self._last_update = now
+        self.element.textContent = self.text()
+
+    def text(self):
+        summary = self.profiler.summary()
+        lines = []
+        if summary:
+            lines.append("frame        {:7.2f} ms".format(summary["frame_ms"]))
+            for name, ms in summary["phases"].items():
+                lines.append("  {:<11}{:7.2f} ms".format(name, ms))
+            for name, value in summary["samples"].items():
+                lines.append("{:<13}{:7}".format(name, value))
+            for name, value in summary["counters"].items():
+                lines.append("{:<13}{:7.1f} / frame".format(name, value))
+        for name, start, duration in self.profiler.startup_ms():
+            lines.append("{:<13}{:7.1f} ms at {:.0f} ms".format(name, duration, start))
+        return "\n".join(lines)
+
+
+'''
+DOWNLOAD_TRACE
+saves the recorded frames of a profiler as a json file
+parameters: profiler: FrameProfiler, filename: string'''
+def download_trace(profiler, filename="trace.json"):
+    options = Object.fromEntries(to_js({"type": "application/json"}))
+    blob = Blob.new(to_js([profiler.export_json()]), options)
+    url = URL.createObjectURL(blob)
+    link = document.createElement('a')
+    link.href = url
+    link.download = filename
+    link.click()
+    URL.revokeObjectURL(url)
@@ -0,0 +1,109 @@
+#-----------------------------------------------------------------------
+# COALESCING REBUILD PIPELINE FOR THE GRID OF WEBAPP 1
+'''
+A slider that is scrubbed sends many values between two frames and more
+while the rebuild of the previous value is still running. The pipeline
+rebuilds only for the latest values: all inputs of a frame start one rebuild,
+and a rebuild that is outdated by a new input is cancelled and started again
+with the newest values. A rebuild is a generator that is stepped for a part
+of every frame, like the forest of webapp_2, and only changes the scene in
+its last step, so the previous geometry stays on screen until then.
+
+The latency from the last input to the frame that shows its result is
+measured for every rebuild that finishes.
+'''
+import time
+
+
+'''
+REBUILDPIPELINE
+parameters: start: function without arguments that starts a rebuild for the
+current values, returns a generator whose last step changes the scene
+stale: function without arguments, True if an input arrived that the running
+rebuild does not contain
+budget_ms: float, milliseconds of a frame the rebuild may take, at least one
+step is run per frame
+clock: function returning seconds
+'''
+class RebuildPipeline:
+    def __init__(self, start, stale, budget_ms=8, clock=time.perf_counter):
+        self.start = start
+        self.stale = stale
+        self.budget_ms = budget_ms
+        self.clock = clock
+        self._running = None
+        # time of the first input that is not built yet and of the latest one
+        self._input_at = None
+        self._since = None
+        self._frames = 0
+        # statistics of the rebuilds
+        self.started = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.latency_ms = None
+        self.latency_frames = 0
+        self.max_latency_ms = 0.0
+
+    @property
+    def busy(self):
+        return self._running is not None or self.stale()
+
+    '''
+    REQUEST
+    records an input, e.g. from onChange of a slider. The latency is
+    measured from the latest input.'''
+    def request(self, *args):
+        self._input_at = self.clock()
+
+    '''
+    STEP
+    starts a new rebuild if the values changed and runs the rebuild for the
+    budget of this frame
+    returns: bool, True if the rebuild finished in this frame'''
+    def step(self):
+        start = self.clock()
+        if self.stale():
+            if self._running is not None:
+                self._running.close()
+                self.cancelled += 1
+            self._running = self.start()
+            self._since = self._input_at if self._input_at is not None else start
+            self._input_at = None
+            self._frames = 0
+            self.started += 1
+        if self._running is None:
+            return False
+        self._frames += 1
+        while True:
+            try:
+                next(self._running)
+            except StopIteration:
+                self._finish()
+                return True
+            if (self.clock() - start) * 1000 > self.budget_ms:
+                return False
+
+    '''
+    FINISH
+    runs the rebuild to its end without a budget, e.g. before the first frame
+    parameters: none'''
+    def finish(self):
+        budget_ms, self.budget_ms = self.budget_ms, float("inf")
+        try:
+            while self.busy:
+                self.step()
+        finally:
+            self.budget_ms = budget_ms
+
+    def _finish(self):
+        self._running = None
+        self.completed += 1
+        self.latency_ms = (self.clock() - self._since) * 1000
+        self.latency_frames = self._frames
+        self.max_latency_ms = max(self.max_latency_ms, self.latency_ms)
+
+    def report(self):
+        if self.latency_ms is None:
+            return ""
+        return "{:.0f} ms in {} frames, max {:.0f} ms, {} cancelled".format(
+            self.latency_ms, self.latency_frames, self.max_latency_ms, self.cancelled)
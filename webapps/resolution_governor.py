@@ -0,0 +1,162 @@
+#-----------------------------------------------------------------------
+# ADAPTIVE RESOLUTION FOR BOTH WEBAPPS
+'''
+When drawing a frame takes longer than the target, the governor first lowers
+the pixel ratio of the renderer step by step and then switches the FXAA pass
+off. When frames are clearly faster than the target again, it undoes the last
+step. It is fed the time the GPU took for a frame, measured by GpuTimer. Where
+the browser has no timer queries, it is fed the time between frames that were
+drawn back to back, against a target above the refresh interval of the
+display: a frame that took too long missed a refresh.
+After every step it waits a few frames, so the new frame time can settle
+before the next decision.
+'''
+# the timer query of WebGL 2, missing in some browsers
+TIMER_QUERY_EXTENSION = 'EXT_disjoint_timer_query_webgl2'
+
+
+'''
+RESOLUTIONGOVERNOR
+parameters: native_ratio: float, window.devicePixelRatio
+target_ms: float, frame time that should not be exceeded, can be changed later
+min_ratio: float, lowest pixel ratio, step: float, change per step
+headroom: float, frames below target_ms*headroom count as fast
+patience: int, number of frames between two steps
+'''
+class ResolutionGovernor:
+    def __init__(self, native_ratio, target_ms=20, min_ratio=0.5, step=0.25,
+                 headroom=0.85, patience=30):
+        self.native_ratio = native_ratio
+        self.target_ms = target_ms
+        self.min_ratio = min(min_ratio, native_ratio)
+        self.step = step
+        self.headroom = headroom
+        self.patience = patience
+        self.pixel_ratio = native_ratio
+        self.fxaa = True
+        self.average_ms = None
+        self._wait = patience
+        self._fast_frames = 0
+
+    '''
+    SAMPLE
+    feeds the time of one frame to the governor
+    parameters: frame_ms: float, the GPU time or the interval of the frame
+    returns: bool, True if pixel_ratio or fxaa changed and has to be applied'''
+    def sample(self, frame_ms):
+        if self.average_ms is None:
+            self.average_ms = frame_ms
+        else:
+            self.average_ms = 0.8 * self.average_ms + 0.2 * frame_ms
+        if self.average_ms < self.target_ms * self.headroom:
+            self._fast_frames += 1
+        else:
+            self._fast_frames = 0
+        if self._wait > 0:
+            self._wait -= 1
+            return False
+
+        if self.average_ms > self.target_ms:
+            changed = self._lower()
+        elif self._fast_frames >= self.patience:
+            changed = self._raise()
+        else:
+            changed = False
+        if changed:
+            self._wait = self.patience
+            self._fast_frames = 0
+            # the old frame times say nothing about the new resolution
+            self.average_ms = None
+        return changed
+
+    def _lower(self):
+        if self.pixel_ratio > self.min_ratio:
+            self.pixel_ratio = max(self.min_ratio, self.pixel_ratio - self.step)
+            return True
+        if self.fxaa:
+            self.fxaa = False
+            return True
+        return False
+
+    def _raise(self):
+        # undo the steps in reverse order
+        if not self.fxaa:
+            self.fxaa = True
+            return True
+        if self.pixel_ratio < self.native_ratio:
+            self.pixel_ratio = min(self.native_ratio, self.pixel_ratio + self.step)
+            return True
+        return False
+
+    def report(self):
+        return "x{:.2f}{}".format(self.pixel_ratio, "" if self.fxaa else " no FXAA")
+
+
+'''
+GPUTIMER
+measures the time the GPU takes for the draw calls between begin() and end()
+with a timer query. The result of a query comes one or more frames later,
+poll() hands out the ones that are done. Results are dropped when the GPU
+was disjoint in the meantime (e.g. a power state change), they are wrong.
+parameters: gl: WebGL2RenderingContext, extension: the timer query extension
+max_queries: int, queries on the GPU at once, frames beyond are not measured
+'''
+class GpuTimer:
+    def __init__(self, gl, extension, max_queries=4):
+        self.gl = gl
+        self.extension = extension
+        self.max_queries = max_queries
+        # queries whose result was read, used again
+        self._free = []
+        # queries that ended and wait for their result, oldest first
+        self._pending = []
+        self._active = None
+
+    '''
+    CREATE
+    parameters: renderer: THREE.WebGLRenderer
+    returns: GpuTimer, None if the browser has no timer queries'''
+    @classmethod
+    def create(cls, renderer):
+        gl = renderer.getContext()
+        extension = gl.getExtension(TIMER_QUERY_EXTENSION)
+        if extension is None:
+            return None
+        return cls(gl, extension)
+
+    def begin(self):
+        if self._active is not None or len(self._pending) >= self.max_queries:
+            return
+        self._active = self._free.pop() if self._free else self.gl.createQuery()
+        self.gl.beginQuery(self.extension.TIME_ELAPSED_EXT, self._active)
+
+    def end(self):
+        if self._active is None:
+            return
+        self.gl.endQuery(self.extension.TIME_ELAPSED_EXT)
+        self._pending.append(self._active)
+        self._active = None
+
+    '''
+    POLL
+    returns: list of float, milliseconds of the queries that are done, oldest
+    first'''
+    def poll(self):
+        gl = self.gl
+        done = 0
+        for query in self._pending:
+            if not gl.getQueryParameter(query, gl.QUERY_RESULT_AVAILABLE):
+                break
+            done += 1
+        if not done:
+            return []
+        finished, self._pending = self._pending[:done], self._pending[done:]
+        self._free.extend(finished)
+        if gl.getParameter(self.extension.GPU_DISJOINT_EXT):
+            return []
+        return [gl.getQueryParameter(query, gl.QUERY_RESULT) / 1e6 for query in finished]
+
+    def destroy(self):
+        for query in self._free + self._pending + ([self._active] if self._active is not None else []):
+            self.gl.deleteQuery(query)
+        self._free, self._pending, self._active = [], [], None
@@ -0,0 +1,339 @@
+#-----------------------------------------------------------------------
+# SHARED RUNTIME OF BOTH WEBAPPS
+'''
+The renderer, the scene, the camera, the post-processing and the frame loop
+that both webapps share. The page only loads three.js and OrbitControls up
+front, the scripts of the post-processing and of dat.gui are added to the page
+when they are first needed: the first frames are drawn without FXAA and the
+composer takes over once its scripts are there. Geometry that was generated in
+an earlier page load comes from the snapshots of page_snapshots().
+
+The startup is timed from the start of the page load: when python runs
+(pyodide ready), when three.js was downloaded, the end of main() and the
+first frame. A first frame later than STARTUP_BUDGET_MS is logged to the
+console with the phases that led to it.
+
+This module has to be imported first, it installs the boundary profiler of
+ffi_profiler before `js` is imported.
+'''
+# opt-in counting of every crossing of the python <-> javascript boundary,
+# with ?ffi in the page url
+import ffi_profiler
+ffi = ffi_profiler.install_if_requested()
+# Import javascript modules
+from js import THREE, window, document, performance, console
+# Import pyscript / pyodide modules
+from pyodide.ffi import create_proxy
+# Import python module
+import time
+# Import local modules
+from resolution_governor import ResolutionGovernor, GpuTimer
+from frame_scheduler import FrameScheduler, RefreshProbe
+from frame_profiler import FrameProfiler
+from profiler_hud import ProfilerHud, sample_renderer
+from snapshot import SnapshotCache, LocalStorageStore
+
+# the moment python runs, pyodide and the packages are loaded
+_PYTHON_START = time.perf_counter()
+# time.perf_counter() at the start of the page load
+PAGE_START = _PYTHON_START - performance.now() / 1000
+
+THREE_URL = "https://cdn.jsdelivr.net/npm/three@0.145.0/"
+POST_PROCESSING_SCRIPTS = tuple(THREE_URL + "examples/js/" + path for path in (
+    "postprocessing/EffectComposer.js",
+    "postprocessing/RenderPass.js",
+    "postprocessing/ShaderPass.js",
+    "shaders/CopyShader.js",
+    "shaders/FXAAShader.js"))
+GUI_SCRIPTS = ("https://cdnjs.cloudflare.com/ajax/libs/dat-gui/0.7.9/dat.gui.js",)
+# largest snapshot in window.localStorage, a write blocks the page and all
+# pages of the origin share a few MB
+SNAPSHOT_MAX_BYTES = 1024 * 1024
+# milliseconds from the start of the page load to the first frame
+STARTUP_BUDGET_MS = 4000
+# milliseconds the GPU may take to draw a frame, the rest of a frame at 60 Hz
+# is left to python
+RENDER_BUDGET_MS = 12
+# without the GPU time: frames drawn back to back further apart than this many
+# refresh intervals missed a refresh of the display
+MISSED_REFRESH = 1.5
+
+
+'''
+PAGE_PROFILER
+a FrameProfiler whose times count from the start of the page load, with the
+startup of pyodide and three.js already marked
+returns: FrameProfiler'''
+def page_profiler():
+    profiler = FrameProfiler(origin=PAGE_START)
+    profiler.mark("pyodide ready", _PYTHON_START - PAGE_START)
+    # the resource timing of the script tag, if the browser kept it
+    entries = performance.getEntriesByName(THREE_URL + "build/three.js")
+    if entries.length:
+        profiler.mark("three loaded", entries[0].responseEnd / 1000)
+    return profiler
+
+
+'''
+PAGE_SNAPSHOTS
+the generated geometry of earlier page loads, kept in window.localStorage
+parameters: app: string, the webapp, every webapp has its own keys
+max_bytes: int, largest snapshot that is written
+returns: SnapshotCache'''
+def page_snapshots(app, max_bytes=SNAPSHOT_MAX_BYTES):
+    return SnapshotCache(LocalStorageStore(window.localStorage, "snapshot:{}:".format(app), max_bytes))
+
+
+# scripts that were added to the page and have loaded
+_loaded = set()
+
+'''
+LOAD_SCRIPTS
+adds scripts to the page one after another, in order, since every one may
+need the ones before it. Scripts that were loaded before are skipped. A
+script that fails to load is logged and stops the rest, a later call tries
+it again.
+parameters: urls: list of script urls, on_loaded: function without arguments,
+called once all of them are loaded
+create_proxy: function that makes the proxy, e.g. counted by the profiler
+on_error: function that gets the url of the script that failed, or None'''
+def load_scripts(urls, on_loaded, create_proxy=create_proxy, on_error=None):
+    pending = [url for url in urls if url not in _loaded]
+    if not pending:
+        on_loaded()
+        return
+
+    def load_next(event=None):
+        if event is not None and event.type == "error":
+            proxy.destroy()
+            console.error("could not load {}".format(pending[0]))
+            if on_error is not None:
+                on_error(pending[0])
+            return
+        if event is not None:
+            _loaded.add(pending.pop(0))
+        if not pending:
+            proxy.destroy()
+            on_loaded()
+            return
+        script = document.createElement('script')
+        script.src = pending[0]
+        script.onload = proxy
+        script.onerror = proxy
+        document.head.appendChild(script)
+
+    proxy = create_proxy(load_next)
+    load_next()
+
+
+'''
+RUNTIME
+parameters: profiler: FrameProfiler, e.g. from page_profiler()
+background: (r, g, b) of the scene
+'''
+class Runtime:
+    def __init__(self, profiler, background=(0, 0, 0)):
+        self.profiler = profiler
+        # every proxy of the runtime is counted like the ones of the webapps
+        self.create_proxy = profiler.counted("proxies", create_proxy)
+        self.draw = None
+        #Set up the renderer
+        self.renderer = THREE.WebGLRenderer.new()
+        # reset once per frame, not once per pass of the composer
+        self.renderer.info.autoReset = False
+        document.body.appendChild(self.renderer.domElement)
+
+        # Set up the scene
+        self.scene = THREE.Scene.new()
+        self.scene.background = THREE.Color.new(*background)
+        self.camera = THREE.PerspectiveCamera.new(75, window.innerWidth / window.innerHeight, 0.1, 1000)
+        self.camera.position.z = 50
+        self.scene.add(self.camera)
+        # projection times view of the camera, for the frustum culling of chunks
+        self._view_projection = THREE.Matrix4.new()
+
+        # the scene is static, a frame is only drawn when something changed
+        self.scheduler = FrameScheduler(self._frame, create_proxy=self.create_proxy)
+        # lowers the resolution when frames get too slow, fed the GPU time of
+        # the frames, or where the browser has no timer queries the interval
+        # of frames drawn back to back against the refresh interval
+        self.governor = ResolutionGovernor(window.devicePixelRatio, target_ms=RENDER_BUDGET_MS)
+        self.gpu_timer = GpuTimer.create(self.renderer)
+        self.refresh = RefreshProbe(self.create_proxy) if self.gpu_timer is None else None
+        self.resize_pending = False
+        # created once the scripts of the post-processing are loaded
+        self.composer = None
+        self.fxaa_pass = None
+        self.resize_view()
+
+        # Set up responsive window
+        self._resize_proxy = self.create_proxy(self.on_window_resize)
+        window.addEventListener('resize', self._resize_proxy)
+        self.hud = ProfilerHud(profiler)
+        self.first_frame_ms = None
+
+    '''
+    START
+    draws the first frame and loads the post-processing behind it
+    parameters: draw: function without arguments that updates and renders
+    the scene with render_scene()'''
+    def start(self, draw):
+        self.draw = draw
+        self.profiler.mark("main done")
+        self.scheduler.invalidate()
+        load_scripts(POST_PROCESSING_SCRIPTS, self.post_process, self.create_proxy, self.without_post_processing)
+
+    '''
+    LOAD_GUI
+    loads dat.gui the first time it is needed
+    parameters: on_loaded: function that gets the dat.GUI class'''
+    def load_gui(self, on_loaded):
+        def loaded():
+            self.profiler.mark("gui loaded")
+            on_loaded(window.dat.GUI)
+
+        # the page keeps running with the parameters it started with
+        def failed(url):
+            self.profiler.mark("gui failed")
+            console.warn("no GUI, the parameters keep their defaults")
+        load_scripts(GUI_SCRIPTS, loaded, self.create_proxy, failed)
+
+    # Graphical post-processing, the passes are created once and resized in place
+    def post_process(self):
+        render_pass = THREE.RenderPass.new(self.scene, self.camera)
+        render_pass.clearColor = THREE.Color.new(0,0,0)
+        render_pass.ClearAlpha = 0
+        self.fxaa_pass = THREE.ShaderPass.new(THREE.FXAAShader)
+
+        self.composer = THREE.EffectComposer.new(self.renderer)
+        self.composer.addPass(render_pass)
+        self.composer.addPass(self.fxaa_pass)
+        self.profiler.mark("post-processing loaded")
+        self.resize_pending = True
+        self.scheduler.invalidate()
+
+    # a script of the post-processing did not load, the renderer keeps drawing
+    # the frames itself, without FXAA
+    def without_post_processing(self, url):
+        self.profiler.mark("post-processing failed")
+        console.warn("rendering without post-processing")
+
+    '''
+    RENDER_SCENE
+    renders through the composer, or straight with the renderer while the
+    post-processing is not loaded yet. The GPU time of this is what the
+    governor lowers the resolution for.'''
+    def render_scene(self):
+        if self.gpu_timer is not None:
+            self.gpu_timer.begin()
+        if self.composer is not None:
+            self.composer.render()
+        else:
+            self.renderer.render(self.scene, self.camera)
+        if self.gpu_timer is not None:
+            self.gpu_timer.end()
+
+    '''
+    VIEW_PROJECTION
+    the matrix of the camera for spatial_chunks.frustum_planes(). The camera
+    matrices are only updated by the renderer, so they are updated here first.
+    returns: the 16 elements, column major'''
+    def view_projection(self):
+        self.camera.updateMatrixWorld()
+        self._view_projection.multiplyMatrices(self.camera.projectionMatrix, self.camera.matrixWorldInverse)
+        return self._view_projection.elements.to_py()
+
+    # one frame of the scheduler around the draw function of the webapp
+    def _frame(self):
+        if self.first_frame_ms is None:
+            self.profiler.mark("first frame")
+        self.profiler.begin_frame()
+        self.renderer.info.reset()
+        if self.resize_pending:
+            self.resize_view()
+        self.draw()
+        sample_renderer(self.profiler, self.renderer)
+        self.govern_resolution()
+        self.profiler.end_frame()
+        self.hud.update()
+        if self.first_frame_ms is None:
+            self.first_frame_ms = self.profiler.now() * 1000
+            self.check_startup()
+
+    '''
+    CHECK_STARTUP
+    logs the startup phases if the first frame came later than the budget'''
+    def check_startup(self):
+        if self.first_frame_ms <= STARTUP_BUDGET_MS:
+            return
+        phases = ", ".join("{} {:.0f} ms at {:.0f} ms".format(name, duration, start)
+                           for name, start, duration in self.profiler.startup_ms())
+        console.warn("first frame after {:.0f} ms, budget {} ms: {}".format(
+            self.first_frame_ms, STARTUP_BUDGET_MS, phases))
+
+    '''
+    RESIZE_VIEW
+    applies the window size and the pixel ratio of the governor to the camera,
+    the renderer, the composer and the FXAA pass
+    parameters: none
+    '''
+    def resize_view(self):
+        self.resize_pending = False
+        width = window.innerWidth
+        height = window.innerHeight
+        pixelRatio = self.governor.pixel_ratio
+
+        self.camera.aspect = width / height
+        self.camera.updateProjectionMatrix()
+
+        self.renderer.setPixelRatio(pixelRatio)
+        self.renderer.setSize(width, height)
+        if self.composer is None:
+            return
+        self.composer.setPixelRatio(pixelRatio)
+        self.composer.setSize(width, height)
+
+        self.fxaa_pass.material.uniforms.resolution.value.x = 1 / ( width * pixelRatio )
+        self.fxaa_pass.material.uniforms.resolution.value.y = 1 / ( height * pixelRatio )
+        self.fxaa_pass.enabled = self.governor.fxaa
+
+    '''
+    GOVERN_RESOLUTION
+    feeds the frame times to the governor, a new pixel ratio or FXAA setting
+    is applied in the next frame. The GPU times arrive a few frames late. The
+    time the CPU spends in the render calls says little, WebGL only queues
+    the work. Without timer queries only frames drawn back to back count:
+    the browser may run requestAnimationFrame at 30 Hz (low power mode, 30 Hz
+    displays), the target follows the measured refresh interval.
+    parameters: none
+    '''
+    def govern_resolution(self):
+        if self.gpu_timer is not None:
+            frame_times = self.gpu_timer.poll()
+        elif self.refresh.interval_ms is not None and self.scheduler.interval_ms is not None:
+            self.governor.target_ms = MISSED_REFRESH * self.refresh.interval_ms
+            frame_times = [self.scheduler.interval_ms]
+        else:
+            return
+        changed = False
+        for frame_ms in frame_times:
+            changed = self.governor.sample(frame_ms) or changed
+        if changed:
+            self.resize_pending = True
+            self.scheduler.invalidate()
+
+    # Adjust display when window size changes, all resize events of one frame
+    # are applied together at the start of the next frame
+    def on_window_resize(self, event):
+        event.preventDefault()
+        self.resize_pending = True
+        self.scheduler.invalidate()
+
+    def destroy(self):
+        window.removeEventListener('resize', self._resize_proxy)
+        self._resize_proxy.destroy()
+        self.scheduler.destroy()
+        if self.gpu_timer is not None:
+            self.gpu_timer.destroy()
+        if self.refresh is not None:
+            self.refresh.destroy()
@@ -0,0 +1,278 @@
+#-----------------------------------------------------------------------
+# BINARY SNAPSHOTS OF GENERATED GEOMETRY FOR BOTH WEBAPPS
+'''
+A snapshot holds the parameters a geometry was generated from and its raw
+buffers, so a configuration that was seen before is loaded instead of
+generated again: the trees of webapp_2 skip the L-system and the turtle, the
+templates of webapp_1 skip the tessellation.
+
+The format is one block of bytes:
+    MAGIC (4 bytes), FORMAT_VERSION (uint32), header length (uint32),
+    header (utf-8 JSON), buffers
+The header holds the kind of the snapshot, its parameters and a table of the
+buffers with their dtype, shape and offset. Every buffer starts at a multiple
+of 8 bytes, so decode() returns numpy views on the bytes without a copy.
+
+Snapshots are stored under a hash of their kind and parameters, a changed
+parameter or a new FORMAT_VERSION gives a new key and the old snapshot is
+not read again. The browser keeps them in window.localStorage
+(LocalStorageStore), under CPython a directory (FileStore) or a dictionary
+(MemoryStore) stands in for it.
+'''
+import base64
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b"PTSN"
+# a change of the layout or of what the webapps store increases this
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGNMENT = 8
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+'''
+SNAPSHOT
+kind: string, what was generated, e.g. "forest"
+params: the parameters it was generated from, as they come out of JSON
+buffers: dictionary name -> read only numpy array
+'''
+class Snapshot:
+    def __init__(self, kind, params, buffers):
+        self.kind = kind
+        self.params = params
+        self.buffers = buffers
+
+    def __getitem__(self, name):
+        return self.buffers[name]
+
+
+'''
+PARAMS_KEY
+parameters: kind: string, params: anything JSON can write, tuples are written
+as lists
+returns: string, the hash the snapshot is stored under'''
+def params_key(kind, params):
+    text = json.dumps([FORMAT_VERSION, kind, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# the parameters after a round trip through JSON, to compare them with a header
+def _canonical(params):
+    return json.loads(json.dumps(params, sort_keys=True))
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+'''
+ENCODE
+parameters: kind: string, params: anything JSON can write
+buffers: dictionary name -> numpy array
+returns: bytes'''
+def encode(kind, params, buffers):
+    arrays = {name: np.ascontiguousarray(array) for name, array in buffers.items()}
+    table, offset = [], 0
+    for name, array in arrays.items():
+        table.append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape), "offset": offset})
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"kind": kind, "params": params, "buffers": table},
+                        sort_keys=True, separators=(",", ":")).encode("utf-8")
+    start = _aligned(_PREAMBLE.size + len(header))
+    data = bytearray(start + offset)
+    _PREAMBLE.pack_into(data, 0, MAGIC, FORMAT_VERSION, len(header))
+    data[_PREAMBLE.size:_PREAMBLE.size + len(header)] = header
+    for entry, array in zip(table, arrays.values()):
+        first = start + entry["offset"]
+        data[first:first + array.nbytes] = array.tobytes()
+    return bytes(data)
+
+
+'''
+DECODE
+the buffers are views on data, data must not change while they are used
+parameters: data: bytes, bytearray or memoryview from encode()
+returns: Snapshot'''
+def decode(data):
+    view = memoryview(data)
+    if len(view) < _PREAMBLE.size:
+        raise SnapshotError("snapshot too short")
+    magic, version, header_length = _PREAMBLE.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise SnapshotError("not a snapshot")
+    if version != FORMAT_VERSION:
+        raise SnapshotError("snapshot version {}, expected {}".format(version, FORMAT_VERSION))
+    header_end = _PREAMBLE.size + header_length
+    try:
+        header = json.loads(bytes(view[_PREAMBLE.size:header_end]).decode("utf-8"))
+    except ValueError as error:
+        raise SnapshotError("broken snapshot header: {}".format(error))
+    start = _aligned(header_end)
+    buffers = {}
+    for entry in header["buffers"]:
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        first = start + entry["offset"]
+        if first + count * dtype.itemsize > len(view):
+            raise SnapshotError("snapshot buffer {} is cut off".format(entry["name"]))
+        array = np.frombuffer(view, dtype=dtype, count=count, offset=first).reshape(entry["shape"])
+        array.flags.writeable = False
+        buffers[entry["name"]] = array
+    return Snapshot(header["kind"], header["params"], buffers)
+
+
+#-----------------------------------------------------------------------
+# STORES
+# a store keeps bytes under a key: get(key) -> bytes or None, put(key, data)
+# -> bool, whether it was kept
+
+class MemoryStore:
+    def __init__(self):
+        self._data = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def put(self, key, data):
+        self._data[key] = bytes(data)
+        return True
+
+    def clear(self):
+        self._data.clear()
+
+
+'''
+FILESTORE
+one file per snapshot, the bytes are mapped with numpy so the buffers are
+read from the page cache without a copy
+parameters: directory: string, created if it does not exist
+'''
+class FileStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".snap")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return None
+        return memoryview(np.memmap(path, dtype=np.uint8, mode="r"))
+
+    def put(self, key, data):
+        # written next to it and renamed, a reader never sees half a file
+        path = self._path(key)
+        with open(path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(path + ".tmp", path)
+        return True
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".snap"):
+                os.remove(os.path.join(self.directory, name))
+
+
+'''
+LOCALSTORAGESTORE
+window.localStorage only keeps strings, the bytes are kept as base64. When
+the storage is full the snapshots of this store, the ones under its prefix,
+are removed and the new one is tried once more, a snapshot that does not fit
+at all is not kept. setItem() blocks the page, so snapshots larger than
+max_bytes are not written.
+parameters: storage: window.localStorage, prefix: string in front of the keys,
+one per webapp so they do not remove each other's snapshots
+max_bytes: int, largest snapshot that is written, None for any size
+'''
+class LocalStorageStore:
+    def __init__(self, storage, prefix="snapshot:", max_bytes=None):
+        self.storage = storage
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+
+    def get(self, key):
+        text = self.storage.getItem(self.prefix + key)
+        if not isinstance(text, str):
+            return None
+        try:
+            return base64.b64decode(text)
+        except ValueError:
+            return None
+
+    def put(self, key, data):
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            return False
+        text = base64.b64encode(data).decode("ascii")
+        for attempt in range(2):
+            try:
+                self.storage.setItem(self.prefix + key, text)
+                return True
+            except Exception:
+                # QuotaExceededError of the browser
+                if attempt == 0:
+                    self.clear()
+        return False
+
+    def clear(self):
+        keys = [self.storage.key(index) for index in range(self.storage.length)]
+        for key in keys:
+            if isinstance(key, str) and key.startswith(self.prefix):
+                self.storage.removeItem(key)
+
+
+#-----------------------------------------------------------------------
+'''
+SNAPSHOTCACHE
+looks up and keeps snapshots in a store. A snapshot is only used if its kind
+and parameters are the ones asked for, a broken or outdated one is a miss.
+parameters: store: MemoryStore, FileStore or LocalStorageStore
+'''
+class SnapshotCache:
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0
+
+    '''
+    GET
+    parameters: kind: string, params: the parameters of the geometry
+    returns: Snapshot or None'''
+    def get(self, kind, params):
+        data = self.store.get(params_key(kind, params))
+        snapshot = None
+        if data is not None:
+            try:
+                snapshot = decode(data)
+            except (SnapshotError, KeyError, TypeError):
+                snapshot = None
+        if snapshot is None or snapshot.kind != kind or snapshot.params != _canonical(params):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return snapshot
+
+    '''
+    PUT
+    parameters: kind: string, params: the parameters of the geometry
+    buffers: dictionary name -> numpy array
+    returns: bool, whether the store kept it'''
+    def put(self, kind, params, buffers):
+        kept = self.store.put(params_key(kind, params), encode(kind, params, buffers))
+        self.saved += kept
+        return kept
+
+    def report(self):
+        return "snapshots {} hits, {} misses".format(self.hits, self.misses)
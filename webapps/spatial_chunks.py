@@ -0,0 +1,146 @@
+#-----------------------------------------------------------------------
+# SPATIAL CHUNKS WITH FRUSTUM CULLING FOR BOTH WEBAPPS
+'''
+A large grid or forest is split into chunks, every chunk is one three.js
+object (a Group of cells or trees, or one InstancedMesh of cells) with a
+bounding sphere around everything in it. Once per frame the spheres of all
+chunks are tested against the frustum of the camera in one numpy call and
+only the chunks whose visibility changed are touched in javascript. The
+webapps skip the chunks that are off screen before doing any work for their
+cells or trees, e.g. the level of detail or new matrices.
+
+The chunks of the grid are square tiles of the cell indices, neighbouring
+cells are neighbours in space as well. The trees are put into a uniform grid
+over their base points.
+'''
+import numpy as np
+
+
+'''
+FRUSTUM_PLANES
+the six planes of the camera frustum, like THREE.Frustum.setFromProjectionMatrix
+parameters: elements: the 16 numbers of projectionMatrix * matrixWorldInverse,
+column major like Matrix4.elements
+returns: float array (6, 4), unit normal pointing inside and distance'''
+def frustum_planes(elements):
+    rows = np.asarray(elements, dtype=np.float64).reshape(4, 4).T
+    planes = np.array([rows[3] - rows[0], rows[3] + rows[0],
+                       rows[3] + rows[1], rows[3] - rows[1],
+                       rows[3] - rows[2], rows[3] + rows[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+
+'''
+SPHERES_VISIBLE
+parameters: planes: array (6, 4) from frustum_planes()
+centers: array (n, 3), radii: array (n,)
+returns: bool array (n,), True for the spheres that reach into the frustum'''
+def spheres_visible(planes, centers, radii):
+    distances = np.asarray(centers, dtype=np.float64) @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -np.asarray(radii, dtype=np.float64)[:, None], axis=1)
+
+
+'''
+TILE_CHUNKS
+puts cells or trees into square tiles
+parameters: positions: array (n, 2) of cell indices (i, j) or of base points
+(x, z), size: edge length of a tile in the same unit
+returns: list of the tile keys (i, j), sorted, and int array (n,) with the
+chunk of every item, an index into the keys'''
+def tile_chunks(positions, size):
+    positions = np.asarray(positions).reshape(-1, 2)
+    tiles = np.floor_divide(positions, size).astype(np.int64)
+    if len(tiles) == 0:
+        return [], np.zeros(0, dtype=np.int64)
+    keys, chunks = np.unique(tiles, axis=0, return_inverse=True)
+    return [tuple(int(value) for value in key) for key in keys], chunks.ravel()
+
+
+'''
+CHUNK_ORDER
+parameters: chunks: int array (n,) from tile_chunks(), count: number of chunks
+returns: the items sorted by chunk (n,) and the first item of every chunk
+in that order (count + 1,), the last entry is n'''
+def chunk_order(chunks, count):
+    order = np.argsort(chunks, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(np.bincount(chunks, minlength=count)))).astype(np.int64)
+    return order, starts
+
+
+'''
+CHUNK_SPHERES
+bounding spheres of the chunks around the spheres of their items
+parameters: centers: array (n, 3), radii: float or array (n,), both in the
+order of chunk_order(), starts: from chunk_order(), no chunk may be empty
+returns: centers (chunks, 3) and radii (chunks,)'''
+def chunk_spheres(centers, radii, starts):
+    centers = np.asarray(centers, dtype=np.float64)
+    radii = np.broadcast_to(np.asarray(radii, dtype=np.float64), len(centers))
+    if len(starts) < 2:
+        return np.zeros((0, 3)), np.zeros(0)
+    firsts = starts[:-1]
+    low = np.minimum.reduceat(centers - radii[:, None], firsts)
+    high = np.maximum.reduceat(centers + radii[:, None], firsts)
+    middles = (low + high) / 2
+    counts = np.diff(starts)
+    reach = np.linalg.norm(centers - np.repeat(middles, counts, axis=0), axis=1) + radii
+    return middles, np.maximum.reduceat(reach, firsts)
+
+
+'''
+CHUNKCULLER
+keeps the visibility of the chunks from frame to frame
+'''
+class ChunkCuller:
+    def __init__(self):
+        self.centers = np.zeros((0, 3))
+        self.radii = np.zeros(0)
+        self.visible = np.zeros(0, dtype=bool)
+        self._elements = None
+        # whether update() reported every chunk since set_spheres()
+        self._reported = False
+
+    def __len__(self):
+        return len(self.radii)
+
+    '''
+    SET_SPHERES
+    new chunks or new bounds of the same chunks
+    parameters: centers: array (chunks, 3), radii: array (chunks,)
+    moved: bool, True if only the bounds changed, the next update() then
+    reports the chunks whose visibility changed instead of every chunk'''
+    def set_spheres(self, centers, radii, moved=False):
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.radii = np.asarray(radii, dtype=np.float64)
+        if not moved or len(self.visible) != len(self.radii):
+            self.visible = np.zeros(len(self.radii), dtype=bool)
+            self._reported = False
+        self._elements = None
+
+    '''
+    UPDATE
+    tests every chunk against the frustum, nothing is tested if neither the
+    camera nor the chunks changed
+    parameters: elements: projectionMatrix * matrixWorldInverse, column major
+    returns: int array of the chunks whose visibility changed, every chunk
+    after new chunks'''
+    def update(self, elements):
+        elements = np.asarray(elements, dtype=np.float64)
+        if self._elements is not None and np.array_equal(elements, self._elements):
+            return np.zeros(0, dtype=np.int64)
+        visible = spheres_visible(frustum_planes(elements), self.centers, self.radii)
+        if self._reported:
+            changed = np.nonzero(visible != self.visible)[0]
+        else:
+            changed = np.arange(len(visible))
+            self._reported = True
+        self.visible = visible
+        self._elements = elements
+        return changed
+
+    @property
+    def visible_count(self):
+        return int(self.visible.sum())
+
+    def report(self):
+        return "{} / {} chunks".format(self.visible_count, len(self))
@@ -0,0 +1,6 @@
+# The modules of the webapps are flat in webapps/, the same directory the
+# pages load them from
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,21 @@
+# The benchmarks of benchmark.py, both webapps run under the stand-in of
+# js_stub. Only the limits on counts are checked here, the limits in
+# milliseconds are left to running benchmark.py on the machine of interest.
+import pytest
+import benchmark
+
+
+@pytest.mark.parametrize("run", [
+    benchmark.benchmark_grid,
+    benchmark.benchmark_scrub,
+    benchmark.benchmark_culling,
+    benchmark.benchmark_lsystem,
+    benchmark.benchmark_trees,
+    benchmark.benchmark_snapshots,
+    benchmark.benchmark_pages,
+], ids=lambda run: run.__name__[len("benchmark_"):])
+def test_benchmark_counts_within_thresholds(run):
+    results = run()
+    assert any(name in benchmark.THRESHOLDS for name in results)
+    counts = {name: value for name, value in results.items() if not benchmark.is_timing(name)}
+    assert benchmark.regressions(counts) == {}
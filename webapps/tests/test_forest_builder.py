@@ -0,0 +1,28 @@
+# The forest buffer of webapp_2 against the turtle run over every tree
+import numpy as np
+from forest_builder import forest_chunks, tree_levels, tree_offsets
+from lsystem import TREE, branch_depths, turtle_vertices
+
+SPECS = [("d", 5, (0, -20, 0)), ("d", 4, (25, -20, 10)), ("abd", 3, (-40, 0, 0)), ("d", 0, (5, 5, 5))]
+
+
+# the segments (n, 6) of a piece of a tree in a fixed order
+def sorted_segments(vertices):
+    pairs = np.asarray(vertices, dtype=np.float64).reshape(-1, 6)
+    return pairs[np.lexsort(np.round(pairs, 2).T[::-1])]
+
+
+def test_chunks_fill_the_buffer_tree_by_tree_and_depth_by_depth():
+    offsets = tree_offsets(SPECS)
+    vertices = np.full((offsets[-1], 3), np.nan, dtype=np.float32)
+    for first, piece in forest_chunks(SPECS, chunk_rows=512):
+        vertices[first:first + len(piece)] = piece
+    assert not np.isnan(vertices).any()
+    for (axiom, depth, base), offset, levels in zip(SPECS, offsets, tree_levels(SPECS)):
+        expanded = TREE.expand(axiom, depth)
+        depths = np.repeat(branch_depths(expanded), 2)
+        tree = turtle_vertices(expanded, base)
+        assert levels[-1] == len(tree)
+        for level in range(len(levels) - 1):
+            np.testing.assert_allclose(sorted_segments(vertices[offset + levels[level]:offset + levels[level + 1]]),
+                                       sorted_segments(tree[depths == level]), rtol=1e-5, atol=1e-2)
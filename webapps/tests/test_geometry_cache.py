@@ -0,0 +1,28 @@
+# Eviction of the template cache of webapp_1
+from geometry_cache import TemplateCache
+
+
+def test_template_cache_evicts_the_least_recently_used():
+    evicted = []
+    cache = TemplateCache(lambda key: ("template", key), capacity=2, on_evict=evicted.append)
+    cache.get("a")
+    cache.get("b")
+    cache.get("a")
+    cache.get("c")
+    assert evicted == [("template", "b")]
+    assert "a" in cache and "c" in cache
+
+
+def test_template_cache_never_evicts_pinned_templates():
+    evicted = []
+    cache = TemplateCache(lambda key: ("template", key), capacity=2, on_evict=evicted.append)
+    cache.get("a")
+    cache.get("b")
+    cache.pin("scene", ["a", "b"])
+    cache.get("c")
+    assert evicted == [] and len(cache) == 3
+    cache.pin("scene", ["c"])
+    assert evicted == [("template", "a")]
+    cache.get("d")
+    assert evicted == [("template", "a"), ("template", "b")]
+    assert "c" in cache and "d" in cache
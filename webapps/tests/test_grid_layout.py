@@ -0,0 +1,29 @@
+# Layout of the grid of webapp_1
+import numpy as np
+from grid_layout import cell_indices, cell_placements, placement_matrices, reconcile
+
+
+def test_placement_matrices_match_the_loop():
+    x, y, radius, rotation_x, rotation_y = 4, 5, 2.5, 45, 30
+    matrices = placement_matrices(x, y, radius, rotation_x, rotation_y)
+    placements = cell_placements(x, y, radius, rotation_x, rotation_y)
+    assert len(matrices) == len(cell_indices(x, y))
+    for matrix, key in zip(matrices, cell_indices(x, y)):
+        px, py, pz, angle = placements[key]
+        np.testing.assert_allclose(matrix[3, :3], (px, py, pz), atol=1e-4)
+        np.testing.assert_allclose(matrix[1, 1:3], (np.cos(angle), np.sin(angle)), atol=1e-6)
+
+
+def test_reconcile_keeps_survivors_and_creates_new_keys_in_order():
+    cells = {key: "old {}".format(key) for key in cell_indices(2, 1)}
+    removed_cells = []
+    added, removed = reconcile(cells, cell_indices(3, 0), lambda key: "new {}".format(key), removed_cells.append)
+    assert added == [(2, 0)]
+    assert sorted(removed) == [(0, 1), (1, 1)]
+    assert sorted(removed_cells) == ["old (0, 1)", "old (1, 1)"]
+    assert cells == {(0, 0): "old (0, 0)", (1, 0): "old (1, 0)", (2, 0): "new (2, 0)"}
+
+
+def test_reconcile_without_changes_touches_nothing():
+    cells = {key: key for key in cell_indices(3, 3)}
+    assert reconcile(cells, cell_indices(3, 3), None, None) == ([], [])
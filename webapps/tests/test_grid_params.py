@@ -0,0 +1,27 @@
+# Change tracking of the parameters of webapp_1
+from grid_params import ParamStore, GEOMETRY, LAYOUT, TRANSFORM
+
+
+def test_param_store_marks_only_real_changes():
+    store = ParamStore({"radius": 5, "x": 3, "rotation_x": 0})
+    assert store.consume() == {GEOMETRY, LAYOUT, TRANSFORM}
+    assert not store.dirty
+    store.set("radius", 5)
+    assert not store.dirty
+    # sliders deliver floats for the counts
+    store.set("x", 3.0)
+    assert not store.dirty and store.x == 3 and isinstance(store.x, int)
+
+
+def test_param_store_stages_follow_the_dependencies():
+    store = ParamStore({"radius": 5, "x": 3, "rotation_x": 0, "radial_segments": 8})
+    store.consume()
+    store.set("rotation_x", 10)
+    assert store.consume() == {TRANSFORM}
+    store.set("x", 4)
+    assert store.consume() == {LAYOUT, TRANSFORM}
+    store.update({"radial_segments": 16, "rotation_x": 20})
+    assert store.consume() == {GEOMETRY, TRANSFORM}
+    store.touch("radius")
+    assert store.consume() == {GEOMETRY, TRANSFORM}
+    assert store.consume() == set()
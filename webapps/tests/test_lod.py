@@ -0,0 +1,24 @@
+# Levels of detail of the templates of webapp_1
+import numpy as np
+from lod import LodSelector, tier_keys
+
+
+def test_tier_keys_halve_the_segments_down_to_the_minimum():
+    assert [key[3] for key in tier_keys(("cylinder", 1, 2, 32, 0))] == [32, 16, 8, 4]
+    assert [key[3] for key in tier_keys(("cylinder", 1, 2, 6, 0))] == [6, 4]
+    assert [key[4] for key in tier_keys(("capsule", 1, 2, 32, 4))] == [4, 2, 1, 1]
+
+
+def test_lod_selector_keeps_its_tier_inside_the_hysteresis_band():
+    lod = LodSelector(thresholds=(100,), hysteresis=0.1)
+    # cells without a tier take the one of their size
+    assert lod.select(np.array([150.0, 50.0]), np.array([-1, -1]), 2).tolist() == [0, 1]
+    # just below and just above the threshold: no change
+    assert lod.select(np.array([95.0, 105.0]), np.array([0, 1]), 2).tolist() == [0, 1]
+    # clearly across it: switch
+    assert lod.select(np.array([85.0, 115.0]), np.array([0, 1]), 2).tolist() == [1, 0]
+
+
+def test_lod_selector_stays_within_the_tiers_of_the_template():
+    lod = LodSelector(thresholds=(120, 50, 20))
+    assert lod.select(np.array([1.0]), np.array([-1]), 2).tolist() == [1]
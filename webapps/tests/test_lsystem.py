@@ -0,0 +1,157 @@
+# The L-system of webapp_2 against the expanded string and the turtle
+from collections import Counter
+import numpy as np
+import pytest
+from lsystem import (LSystem, TREE, TREE_RULES, branch_count, branch_depths, depth_counts, depth_order,
+                     forest_instances,
+                     turtle, turtle_bounds, turtle_vertices)
+
+
+@pytest.mark.parametrize("depth", range(0, 7))
+def test_stream_is_the_expanded_string(depth):
+    assert "".join(TREE.stream("d", depth)) == TREE.expand("d", depth)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 64])
+def test_stream_with_small_chunks_is_the_expanded_string(chunk_size):
+    # expansions longer than chunk_size are walked symbol by symbol
+    lsystem = LSystem(TREE_RULES, chunk_size=chunk_size)
+    for axiom in ("d", "adbcf", "bdfd"):
+        assert "".join(lsystem.stream(axiom, 5)) == lsystem.expand(axiom, 5)
+        assert "".join(lsystem.chunks(axiom, 5)) == lsystem.expand(axiom, 5)
+
+
+def test_expand_is_not_limited_by_the_recursion_limit():
+    lsystem = LSystem({"a": "a", "b": "ab"})
+    assert lsystem.expand("b", 5000) == "a" * 5000 + "b"
+    assert sum(1 for _ in lsystem.stream("b", 5000)) == 5001
+
+
+def test_symbols_without_a_rule_are_refused():
+    with pytest.raises(ValueError):
+        LSystem({"a": "ax"})
+    with pytest.raises(ValueError):
+        TREE.expand("x", 2)
+
+
+@pytest.mark.parametrize("axiom", ["d", "abcdf", "bdfe"])
+@pytest.mark.parametrize("depth", range(0, 7))
+def test_counts_are_the_symbols_of_the_expanded_string(axiom, depth):
+    expanded = TREE.expand(axiom, depth)
+    counts = TREE.counts(axiom, depth)
+    assert {symbol: count for symbol, count in counts.items() if count} == Counter(expanded)
+    assert TREE.length(axiom, depth) == len(expanded)
+    assert branch_count(axiom, depth) == len(list(turtle(expanded, (0, 0, 0))))
+
+
+def test_check_size_refuses_long_derivations_before_expanding():
+    length = TREE.length("d", 30)
+    TREE.check_size("d", 30, max_symbols=length)
+    with pytest.raises(ValueError):
+        TREE.check_size("d", 30, max_symbols=length - 1)
+
+
+@pytest.mark.parametrize("axiom", ["d", "cd", "bcdfed"])
+@pytest.mark.parametrize("depth", range(0, 7))
+def test_turtle_bounds_are_the_bounds_of_the_turtle(axiom, depth):
+    points = np.array(list(turtle(TREE.expand(axiom, depth), (1, -20, 3)))).reshape(-1, 3)
+    low, high = turtle_bounds(axiom, depth, (1, -20, 3))
+    np.testing.assert_allclose(low, points.min(axis=0), rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(high, points.max(axis=0), rtol=1e-9, atol=1e-6)
+
+
+def test_turtle_bounds_without_branches():
+    assert turtle_bounds("bcf", 4) is None
+
+
+# the segments of turtle() as float32 vertices like turtle_vertices()
+def segments(axiom, initial_point=(0, 0, 0)):
+    return np.array(list(turtle(axiom, initial_point)), dtype=np.float32).reshape(-1, 3)
+
+
+@pytest.mark.parametrize("axiom", ["d", "abcdf", "bdfe"])
+@pytest.mark.parametrize("depth", range(0, 7))
+def test_turtle_vertices_are_the_segments_of_the_turtle(axiom, depth):
+    expanded = TREE.expand(axiom, depth)
+    np.testing.assert_allclose(turtle_vertices(expanded, (1, -20, 3)), segments(expanded, (1, -20, 3)),
+                               rtol=1e-6, atol=1e-4)
+
+
+@pytest.mark.parametrize("axiom", [
+    "",
+    "bcf",
+    # states that are saved and never restored
+    "abcabea",
+    "bcabea",
+    # deep nesting
+    "b" * 40 + "ca" * 40 + "f" * 40 + "ea",
+    # consecutive saves and restores
+    "abbcaffebbeafcaf",
+    "bbbaffcafea",
+], ids=["empty", "no branches", "unclosed", "unclosed first", "deep", "consecutive", "consecutive first"])
+def test_turtle_vertices_on_edge_strings(axiom):
+    vertices = turtle_vertices(axiom)
+    assert vertices.shape == (2 * axiom.count("a"), 3)
+    np.testing.assert_allclose(vertices, segments(axiom), rtol=1e-6, atol=1e-4)
+
+
+def test_turtle_vertices_write_into_the_given_buffer():
+    axiom = TREE.expand("d", 4)
+    out = np.full((2 * branch_count("d", 4) + 2, 3), np.nan, dtype=np.float32)
+    vertices = turtle_vertices(axiom, (0, -20, 0), out)
+    assert np.shares_memory(vertices, out)
+    np.testing.assert_allclose(vertices, segments(axiom, (0, -20, 0)), rtol=1e-6, atol=1e-4)
+    assert np.isnan(out[-2:]).all()
+
+
+def test_turtle_vertices_refuse_restoring_a_state_that_was_not_saved():
+    with pytest.raises(ValueError):
+        turtle_vertices("afba")
+
+
+# segments (n, 2, 3) in a fixed order, to compare trees drawn in another order
+def sorted_segments(vertices):
+    pairs = np.asarray(vertices, dtype=np.float64).reshape(-1, 6)
+    return pairs[np.lexsort(np.round(pairs, 2).T[::-1])]
+
+
+@pytest.mark.parametrize("depth", range(1, 7))
+def test_placed_subtrees_are_the_branches_of_the_tree(depth):
+    specs = [("d", depth, (0, -20, 0)), ("d", depth, (50, -20, 5)), ("abd", max(depth - 1, 0), (-30, 0, 0))]
+    placed = []
+    for vertices, matrices in forest_instances(specs, split=2).values():
+        points = np.concatenate((vertices, np.ones((len(vertices), 1), dtype=np.float32)), axis=1)
+        placed.append(np.einsum("vi,mij->mvj", points, matrices)[:, :, :3].reshape(-1, 3))
+    trees = [turtle_vertices(TREE.expand(axiom, tree_depth), base) for axiom, tree_depth, base in specs]
+    np.testing.assert_allclose(sorted_segments(np.concatenate(placed)), sorted_segments(np.concatenate(trees)),
+                               rtol=1e-5, atol=1e-2)
+
+
+@pytest.mark.parametrize("split", [1, 3, 8])
+def test_depth_counts_from_the_subtrees(split):
+    depths = branch_depths(TREE.expand("d", 6))
+    assert depth_counts("d", 6, split).tolist() == np.bincount(depths).tolist()
+
+
+@pytest.mark.parametrize("depths", [
+    branch_depths(TREE.expand("d", 6)),
+    np.array([], dtype=np.int32),
+    np.random.default_rng(1).integers(0, 5, 1000),
+    # too deep for the int16 sort
+    np.array([2 ** 15 + 1, 3, 2 ** 15, 3, 0]),
+], ids=["tree", "empty", "random", "deep"])
+def test_depth_order_is_a_stable_permutation(depths):
+    order = depth_order(depths)
+    assert sorted(order.tolist()) == list(range(len(depths)))
+    # by depth, and in turtle order within a depth
+    keys = list(zip(depths[order].tolist(), order.tolist()))
+    assert keys == sorted(keys)
+
+
+def test_prefix_of_the_depth_order_is_the_cut_off_tree():
+    # the branches of depth <= k are the tree with the forks deeper than k left out
+    depths = branch_depths(TREE.expand("d", 5))
+    order = depth_order(depths)
+    for k in range(depths.max() + 1):
+        prefix = np.count_nonzero(depths <= k)
+        assert np.sort(order[:prefix]).tolist() == np.flatnonzero(depths <= k).tolist()
@@ -0,0 +1,70 @@
+# The generators against the vertex and index layout of three.js r145
+import numpy as np
+from primitives import cylinder, capsule, capsule_profile, edge_pairs
+
+
+def test_cylinder_matches_cylinder_geometry_layout():
+    # CylinderGeometry(1, 1, 2, 8, 1): a torso of 2 rows of 9 vertices, and
+    # per cap 8 centers and 9 rim vertices
+    shape = cylinder(1, 2, 8)
+    assert len(shape.positions) == 2 * 9 + 2 * (8 + 9)
+    assert len(shape.indices) == 8 * 6 + 2 * 8 * 3
+    # the first vertex is at theta = 0, on the z-axis at the top
+    np.testing.assert_allclose(shape.positions[0], (0, 1, 1), atol=1e-6)
+    np.testing.assert_allclose(shape.normals[0], (0, 0, 1), atol=1e-6)
+    # torso faces (a, b, d) and (b, c, d)
+    assert shape.indices[:6].tolist() == [0, 9, 1, 9, 10, 1]
+    # top cap (rim, rim + 1, center), bottom cap (rim + 1, rim, center)
+    top = 2 * 9
+    assert shape.indices[48:51].tolist() == [top + 8, top + 9, top]
+    bottom = top + 17
+    assert shape.indices[72:75].tolist() == [bottom + 9, bottom + 8, bottom]
+
+
+def test_cylinder_normals_are_unit_vectors():
+    shape = cylinder(2.5, 4, 12)
+    np.testing.assert_allclose(np.linalg.norm(shape.normals, axis=1), 1, atol=1e-6)
+
+
+def test_capsule_matches_capsule_geometry_layout():
+    # LatheGeometry of Path.getPoints(4): two arcs of 9 points, the line
+    # between them shares its ends with them
+    shape = capsule(1, 2, 4, 8)
+    assert len(capsule_profile(1, 2, 4)) == 4 * 4 + 2
+    assert len(shape.positions) == (8 + 1) * 18
+    assert len(shape.indices) == 8 * 17 * 6
+    # lathe faces (a, b, d) and (c, d, b)
+    assert shape.indices[:6].tolist() == [0, 18, 1, 19, 1, 18]
+    assert shape.positions[:, 1].min() == -2
+    assert shape.positions[:, 1].max() == 2
+    assert np.linalg.norm(shape.positions[:, [0, 2]], axis=1).max() <= 1 + 1e-6
+
+
+def test_large_shapes_switch_to_32_bit_indices():
+    assert cylinder(1, 2, 16).indices.dtype == np.uint16
+    assert capsule(1, 2, 128, 512).indices.dtype == np.uint32
+
+
+def test_cylinder_edges_are_the_rims_and_the_seams():
+    # EdgesGeometry: the two rims and the 8 edges between the flat sides,
+    # the diagonals of the sides and the fans of the caps are flat
+    shape = cylinder(1, 2, 8)
+    assert len(shape.edges) == 2 * (8 + 8 + 8)
+
+
+def test_edge_pairs_skips_coplanar_faces():
+    square = np.array([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)], dtype=np.float32)
+    faces = np.array([(0, 1, 2), (0, 2, 3)])
+    assert sorted(map(tuple, edge_pairs(square, faces).tolist())) == [(0, 1), (1, 2), (2, 3), (3, 0)]
+    folded = square.copy()
+    folded[3, 2] = 1
+    assert (0, 2) in set(map(tuple, edge_pairs(folded, faces).tolist()))
+    assert len(edge_pairs(folded, faces)) == 5
+
+
+def test_edge_pairs_of_an_edge_with_three_faces_follow_three_js():
+    # the flat faces 0 and 1 pair up on the edge (0, 1), face 2 comes too
+    # late for it, the edges of a single face come last in the order found
+    positions = np.array([(0, 0, 0), (1, 0, 0), (0.5, 1, 0), (0.5, -1, 0), (0.5, 0, 1)], dtype=np.float32)
+    faces = np.array([(0, 1, 2), (1, 0, 3), (0, 1, 4), (4, 1, 3)])
+    assert edge_pairs(positions, faces).tolist() == [[4, 1], [1, 3], [1, 2], [2, 0], [0, 3], [4, 0], [3, 4]]
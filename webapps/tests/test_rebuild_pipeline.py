@@ -0,0 +1,78 @@
+# Coalescing and cancelling of the rebuilds of webapp_1
+from rebuild_pipeline import RebuildPipeline
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Grid:
+    # a rebuild of three steps that records which values it built
+    def __init__(self, clock):
+        self.clock = clock
+        self.value = 0
+        self.built_value = None
+        self.shown = None
+        self.closed = []
+
+    def stale(self):
+        return self.value != self.built_value
+
+    def rebuild(self):
+        value = self.built_value = self.value
+        try:
+            for _ in range(3):
+                self.clock.now += 0.005
+                yield
+            self.shown = value
+        except GeneratorExit:
+            self.closed.append(value)
+            raise
+
+
+def pipeline(budget_ms=8):
+    clock = Clock()
+    grid = Grid(clock)
+    return RebuildPipeline(grid.rebuild, grid.stale, budget_ms, clock), grid, clock
+
+
+def test_rebuild_is_spread_over_frames_within_the_budget():
+    rebuild, grid, _ = pipeline(budget_ms=8)
+    grid.value = 1
+    assert rebuild.busy
+    # 5 ms per step: two steps in the first frame, the last one in the second
+    assert not rebuild.step()
+    assert grid.shown is None
+    assert rebuild.step()
+    assert grid.shown == 1 and not rebuild.busy
+    assert rebuild.latency_frames == 2
+
+
+def test_new_input_cancels_the_running_rebuild():
+    rebuild, grid, clock = pipeline(budget_ms=4)
+    grid.value = 1
+    rebuild.request()
+    rebuild.step()
+    grid.value = 2
+    clock.now += 0.1
+    rebuild.request()
+    rebuild.finish()
+    assert grid.closed == [1]
+    assert grid.shown == 2
+    assert (rebuild.started, rebuild.cancelled, rebuild.completed) == (2, 1, 1)
+    # measured from the latest input
+    assert abs(rebuild.latency_ms - 15) < 1e-6
+
+
+def test_inputs_of_one_frame_start_one_rebuild():
+    rebuild, grid, _ = pipeline()
+    for value in (1, 2, 3):
+        grid.value = value
+        rebuild.request()
+    rebuild.finish()
+    assert rebuild.started == 1 and grid.shown == 3
+    assert not rebuild.step()
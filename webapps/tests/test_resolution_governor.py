@@ -0,0 +1,105 @@
+# The resolution governor and the GPU timer that feeds it
+import pytest
+from resolution_governor import ResolutionGovernor, GpuTimer
+
+
+def test_governor_lowers_the_resolution_then_fxaa_and_raises_them_back():
+    governor = ResolutionGovernor(1.0, target_ms=10, min_ratio=0.5, step=0.25, patience=2)
+    reports = []
+    for frame_ms in [20] * 12 + [2] * 30:
+        if governor.sample(frame_ms):
+            reports.append(governor.report())
+    assert reports == ["x0.75", "x0.50", "x0.50 no FXAA", "x0.50", "x0.75", "x1.00"]
+
+
+class Extension:
+    TIME_ELAPSED_EXT = "time elapsed"
+    GPU_DISJOINT_EXT = "gpu disjoint"
+
+
+# a WebGL 2 context whose queries finish when the test says so
+class Gl:
+    QUERY_RESULT_AVAILABLE = "available"
+    QUERY_RESULT = "result"
+
+    def __init__(self):
+        self.created = 0
+        self.deleted = []
+        self.active = None
+        self.ended = []
+        self.results = {}
+        self.disjoint = False
+
+    def createQuery(self):
+        self.created += 1
+        return self.created
+
+    def deleteQuery(self, query):
+        self.deleted.append(query)
+
+    def beginQuery(self, target, query):
+        assert target == Extension.TIME_ELAPSED_EXT and self.active is None
+        # a query that is used again forgets its old result
+        self.results.pop(query, None)
+        self.active = query
+
+    def endQuery(self, target):
+        self.ended.append(self.active)
+        self.active = None
+
+    def getQueryParameter(self, query, name):
+        if name == self.QUERY_RESULT_AVAILABLE:
+            return query in self.results
+        return self.results.pop(query)
+
+    def getParameter(self, name):
+        assert name == Extension.GPU_DISJOINT_EXT
+        disjoint, self.disjoint = self.disjoint, False
+        return disjoint
+
+    # the GPU finishes the oldest query
+    def finish(self, ms):
+        query = next(query for query in self.ended if query not in self.results)
+        self.ended.remove(query)
+        self.results[query] = ms * 1e6
+
+
+def frame(timer):
+    timer.begin()
+    timer.end()
+    return timer.poll()
+
+
+def test_gpu_timer_hands_out_the_results_in_order_once_they_are_done():
+    gl = Gl()
+    timer = GpuTimer(gl, Extension())
+    assert frame(timer) == []
+    assert frame(timer) == []
+    gl.finish(3)
+    gl.finish(4)
+    assert timer.poll() == pytest.approx([3, 4])
+    # the queries that were read are used again
+    frame(timer)
+    assert gl.created == 2
+
+
+def test_gpu_timer_drops_results_of_a_disjoint_period():
+    gl = Gl()
+    timer = GpuTimer(gl, Extension())
+    frame(timer)
+    gl.finish(3)
+    gl.disjoint = True
+    assert timer.poll() == []
+    frame(timer)
+    gl.finish(5)
+    assert timer.poll() == pytest.approx([5])
+
+
+def test_gpu_timer_skips_frames_while_all_queries_are_busy():
+    gl = Gl()
+    timer = GpuTimer(gl, Extension(), max_queries=2)
+    for _ in range(5):
+        frame(timer)
+    assert gl.created == 2
+    timer.destroy()
+    assert sorted(gl.deleted) == [1, 2]
@@ -0,0 +1,86 @@
+# The shared runtime of both webapps under the stand-in of js_stub
+import pytest
+import js_stub
+js_stub.install()
+from js_stub import run_frames, window
+from frame_profiler import FrameProfiler
+from runtime import Runtime, load_scripts
+
+
+def proxies(profiler):
+    return sum(frame["counters"].get("proxies", 0) for frame in profiler.frames)
+
+
+def test_runtime_counts_its_proxies():
+    profiler = FrameProfiler()
+    runtime = Runtime(profiler)
+    runtime.draw = runtime.render_scene
+    runtime.scheduler.invalidate()
+    run_frames(1)
+    # the frame, the visibility and the resize listeners and the refresh probe
+    assert proxies(profiler) == 4
+    loaded = []
+    load_scripts(["https://example.com/a.js", "https://example.com/b.js"], lambda: loaded.append(True),
+                 runtime.create_proxy)
+    # the scripts load after the frame, the proxy is counted in the frame
+    runtime.scheduler.invalidate()
+    run_frames(1)
+    assert loaded == [True]
+    # one proxy for all scripts
+    assert proxies(profiler) == 5
+    runtime.destroy()
+
+
+def test_a_script_that_fails_stops_the_rest_and_is_tried_again():
+    good, bad, last = ("https://example.com/{}.js".format(name) for name in ("good", "bad", "last"))
+    js_stub.document.head.failing.add(bad)
+    loaded, failed = [], []
+    load_scripts([good, bad, last], lambda: loaded.append(True), on_error=failed.append)
+    run_frames(1)
+    assert (loaded, failed) == ([], [bad])
+    js_stub.document.head.failing.clear()
+    load_scripts([good, bad, last], lambda: loaded.append(True), on_error=failed.append)
+    run_frames(1)
+    assert (loaded, failed) == ([True], [bad])
+
+
+# a draw that asks for the next frame while it draws, like a running rebuild
+def continuous(runtime):
+    def draw():
+        runtime.render_scene()
+        runtime.scheduler.invalidate()
+    return draw
+
+
+@pytest.mark.parametrize("refresh_ms, frame_ms, lowered", [
+    (1000 / 60, 1000 / 30, True),
+    (1000 / 60, 1000 / 60, False),
+    # requestAnimationFrame at 30 Hz, every frame on time
+    (1000 / 30, 1000 / 30, False),
+], ids=["slow frames", "60 Hz", "30 Hz"])
+def test_frames_drawn_back_to_back_against_the_refresh_interval(refresh_ms, frame_ms, lowered):
+    runtime = Runtime(FrameProfiler())
+    # nothing is drawn while the probe measures the display
+    run_frames(61, interval_ms=refresh_ms)
+    assert runtime.refresh.interval_ms == pytest.approx(refresh_ms)
+    runtime.draw = continuous(runtime)
+    runtime.scheduler.invalidate()
+    run_frames(200, interval_ms=frame_ms)
+    assert (runtime.governor.report() != "x1.00") == lowered
+    runtime.draw = runtime.render_scene
+    run_frames(1)
+    runtime.destroy()
+
+
+def test_frames_drawn_on_input_do_not_govern_the_resolution():
+    runtime = Runtime(FrameProfiler())
+    run_frames(61)
+    runtime.draw = runtime.render_scene
+    for _ in range(200):
+        # an input event every third refresh
+        window.__dict__["_time"] += 2 * 1000 / 60
+        runtime.scheduler.invalidate()
+        run_frames(1)
+    assert runtime.scheduler.interval_ms is None
+    assert runtime.governor.report() == "x1.00"
+    runtime.destroy()
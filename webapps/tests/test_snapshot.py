@@ -0,0 +1,93 @@
+# Round trips of the snapshot format and the stores
+import numpy as np
+import pytest
+from js_stub import Storage
+from snapshot import (MAGIC, MemoryStore, FileStore, LocalStorageStore, SnapshotCache, SnapshotError,
+                      encode, decode, params_key)
+
+PARAMS = {"radius": 1.5, "segments": [8, 4]}
+
+
+def buffers():
+    return {"positions": np.arange(30, dtype=np.float32).reshape(10, 3),
+            "indices": np.arange(7, dtype=np.uint16),
+            "empty": np.zeros((0, 3), dtype=np.float64)}
+
+
+def test_round_trip_keeps_kind_params_and_buffers():
+    snapshot = decode(encode("template", PARAMS, buffers()))
+    assert snapshot.kind == "template"
+    assert snapshot.params == PARAMS
+    for name, array in buffers().items():
+        assert snapshot[name].dtype == array.dtype
+        np.testing.assert_array_equal(snapshot[name], array)
+
+
+def test_decoded_buffers_are_read_only_aligned_views():
+    data = encode("template", PARAMS, buffers())
+    snapshot = decode(data)
+    for array in snapshot.buffers.values():
+        assert not array.flags.writeable
+        assert not array.flags.owndata
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:6],
+    lambda data: b"XXXX" + data[4:],
+    lambda data: data[:4] + (99).to_bytes(4, "little") + data[8:],
+    lambda data: data[:12] + b"\xff" * 8 + data[20:],
+    lambda data: data[:-16],
+], ids=["short", "magic", "version", "header", "cut off"])
+def test_decode_rejects_corrupt_data(corrupt):
+    data = encode("template", PARAMS, buffers())
+    assert data.startswith(MAGIC)
+    with pytest.raises(SnapshotError):
+        decode(corrupt(data))
+
+
+def test_cache_misses_on_other_params_and_corrupt_data():
+    store = MemoryStore()
+    cache = SnapshotCache(store)
+    assert cache.put("template", PARAMS, buffers())
+    assert cache.get("template", PARAMS) is not None
+    assert cache.get("template", dict(PARAMS, radius=2)) is None
+    assert cache.get("forest", PARAMS) is None
+    store.put(params_key("template", PARAMS), b"PTSN broken")
+    assert cache.get("template", PARAMS) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_file_store_round_trip(tmp_path):
+    cache = SnapshotCache(FileStore(str(tmp_path)))
+    cache.put("forest", PARAMS, buffers())
+    np.testing.assert_array_equal(cache.get("forest", PARAMS)["positions"], buffers()["positions"])
+
+
+def test_local_storage_store_skips_snapshots_above_max_bytes():
+    store = LocalStorageStore(Storage(), "snapshot:test:", max_bytes=64)
+    assert not store.put("big", bytes(65))
+    assert store.get("big") is None
+    assert store.put("small", bytes(64))
+    assert store.get("small") == bytes(64)
+
+
+class FullStorage(Storage):
+    # a storage with room for a few characters, like a full localStorage
+    def setItem(self, key, value):
+        if sum(map(len, self._items.values())) + len(value) > 150:
+            raise RuntimeError("QuotaExceededError")
+        super().setItem(key, value)
+
+
+def test_full_storage_only_clears_the_own_prefix():
+    storage = FullStorage()
+    other = LocalStorageStore(storage, "snapshot:webapp_2:")
+    own = LocalStorageStore(storage, "snapshot:webapp_1:")
+    assert other.put("forest", bytes(30))
+    assert own.put("first", bytes(60))
+    assert own.put("second", bytes(60))
+    assert own.get("first") is None
+    assert own.get("second") == bytes(60)
+    assert other.get("forest") == bytes(30)
+    # does not fit even in an empty store
+    assert not own.put("huge", bytes(300))
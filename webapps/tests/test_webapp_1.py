@@ -0,0 +1,21 @@
+# webapp_1 under the stand-in of js_stub, started like benchmark.py does
+import benchmark
+from benchmark import webapp_1, frame_after
+
+
+def test_a_grid_too_large_for_the_per_cell_mode_is_drawn_instanced():
+    benchmark.start_page(webapp_1)
+    frame_after(("x", 2), ("y", 2))()
+    webapp_1.set_instanced(False)
+    frame_after()()
+    assert not webapp_1.instanced
+    frame_after(("x", webapp_1.PER_CELL_MAX + 1))()
+    assert webapp_1.instanced and webapp_1.view_params.instanced
+    # the checkbox cannot switch back while the grid is too large
+    webapp_1.set_instanced(False)
+    assert webapp_1.instanced and webapp_1.view_params.instanced
+    frame_after(("x", webapp_1.PER_CELL_MAX))()
+    webapp_1.set_instanced(False)
+    frame_after()()
+    assert not webapp_1.instanced
+    assert len(webapp_1.cell_keys) == webapp_1.PER_CELL_MAX * 3
@@ -1,9 +1,49 @@
+# Import the shared runtime first, it sets up the profilers before `js` is imported
+from runtime import Runtime, page_profiler, page_snapshots, ffi
 # Import javascript modules
-from js import THREE, window, document, Object
+from js import THREE, window, Object, console
 # Import pyscript / pyodide modules
 from pyodide.ffi import create_proxy, to_js
 # Import python module
 import math
+import numpy as np
+# Import local modules
+from grid_params import ParamStore, GEOMETRY, LAYOUT, TRANSFORM
+from grid_layout import cell_indices, placement_matrices, reconcile
+from primitives import Primitive, PRIMITIVES_VERSION, cylinder, capsule
+from lod import LodSelector, tier_keys, bounding_radius, projected_sizes
+from geometry_cache import TemplateCache, template_key
+from rebuild_pipeline import RebuildPipeline
+from spatial_chunks import ChunkCuller, tile_chunks, chunk_order, chunk_spheres
+from gpu_resources import ResourceManager, GEOMETRY as GPU_GEOMETRY, MATERIAL, OBJECT, PROXY
+from profiler_hud import download_trace
+
+#-----------------------------------------------------------------------
+# PROFILING
+# times the startup from the start of the page load and the phases of every frame
+profiler = page_profiler()
+# count every proxy that is created, a steady page creates none per frame
+create_proxy = profiler.counted("proxies", create_proxy)
+if ffi is not None:
+    ffi.attach(profiler)
+
+# shapes that were tessellated in an earlier page load, by their template key.
+# Only the committed shape is saved and only up to 256 kB, a fine capsule is
+# tessellated faster than it is written to localStorage.
+snapshots = page_snapshots("webapp_1", max_bytes=256 * 1024)
+TEMPLATE_FIELDS = ("shape", "radius", "height", "radial_segments", "cap_subdivisions")
+# the newest shapes tessellated in this page load, by template key, until the
+# committed one is saved
+unsaved_templates = {}
+UNSAVED_TEMPLATES = 8
+# milliseconds of a frame that rebuilding the grid may take
+REBUILD_BUDGET_MS = 8
+# cells along the edge of a chunk, a chunk is culled as a whole
+CHUNK_CELLS = 32
+# largest x and y of the per cell mode, the old maximum of the sliders. A
+# larger grid is drawn instanced, per cell it takes seconds to lay out.
+PER_CELL_MAX = 10
+
 
 
 #-----------------------------------------------------------------------
@@ -12,42 +52,29 @@ def main():
     #-----------------------------------------------------------------------
     # VISUAL SETUP
     # Declare the global variables
-    global renderer, scene, camera, controls,composer
-    
-    #Set up the renderer
-    renderer = THREE.WebGLRenderer.new()
-    renderer.setPixelRatio( window.devicePixelRatio )
-    renderer.setSize(window.innerWidth, window.innerHeight)
-    document.body.appendChild(renderer.domElement)
-
-    # Set up the scene
-    scene = THREE.Scene.new()
-    back_color = THREE.Color.new(0,0,0)
-    scene.background = back_color
-    camera = THREE.PerspectiveCamera.new(75, window.innerWidth/window.innerHeight, 0.1, 1000)
-    camera.position.z = 50
-    scene.add(camera)
-
-    # Graphic Post Processing
-    global composer
-    post_process()
-
-    # Set up responsive window
-    resize_proxy = create_proxy(on_window_resize)
-    window.addEventListener('resize', resize_proxy)
+    global runtime, renderer, scene, camera, controls, resources, scheduler, governor, hud
+    # everything that has to be disposed again is registered here
+    resources = ResourceManager()
+    # renderer, scene, camera and frame loop are shared with webapp_2, a
+    # frame is only drawn when something changed
+    runtime = Runtime(profiler)
+    renderer, scene, camera = runtime.renderer, runtime.scene, runtime.camera
+    scheduler, governor, hud = runtime.scheduler, runtime.governor, runtime.hud
+    profiler.lap("renderer")
 
     #-----------------------------------------------------------------------
     # DESIGN / GEOMETRY GENERATION
     # Geometry Creation
-    global geom_params, capsules_x, capsules_y, capsule_lines, cylinders_x, cylinders_y, cylinder_lines
-    # lists for both dimensions and lines
-    capsules_x = []
-    capsules_y = []
-    capsule_lines = []
-    # second geometry: lists for both dimensions and lines
-    cylinders_x = []
-    cylinders_y = []
-    cylinder_lines = []
+    global geom_params, gui_params, cells, template, templates, snapshot_pending
+    # one mesh and one line per grid cell, keyed by (i, j)
+    cells = {}
+    # shared geometry and edges of all cells
+    template = None
+    # recently used shapes, so scrubbing a slider back does not tessellate again
+    # (up to four level of detail tiers per shape)
+    templates = TemplateCache(build_template, capacity=16, on_evict=resources.release_all)
+    # the committed template that is saved once the rebuilds are done
+    snapshot_pending = None
     # set parameters for both geometries as dictionary
     geom_params_cylinder = {
         "radius": 5,
@@ -76,20 +103,23 @@ def main():
     geom_params = geom_params_cylinder
     #geom_params = geom_params_capsule
     #-----------------------------------------------------------------------
-    
-    geom_params = Object.fromEntries(to_js(geom_params))
+
+    # the GUI works on a javascript object, the scene reads the python store
+    gui_params = Object.fromEntries(to_js(geom_params))
+    geom_params = ParamStore(geom_params)
 
     # create Materials
     global material, line_material, color, color_lines, geometry, plane, light, loader
 
     color = THREE.Color.new(255,255,255)
     color_lines = THREE.Color.new(255,255,255)
-    material = THREE.MeshBasicMaterial.new()
+    material = resources.track(THREE.MeshBasicMaterial.new(), MATERIAL)
     material.transparent = True
     material.opacity = 0.8
-    
+
     geometry = THREE.PlaneGeometry.new(2000, 2000)
     geometry.rotateX(- math.pi / 2)
+    resources.track(geometry, GPU_GEOMETRY, geometry_bytes(geometry))
 
     # create a plane to make the simulation more grounded
     plane = THREE.Mesh.new(geometry, material)
@@ -101,321 +131,687 @@ def main():
     light.position.set(50, 50, 50)
     scene.add(light)
 
-    line_material = THREE.LineBasicMaterial.new()
+    line_material = resources.track(THREE.LineBasicMaterial.new(), MATERIAL)
     line_material.color = color_lines
 
-    
-    #-----------------------------------------------------------------------
-    # GEOMETRY CREATION: CAPSULE
-
-    if geom_params.type == "capsule":
-        # first for loop to create capsules on x-axis
-        for i in range (geom_params.x):
-            geom = THREE.CapsuleGeometry.new(geom_params.radius, geom_params.length, geom_params.capSubdivisions, geom_params.radial_segments)
-
-            geom.translate (geom_params.radius*i*2,0,0)
-            geom.rotateX(math.radians(geom_params.rotation_x)/geom_params.x*i)
-
-            capsule = THREE.Mesh.new(geom, material)
-            capsules_x.append(capsule)
-            scene.add(capsule)
-
-            #draw the capsule lines
-            edges = THREE.EdgesGeometry.new(capsule.geometry)
-            line = THREE.LineSegments.new(edges,line_material)
-            capsule_lines.append(line)
-            scene.add(line)
-            # second for loop (nested) to create capsules on second axis
-            for j in range (geom_params.y):
-
-                #after consultation with zuardin: clone the capsules 
-                geom = geom.clone()
-
-                geom.translate(0, 0, geom_params.radius*2)
-                geom.rotateX(math.radians(geom_params.rotation_y)/geom_params.y*j)
+    # the same line material, but reading one matrix per instance
+    global instanced_line_material
+    instanced_line_material = resources.track(line_material.clone(), MATERIAL)
+    instanced_line_material.defines = Object.fromEntries(to_js({"USE_INSTANCING": ""}))
 
-                capsule = THREE.Mesh.new(geom, material)
-                capsules_y.append(capsule)
-                scene.add(capsule)
+    #-----------------------------------------------------------------------
+    # RENDER MODE
+    # per cell: one mesh and one line per cell
+    # instanced: one InstancedMesh and one instanced line object per chunk
+    global view_params, instanced
+    instanced = False
+    view_params = Object.fromEntries(to_js({"instanced": instanced, "lod": True, "frame_ms": 0,
+                                            "templates": "", "memory": "", "triangles": "",
+                                            "resolution": "", "rebuild": "", "chunks": "",
+                                            "hud": False}))
+    view_params.export_trace = resources.track(create_proxy(export_trace), PROXY)
 
-                # draw the capsule lines
-                edges = THREE.EdgesGeometry.new(capsule.geometry)
-                line = THREE.LineSegments.new(edges,line_material)
-                capsule_lines.append(line)
-                scene.add(line)
+    #-----------------------------------------------------------------------
+    # LEVEL OF DETAIL
+    # every cell picks a tessellation tier from its size on screen
+    global lod, lod_enabled, lod_keys, triangle_counts, cell_keys, cell_centers, cell_tiers
+    lod = LodSelector()
+    lod_enabled = True
+    # template keys of the tiers of the current shape, fine to coarse
+    lod_keys = []
+    # triangles of every template that was built
+    triangle_counts = {}
+    # the cells in the order of the placement matrices
+    cell_keys = []
+    cell_centers = None
+    cell_tiers = np.zeros(0, dtype=int)
 
     #-----------------------------------------------------------------------
-    # GEOMETRY CREATION: CYLINDER
-    elif geom_params.type == "cylinder":
-        # first for loop to create cylinders on x axis
-        for i in range (geom_params.x):
-            geom = THREE.CylinderGeometry.new(geom_params.radius, geom_params.radius, geom_params.height, geom_params.radial_segments)
-
-            geom.translate(geom_params.radius*i*2,0,0)
-            geom.rotateX(math.radians(geom_params.rotation_x)/geom_params.x*i)
-
-            cylinder = THREE.Mesh.new(geom, material)
-            cylinders_x.append(cylinder)
-            scene.add(cylinder)
-
-            #draw the cylinder lines
-            edges = THREE.EdgesGeometry.new(cylinder.geometry)
-            line = THREE.LineSegments.new(edges,line_material)
-            cylinder_lines.append(line)
-            scene.add(line)
-            # inner for loop to create cylinders on second axis
-            for j in range (geom_params.y):
-                # clone existing geometry
-                geom = geom.clone()
-
-                geom.translate(0, 0, geom_params.radius*2)
-                geom.rotateX(math.radians(geom_params.rotation_y)/geom_params.y*j)
-
-                cylinder = THREE.Mesh.new(geom, material)
-                cylinders_y.append(cylinder)
-                scene.add(cylinder)
-
-                # draw the cylinder lines
-                edges = THREE.EdgesGeometry.new(cylinder.geometry)
-                line = THREE.LineSegments.new(edges,line_material)
-                cylinder_lines.append(line)
-                scene.add(line)
+    # SPATIAL CHUNKS
+    # the grid is split into tiles of CHUNK_CELLS x CHUNK_CELLS cells, a tile
+    # that is off screen is not drawn and its cells are skipped
+    global culler, chunk_keys, chunk_groups, instanced_chunks, cell_chunks, chunk_cells, chunk_starts
+    global chunk_matrices, chunk_dirty
+    culler = ChunkCuller()
+    # tile of every chunk, the chunk of every cell
+    chunk_keys = []
+    cell_chunks = np.zeros(0, dtype=int)
+    # the cells sorted by chunk and the first cell of every chunk
+    chunk_cells = np.zeros(0, dtype=int)
+    chunk_starts = np.zeros(1, dtype=int)
+    # tile -> Group of the cells (per cell) or (mesh, lines, edges) (instanced)
+    chunk_groups = {}
+    instanced_chunks = {}
+    # the placement matrices sorted by chunk, a chunk that is off screen gets
+    # them once it comes into view
+    chunk_matrices = None
+    chunk_dirty = np.zeros(0, dtype=bool)
 
+    #-----------------------------------------------------------------------
+    # GEOMETRY CREATION
+    # slider input is coalesced and built over several frames, while the
+    # previous grid stays on screen
+    global rebuild, pending_cells, pending_stages
+    rebuild = RebuildPipeline(rebuild_grid, lambda: geom_params.dirty, REBUILD_BUDGET_MS)
+    # hidden cells of a rebuild that is not committed yet, and its stages
+    pending_cells = {}
+    pending_stages = set()
+    # every parameter is dirty at the start, so this builds the whole grid
+    profiler.lap("materials")
+    rebuild.finish()
+    profiler.lap("geometry")
 
     #-----------------------------------------------------------------------
 
     # USER INTERFACE
     # Set up Mouse orbit control
     controls = THREE.OrbitControls.new(camera, renderer.domElement)
+    controls.addEventListener('change', resources.track(create_proxy(scheduler.invalidate), PROXY))
+
+    # dat.gui loads next to the post-processing, the GUI is built when it is
+    # there, which may be before or after the first frame. Until then, or if
+    # it does not load, the grid keeps the parameters it started with.
+    runtime.load_gui(build_gui)
+
+    #-----------------------------------------------------------------------
+    # RENDER + UPDATE THE SCENE AND GEOMETRIES
+    # the post-processing is loaded behind the first frame
+    runtime.start(render)
+    # end of main
 
-    # Set up GUI
-    gui = window.dat.GUI.new()
+#-----------------------------------------------------------------------
+# HELPER FUNCTIONS
+'''
+BUILD_GUI
+the sliders of the parameters, the render mode and the profiler
+parameters: GUI: the dat.GUI class, loaded by the runtime
+'''
+def build_gui(GUI):
+    gui = GUI.new()
 
     param_folder = gui.addFolder('Select Geometry')
 
-    
+
     param_folder = gui.addFolder('Parameters')
     # slider for changing the geometry. Adapted to the used geometries
-    param_folder.add(geom_params, 'radius', 5, 100, 1)
-    param_folder.add(geom_params, 'x', 1, 10, 1)
-    param_folder.add(geom_params, 'y', 1, 10, 1)
-    param_folder.add(geom_params, 'rotation_x', 0, 270)
-    param_folder.add(geom_params, 'rotation_y', 0, 270)
-    param_folder.add(geom_params, 'radial_segments',4,50)
+    add_slider(param_folder, 'radius', 5, 100, 1)
+    add_slider(param_folder, 'x', 1, 300, 1)
+    add_slider(param_folder, 'y', 1, 300, 1)
+    add_slider(param_folder, 'rotation_x', 0, 270)
+    add_slider(param_folder, 'rotation_y', 0, 270)
+    add_slider(param_folder, 'radial_segments',4,50)
     param_folder.open()
-    
-    #-----------------------------------------------------------------------
-    # RENDER + UPDATE THE SCENE AND GEOMETRIES
-    render()
-    # end of main 
 
-#-----------------------------------------------------------------------
-# HELPER FUNCTIONS
+    # switch the render mode to compare the frame time of both
+    view_folder = gui.addFolder('Rendering')
+    # listens, a large grid switches it on by itself
+    instanced_control = view_folder.add(view_params, 'instanced').listen()
+    instanced_control.onChange(resources.track(create_proxy(set_instanced), PROXY))
+    view_folder.add(view_params, 'lod').onChange(resources.track(create_proxy(set_lod), PROXY))
+    view_folder.add(view_params, 'frame_ms').listen()
+    view_folder.add(view_params, 'templates').listen()
+    view_folder.add(view_params, 'memory').listen()
+    view_folder.add(view_params, 'triangles').listen()
+    view_folder.add(view_params, 'resolution').listen()
+    view_folder.add(view_params, 'rebuild').listen()
+    view_folder.add(view_params, 'chunks').listen()
+    view_folder.open()
+
+    # frame profiler with an on-screen HUD and a Chrome trace export
+    profiler_folder = gui.addFolder('Profiler')
+    profiler_folder.add(view_params, 'hud').onChange(resources.track(create_proxy(hud.set_visible), PROXY))
+    profiler_folder.add(view_params, 'export_trace')
+    if ffi is not None:
+        view_params.ffi_report = resources.track(create_proxy(log_ffi_report), PROXY)
+        profiler_folder.add(view_params, 'ffi_report')
+
+'''
+ADD_SLIDER
+adds a slider to the GUI that writes its value into the parameter store
+parameters: folder: dat.GUI folder, field: string, bounds and step of the slider'''
+def add_slider(folder, field, *bounds):
+    def on_change(value):
+        geom_params.set(field, value)
+        if geom_params.dirty:
+            rebuild.request()
+            scheduler.invalidate()
+    folder.add(gui_params, field, *bounds).onChange(resources.track(create_proxy(on_change), PROXY))
+
+'''
+GEOMETRY_BYTES
+estimates the size of the buffers of a geometry on the GPU
+parameters: geom: three.js BufferGeometry
+returns: int, bytes of the index and all attributes'''
+def geometry_bytes(geom):
+    nbytes = 0
+    if geom.index is not None:
+        nbytes += geom.index.array.byteLength
+    for name in Object.keys(geom.attributes):
+        nbytes += geom.getAttribute(name).array.byteLength
+    return nbytes
+
+'''
+BUILD_TEMPLATE
+creates the geometry that is shared by all cells of the grid, called by the
+template cache when a shape is not cached yet. The vertices are generated in
+python and every attribute is handed to javascript in one transfer.
+parameters: key: tuple from template_key()
+returns: geometry and its edges'''
+def build_template(key):
+    data = tessellate(key)
+    position = THREE.BufferAttribute.new(to_js(data.positions.ravel()), 3)
+    geom = THREE.BufferGeometry.new()
+    geom.setAttribute('position', position)
+    geom.setAttribute('normal', THREE.BufferAttribute.new(to_js(data.normals.ravel()), 3))
+    geom.setIndex(THREE.BufferAttribute.new(to_js(data.indices), 1))
+    # the edges use the same vertices, only their index is different
+    edges = THREE.BufferGeometry.new()
+    edges.setAttribute('position', position)
+    edges.setIndex(THREE.BufferAttribute.new(to_js(data.edges), 1))
+    resources.track(geom, GPU_GEOMETRY, geometry_bytes(geom))
+    resources.track(edges, GPU_GEOMETRY, data.edges.nbytes)
+    triangle_counts[key] = len(data.indices) // 3
+    return geom, edges
+
+'''
+TESSELLATE
+the vertices of a template shape, from the snapshot of an earlier page load
+or generated. A generated shape is kept for save_template().
+parameters: key: tuple from template_key()
+returns: primitives.Primitive'''
+def tessellate(key):
+    saved = snapshots.get("template", template_params(key))
+    if saved is not None:
+        return Primitive(**saved.buffers)
+    shape, radius, height, radial_segments, cap_subdivisions = key
+    if shape == "capsule":
+        data = capsule(radius, height, cap_subdivisions, radial_segments)
+    else:
+        data = cylinder(radius, height, radial_segments)
+    unsaved_templates[key] = data
+    while len(unsaved_templates) > UNSAVED_TEMPLATES:
+        unsaved_templates.pop(next(iter(unsaved_templates)))
+    return data
+
+'''
+TEMPLATE_PARAMS
+the parameters of the snapshot of a template shape
+parameters: key: tuple from template_key()
+returns: dictionary'''
+def template_params(key):
+    params = dict(zip(TEMPLATE_FIELDS, key))
+    params["primitives"] = PRIMITIVES_VERSION
+    return params
+
+'''
+SAVE_TEMPLATE
+saves the snapshot of a shape that was tessellated in this page load. The
+shapes of cancelled rebuilds and the level of detail tiers are not saved.
+parameters: key: tuple from template_key()'''
+def save_template(key):
+    data = unsaved_templates.pop(key, None)
+    unsaved_templates.clear()
+    if data is not None:
+        snapshots.put("template", template_params(key), data._asdict())
+
+'''
+REBUILD GRID: updates the capsules or cylinders of the grid
+Only the stages that depend on the changed parameters are rebuilt:
+a new shape creates one new template, a new grid size adds or removes
+cells and a new rotation only moves the existing cells.
+The rebuild is stepped by the rebuild pipeline over as many frames as it
+needs. The template, the placement and the new cells (hidden) are made
+first, the scene shows the previous grid until commit_grid() swaps it in the
+last step. The stages of a cancelled rebuild are done by the next one.
+parameters: none
+returns: generator, one step per template, placement and new cell
+'''
+def rebuild_grid():
+    pending_stages.update(geom_params.consume())
+    stages = set(pending_stages)
+    x, y = geom_params.x, geom_params.y
+
+    shape, keys = template, lod_keys
+    if GEOMETRY in stages:
+        keys = tier_keys(template_key(geom_params))
+        shape = templates.get(keys[0])
+        # the new cells are made with it before it is committed
+        templates.pin("rebuild", keys[:1])
+        yield
+
+    placement = None
+    if TRANSFORM in stages:
+        # all cell matrices in one numpy call
+        placement = placement_matrices(x, y, geom_params.radius, geom_params.rotation_x, geom_params.rotation_y)
+        yield
+
+    if LAYOUT in stages and not instanced:
+        # the cells of the new size are made before the old ones are removed
+        for key in cell_indices(x, y):
+            if key not in cells and key not in pending_cells:
+                pending_cells[key] = create_cell(key, shape, visible=False)
+                yield
+
+    commit_grid(stages, shape, keys, placement)
+    pending_stages.clear()
+
+'''
+COMMIT GRID
+puts the result of rebuild_grid() in the scene in one step
+parameters: stages: set of rebuild stages, shape: template, keys: its tier
+keys, placement: float32 array (cells, 4, 4) or None
+'''
+def commit_grid(stages, shape, keys, placement):
+    global template, lod_keys, cell_keys, cell_centers, cell_tiers, chunk_matrices, snapshot_pending
+    if GEOMETRY in stages:
+        template, lod_keys = shape, keys
+        # the cells draw the template and its tiers until the next commit
+        templates.pin("scene", keys)
+        templates.pin("rebuild", ())
+        # saved in a later frame, when no rebuild is running
+        snapshot_pending = keys[0]
+
+    if LAYOUT in stages:
+        # surviving cells keep their tier, new cells get one in update_lod()
+        old_tiers = dict(zip(cell_keys, cell_tiers.tolist()))
+        cell_keys = cell_indices(geom_params.x, geom_params.y)
+        cell_tiers = np.array([old_tiers.get(key, -1) for key in cell_keys], dtype=int)
+        set_chunks()
+    if GEOMETRY in stages:
+        # all cells show the finest tier of the new shape now
+        cell_tiers[:] = -1
+
+    if placement is not None:
+        # the matrices reach javascript chunk by chunk in update_chunks()
+        cell_centers = placement[:, 3, :3].astype(np.float64)
+        chunk_matrices = placement[chunk_cells]
+        chunk_dirty[:] = True
+    if placement is not None or GEOMETRY in stages:
+        # the spheres around the cells of every chunk
+        culler.set_spheres(*chunk_spheres(cell_centers[chunk_cells], bounding_radius(lod_keys[0]), chunk_starts),
+                           moved=LAYOUT not in stages)
+    if instanced:
+        update_instanced(stages)
+    else:
+        update_cells(stages)
+
 '''
-UPDATE CAPSULES: updates the capsules if the used geometry is capsule
+SET_CHUNKS
+puts the cells of the current grid into chunks
 parameters: none
-returns: all wanted capsules in the scene for the webapp
-'''
-def update_capsules ():
-    global capsules_x, capsules_y, capsule_lines, material, line_material
-     
-#make sure you dont have 0 capsules
-    if len(capsules_x) != 0 or len(capsules_y) != 0:
-        if len(capsules_x) != geom_params.x and len(capsules_y) != geom_params.y:
-            # delete all capsules
-            for capsule in capsules_x:
-                scene.remove(capsule)
-            for capsule in capsules_y:
-                scene.remove(capsule)
-            # delete all lines
-            for line in capsule_lines: 
-                scene.remove(line)
-
-            for i in range (geom_params.x):
-                # place capsules into GUI
-                geom = THREE.CapsuleGeometry.new(geom_params.radius, geom_params.length, geom_params.capSubdivisions, geom_params.radial_segments)
-                geom.translate (geom_params.radius*2*i,0,0)
-                geom.rotateX(math.radians(geom_params.rotation_x)/geom_params.x*i)
-                # create capsules
-                capsule = THREE.Mesh.new(geom, material)
-                capsules_x.append(capsule)
-                scene.add(capsule)
-
-                #draw the capsule lines
-                edges = THREE.EdgesGeometry.new(capsule.geometry)
-                line = THREE.LineSegments.new(edges,line_material)
-                capsule_lines.append(line)
-                # place capsules in scene
-                scene.add(line)
-                for j in range(geom_params.y):
-                    geom = geom.clone()
-
-                    geom.translate(0, 0, geom_params.radius * 2)
-                    geom.rotateX(math.radians(geom_params.rotation_y) / geom_params.y * j)
-
-                    capsule = THREE.Mesh.new(geom, material)
-                    capsules_y.append(capsule)
-                    scene.add(capsule)
-
-                    # draw the capsule lines
-                    edges = THREE.EdgesGeometry.new(capsule.geometry)
-                    line = THREE.LineSegments.new(edges, line_material)
-                    capsule_lines.append(line)
-                    scene.add(line)
+'''
+def set_chunks():
+    global chunk_keys, cell_chunks, chunk_cells, chunk_starts, chunk_dirty
+    chunk_keys, cell_chunks = tile_chunks(cell_keys, CHUNK_CELLS)
+    chunk_cells, chunk_starts = chunk_order(cell_chunks, len(chunk_keys))
+    chunk_dirty = np.ones(len(chunk_keys), dtype=bool)
+
+'''
+UPDATE CHUNKS
+culls the chunks against the camera, shows and hides the chunks whose
+visibility changed and hands the new matrices to the chunks on screen that
+did not get them yet
+parameters: none
+'''
+def update_chunks():
+    if cell_centers is None:
+        return
+    for n in culler.update(runtime.view_projection()).tolist():
+        visible = bool(culler.visible[n])
+        if instanced:
+            mesh, lines, _ = instanced_chunks[chunk_keys[n]]
+            mesh.visible = visible
+            lines.visible = visible
         else:
-            for i in range (len(capsules_x)):
-                capsule = capsules_x[i]
-                line = capsule_lines[i]
-                # place the capsule in GUI, are already there but are placedin a new way in x directon 
-                geom = THREE.CapsuleGeometry.new(geom_params.radius, geom_params.length, geom_params.capSubdivisions, geom_params.radial_segments)
-                geom.translate (geom_params.radius*2,0,0)
-                geom.rotateX(math.radians(geom_params.rotation_x)/geom_params.x*i)
-    
-                capsule.geometry = geom
-    
-                edges = THREE.EdgesGeometry.new(capsule.geometry)
-                line.geometry = edges
-                for j in range(len(capsules_y)):
-                    capsule = capsules_y[j]
-                    line = capsule_lines[len(capsules_x)+j]
-                    # place the capsule in GUI, are already there but are placedin a new way in y directon
-                    geom = THREE.CapsuleGeometry.new(geom_params.radius, geom_params.length, geom_params.capSubdivisions, geom_params.radial_segments)
-                    geom.translate(0,0, geom_params.radius * 2)
-                    geom.rotateX(math.radians(geom_params.rotation_y) / geom_params.y * j)
+            chunk_groups[chunk_keys[n]].visible = visible
+    for n in np.nonzero(culler.visible & chunk_dirty)[0].tolist():
+        set_chunk_matrices(n)
+        chunk_dirty[n] = False
+    profiler.sample("chunks", culler.visible_count)
+    profiler.sample("chunks full", len(culler))
+
+'''
+SET_CHUNK_MATRICES
+moves the cells of one chunk to their placement, one transfer per chunk
+parameters: n: index of the chunk
+'''
+def set_chunk_matrices(n):
+    first, last = int(chunk_starts[n]), int(chunk_starts[n + 1])
+    matrices = to_js(chunk_matrices[first:last].ravel())
+    if instanced:
+        mesh = instanced_chunks[chunk_keys[n]][0]
+        mesh.instanceMatrix.array.set(matrices)
+        mesh.instanceMatrix.needsUpdate = True
+        return
+    for m, cell in enumerate(chunk_cells[first:last].tolist()):
+        for obj in cells[cell_keys[cell]]:
+            obj.matrix.fromArray(matrices, m * 16)
+            obj.matrixWorldNeedsUpdate = True
+
+'''
+UPDATE LOD
+chooses the tier of every cell from its size on screen and swaps the
+geometry of the cells whose tier changed. In the instanced mode every chunk
+uses the finest tier any of its cells needs. The cells of chunks that are
+off screen keep their tier.
+parameters: none
+'''
+def update_lod():
+    global cell_tiers
+    if not lod_enabled or cell_centers is None:
+        return
+    on_screen = np.nonzero(culler.visible[cell_chunks])[0]
+    if len(on_screen) == 0:
+        return
+    eye = camera.position.toArray().to_py()
+    sizes = projected_sizes(cell_centers[on_screen], eye, bounding_radius(lod_keys[0]), camera.fov,
+                            window.innerHeight)
+    tiers = cell_tiers.copy()
+    tiers[on_screen] = lod.select(sizes, cell_tiers[on_screen], len(lod_keys))
+    if instanced:
+        # -1 is a cell without a tier yet, it does not count unless the whole
+        # chunk has none, then the chunk keeps the template it shows
+        placed = np.where(tiers[chunk_cells] < 0, len(lod_keys), tiers[chunk_cells])
+        chunk_tiers = np.minimum.reduceat(placed, chunk_starts[:-1])
+        chunk_tiers[chunk_tiers == len(lod_keys)] = -1
+        tiers[chunk_cells] = np.repeat(chunk_tiers, np.diff(chunk_starts))
+        # all cells of a chunk have the same tier, its first cell tells it
+        changed = chunk_tiers != cell_tiers[chunk_cells[chunk_starts[:-1]]]
+        for n in np.nonzero(changed & (chunk_tiers >= 0))[0].tolist():
+            set_instanced_template(instanced_chunks[chunk_keys[n]], templates.get(lod_keys[chunk_tiers[n]]))
+    else:
+        tier_templates = {}
+        for n in np.nonzero(tiers != cell_tiers)[0].tolist():
+            tier = int(tiers[n])
+            if tier not in tier_templates:
+                tier_templates[tier] = templates.get(lod_keys[tier])
+            cylinder, line = cells[cell_keys[n]]
+            cylinder.geometry = tier_templates[tier][0]
+            line.geometry = tier_templates[tier][1]
+    cell_tiers = tiers
 
-                    capsule.geometry = geom
+'''
+SET_LOD
+switches the level of detail on and off
+parameters: value: bool, from the GUI checkbox
+'''
+def set_lod(value):
+    global lod_enabled
+    lod_enabled = bool(value)
+    cell_tiers[:] = -1
+    # without level of detail every cell goes back to the finest template
+    geom_params.touch("radial_segments")
+    scheduler.invalidate()
+
+'''
+UPDATE CELLS
+per cell mode: one mesh and one line for every cell of the grid, in one
+Group per chunk. The cells are moved by update_chunks().
+parameters: stages: set of rebuild stages
+'''
+def update_cells(stages):
+    if GEOMETRY in stages:
+        for cylinder, line in cells.values():
+            cylinder.geometry = template[0]
+            line.geometry = template[1]
+
+    if LAYOUT in stages:
+        # only add the cells that are new and remove the ones that vanished,
+        # all cells get their new position in update_chunks()
+        reconcile(cells, cell_keys, show_cell, remove_cell)
+        # cells made for a grid size that was scrubbed past
+        for cell in pending_cells.values():
+            remove_cell(cell)
+        pending_cells.clear()
+        for key in set(chunk_groups) - set(chunk_keys):
+            resources.release(chunk_groups.pop(key))
 
-                    edges = THREE.EdgesGeometry.new(capsule.geometry)
-                    line.geometry = edges
+'''
+CREATE_CELL
+creates the mesh and the line of one cell
+parameters: key: (i, j) of the cell, shape: template, the current one if None
+visible: bool, False for a cell that is shown later by show_cell()
+returns: mesh and line'''
+def create_cell(key, shape=None, visible=True):
+    shape = shape or template
+    cylinder = resources.track(THREE.Mesh.new(shape[0], material), OBJECT)
+    line = resources.track(THREE.LineSegments.new(shape[1], line_material), OBJECT)
+    # the matrix is set from the placement matrices, not from position and rotation
+    cylinder.matrixAutoUpdate = False
+    line.matrixAutoUpdate = False
+    if not visible:
+        cylinder.visible = False
+        line.visible = False
+    group = chunk_group(key)
+    group.add(cylinder)
+    group.add(line)
+    return cylinder, line
 
+'''
+CHUNK_GROUP
+the Group of the chunk a cell belongs to, created when it is first needed
+parameters: key: (i, j) of the cell
+returns: THREE.Group'''
+def chunk_group(key):
+    tile = (key[0] // CHUNK_CELLS, key[1] // CHUNK_CELLS)
+    if tile not in chunk_groups:
+        chunk_groups[tile] = resources.track(THREE.Group.new(), OBJECT)
+        scene.add(chunk_groups[tile])
+    return chunk_groups[tile]
 
-#-----------------------------------------------------------------------           
+'''
+SHOW_CELL
+the cell made ahead by rebuild_grid(), or a new one
+parameters: key: (i, j) of the cell
+returns: mesh and line'''
+def show_cell(key):
+    cell = pending_cells.pop(key, None)
+    if cell is None:
+        return create_cell(key)
+    # it may have been made with the shape of a rebuild that was cancelled
+    for obj, geometry in zip(cell, template):
+        obj.geometry = geometry
+        obj.visible = True
+    return cell
+
+def remove_cell(cell):
+    for obj in cell:
+        resources.release(obj)
+
+def clear_cells():
+    for cell in list(cells.values()) + list(pending_cells.values()):
+        remove_cell(cell)
+    cells.clear()
+    pending_cells.clear()
+    for group in chunk_groups.values():
+        resources.release(group)
+    chunk_groups.clear()
 
+'''
+UPDATE INSTANCED
+instanced mode: every chunk is one InstancedMesh for the surfaces and one
+LineSegments with an InstancedBufferGeometry for the edges. Both read the same
+per instance matrices, so a chunk is two draw calls. The cells are moved by
+update_chunks().
+parameters: stages: set of rebuild stages
+'''
+def update_instanced(stages):
+    for key in set(instanced_chunks) - set(chunk_keys):
+        release_instanced_chunk(instanced_chunks.pop(key))
+    for n, key in enumerate(chunk_keys):
+        if key not in instanced_chunks:
+            instanced_chunks[key] = create_instanced_chunk()
+        elif GEOMETRY in stages:
+            set_instanced_template(instanced_chunks[key], template)
+        if LAYOUT in stages:
+            count = int(chunk_starts[n + 1] - chunk_starts[n])
+            mesh, _, edges = instanced_chunks[key]
+            mesh.count = count
+            edges.instanceCount = count
 
+'''
+CREATE_INSTANCED_CHUNK
+the instance buffers have room for a full chunk, so they are allocated once
+returns: mesh, lines and the edges of the lines, as they were tracked'''
+def create_instanced_chunk():
+    capacity = CHUNK_CELLS * CHUNK_CELLS
+    mesh = resources.track(THREE.InstancedMesh.new(template[0], material, capacity), OBJECT, capacity * 64)
+    edges = resources.track(THREE.InstancedBufferGeometry.new(), GPU_GEOMETRY)
+    edges.setAttribute('position', template[1].getAttribute('position'))
+    edges.setIndex(template[1].index)
+    # share the matrices of the mesh, they are uploaded once for both
+    edges.setAttribute('instanceMatrix', mesh.instanceMatrix)
+    lines = resources.track(THREE.LineSegments.new(edges, instanced_line_material), OBJECT)
+    # the bounding sphere of one cell says nothing about the chunk, the
+    # chunk is culled by update_chunks()
+    mesh.frustumCulled = False
+    lines.frustumCulled = False
+    scene.add(mesh)
+    scene.add(lines)
+    return mesh, lines, edges
 
-'''UPDATE CYLINDERS: updates the cylinders if the used geometry is cylinder
+'''
+SET_INSTANCED_TEMPLATE
+swaps the shape of an instanced chunk
+parameters: chunk: from create_instanced_chunk(), shape: geometry and edges
+of a template
+'''
+def set_instanced_template(chunk, shape):
+    mesh, _, edges = chunk
+    mesh.geometry = shape[0]
+    edges.setAttribute('position', shape[1].getAttribute('position'))
+    edges.setIndex(shape[1].index)
+
+def release_instanced_chunk(chunk):
+    mesh, lines, edges = chunk
+    # the positions and the index belong to the template, disposing them
+    # here would throw away the buffers the template still uses
+    edges.deleteAttribute('position')
+    edges.setIndex(None)
+    resources.release(lines)
+    resources.release(edges)
+    resources.release(mesh)
+
+def clear_instanced():
+    for chunk in instanced_chunks.values():
+        release_instanced_chunk(chunk)
+    instanced_chunks.clear()
+
+# whether the grid is small enough for the per cell mode
+def fits_per_cell():
+    return geom_params.x <= PER_CELL_MAX and geom_params.y <= PER_CELL_MAX
+
+'''
+SET_INSTANCED
+switches between the per cell and the instanced mode, a grid larger than
+PER_CELL_MAX stays instanced
+parameters: value: bool, from the GUI checkbox
+'''
+def set_instanced(value):
+    global instanced, cell_keys, cell_centers, cell_tiers
+    if not value and not fits_per_cell():
+        value = True
+    view_params.instanced = bool(value)
+    if bool(value) == instanced:
+        return
+    instanced = bool(value)
+    clear_cells()
+    clear_instanced()
+    # nothing is on screen until the rebuild of the new mode is committed
+    cell_keys, cell_centers, cell_tiers = [], None, np.zeros(0, dtype=int)
+    set_chunks()
+    culler.set_spheres(np.zeros((0, 3)), np.zeros(0))
+    # the new mode has to be built from scratch
+    geom_params.touch()
+    scheduler.invalidate()
+
+'''
+SHOW_STATS
+writes the average frame time of the scheduler and the cache and memory
+counts into the GUI
 parameters: none
-returns: all wanted cylinders in the scene for the webapp
-'''
-def update_cylinders():
-    global cylinders_x, cylinders_y, cylinder_lines, material, line_material
-
-    # make sure you dont have 0 cylinders total
-    if len(cylinders_x) != 0 or len(cylinders_y) != 0:
-        if len(cylinders_x) != geom_params.x and len(cylinders_y) != geom_params.y:
-            # delete all cylinders 
-            for cylinder in cylinders_x:
-                scene.remove(cylinder)
-            for cylinder in cylinders_y:
-                scene.remove(cylinder)
-            # delete all lines 
-            for line in cylinder_lines: 
-                scene.remove(line)
-            
-            # place new cylinders. Same structure as used above, using a nested for loop
-            for i in range (geom_params.x):
-                # create and place the cylinder in GUI
-                geom = THREE.CylinderGeometry.new(geom_params.radius, geom_params.radius, geom_params.height, geom_params.radial_segments)
-                geom.translate (geom_params.radius*i*2,0,0)
-                geom.rotateX(math.radians(geom_params.rotation_x)/geom_params.x*i)
-                
-                cylinder = THREE.Mesh.new(geom, material)
-                cylinders_x.append(cylinder)
-                scene.add(cylinder)
-
-                #draw the cylinder lines
-                edges = THREE.EdgesGeometry.new(cylinder.geometry)
-                line = THREE.LineSegments.new(edges,line_material)
-                cylinder_lines.append(line)
-                # place cylinder in scene 
-                scene.add(line)
-                # inner for loop
-                for j in range(geom_params.y):
-                    geom = geom.clone()
-                    geom.translate(0, 0, geom_params.radius * 2)
-                    geom.rotateX(math.radians(geom_params.rotation_y) / geom_params.x * j)
-
-                    cylinder = THREE.Mesh.new(geom, material)
-                    cylinders_y.append(cylinder)
-                    scene.add(cylinder)
-
-                    # draw the cylinder lines
-                    edges = THREE.EdgesGeometry.new(cylinder.geometry)
-                    line = THREE.LineSegments.new(edges, line_material)
-                    cylinder_lines.append(line)
-                    scene.add(line)
-        else:
-            for i in range (len(cylinders_x)):
-                cylinder = cylinders_x[i]
-                line = cylinder_lines[i]
-                # place the capsule in GUI, are already there but are placedin a new way in x directon
-                geom = THREE.CylinderGeometry.new(geom_params.radius, geom_params.radius, geom_params.height, geom_params.radial_segments)
-                geom.translate (geom_params.radius*i*2,0,0)
-                geom.rotateX(math.radians(geom_params.rotation_x)/geom_params.x*i)
-    
-                cylinder.geometry = geom
-    
-                edges = THREE.EdgesGeometry.new(cylinder.geometry)
-                line.geometry = edges
-                for j in range(len(cylinders_y)):
-                    cylinder = cylinders_y[j]
-                    line = cylinder_lines[len(cylinders_x)+j]
-                    # place the capsule in GUI, are already there but are placedin a new way in y directon
-                    geom = THREE.CylinderGeometry.new(geom_params.radius, geom_params.radius,
-                                                    geom_params.height, geom_params.radial_segments)
-                    geom.translate(0,0, geom_params.radius * 2)
-                    geom.rotateX(math.radians(geom_params.rotation_y) / geom_params.y * j)
-
-                    cylinder.geometry = geom
-
-                    edges = THREE.EdgesGeometry.new(cylinder.geometry)
-                    line.geometry = edges
-                
-
-
-
-# Simple render and animate
-def render(*args):
-    window.requestAnimationFrame(create_proxy(render))
-    update_cylinders()
-    update_capsules()
-    controls.update()
-    composer.render()
-
-# Graphical post-processing
-def post_process():
-    render_pass = THREE.RenderPass.new(scene, camera)
-    render_pass.clearColor = THREE.Color.new(0,0,0)
-    render_pass.ClearAlpha = 0
-    fxaa_pass = THREE.ShaderPass.new(THREE.FXAAShader)
-
-    pixelRatio = window.devicePixelRatio
-
-    fxaa_pass.material.uniforms.resolution.value.x = 1 / ( window.innerWidth * pixelRatio )
-    fxaa_pass.material.uniforms.resolution.value.y = 1 / ( window.innerHeight * pixelRatio )
-   
-    global composer
-    composer = THREE.EffectComposer.new(renderer)
-    composer.addPass(render_pass)
-    composer.addPass(fxaa_pass)
-
-# Adjust display when window size changes
-def on_window_resize(event):
-
-    event.preventDefault()
-
-    global renderer
-    global camera
-    
-    camera.aspect = window.innerWidth / window.innerHeight
-    camera.updateProjectionMatrix()
-
-    renderer.setSize( window.innerWidth, window.innerHeight )
-
-    #post processing after resize
-    post_process()
+'''
+def show_stats():
+    view_params.frame_ms = round(scheduler.average_ms, 2)
+    view_params.templates = templates.report() + ", " + snapshots.report()
+    view_params.memory = resources.report()
+    view_params.triangles = triangle_report()
+    view_params.resolution = governor.report()
+    view_params.rebuild = rebuild.report()
+    view_params.chunks = culler.report()
+
+'''
+TRIANGLE_REPORT
+triangles drawn with the current tiers and chunks on screen compared to
+all cells with the finest tier
+returns: string for the GUI'''
+def triangle_report():
+    if not lod_keys or lod_keys[0] not in triangle_counts or len(culler) != len(chunk_keys):
+        return ""
+    full = triangle_counts[lod_keys[0]] * len(cell_tiers)
+    tiers = cell_tiers[culler.visible[cell_chunks]]
+    if not lod_enabled:
+        tiers = np.zeros_like(tiers)
+    counts = np.array([triangle_counts.get(key, 0) for key in lod_keys])
+    # a cell without a tier yet is drawn with the finest one
+    drawn = int(counts[np.maximum(tiers, 0)].sum())
+    return "{} / {} ({:.0f}%)".format(drawn, full, 100 * drawn / max(full, 1))
+
+
+'''
+SAVE_PENDING_TEMPLATE
+saves the committed template in the first frame without a rebuild, so
+neither the rebuild nor the input waits for localStorage
+parameters: finished: bool, a rebuild finished in this frame
+'''
+def save_pending_template(finished):
+    global snapshot_pending
+    if finished or rebuild.busy:
+        scheduler.invalidate()
+        return
+    with profiler.phase("snapshot"):
+        save_template(snapshot_pending)
+    snapshot_pending = None
+
+'''
+EXPORT_TRACE
+saves the recorded frames as a Chrome trace file
+parameters: none
+'''
+def export_trace(*args):
+    download_trace(profiler, "webapp_1-trace.json")
+
+'''
+LOG_FFI_REPORT
+writes the crossings of the boundary per call site to the browser console
+parameters: none
+'''
+def log_ffi_report(*args):
+    console.log(ffi.report())
+
+# Simple render, called by the runtime when the frame is outdated
+def render():
+    show_stats()
+    if not instanced and not fits_per_cell():
+        set_instanced(True)
+    with profiler.phase("update_grid"):
+        finished = rebuild.step()
+        if finished:
+            profiler.sample("rebuild latency ms", rebuild.latency_ms)
+        if rebuild.busy:
+            scheduler.invalidate()
+    if snapshot_pending is not None:
+        save_pending_template(finished)
+    with profiler.phase("culling"):
+        update_chunks()
+    with profiler.phase("update_lod"):
+        update_lod()
+    with profiler.phase("controls"):
+        controls.update()
+    with profiler.phase("composer"):
+        runtime.render_scene()
+
 #-----------------------------------------------------------------------
 #RUN THE MAIN PROGRAM
 if __name__=='__main__':
     main()
-    
\ No newline at end of file
@@ -1,31 +1,49 @@
+# Import the shared runtime first, it sets up the profilers before `js` is imported
+from runtime import Runtime, page_profiler, page_snapshots, ffi
 # Import javascript modules
 from js import THREE, window, document, Object, console
 # Import pyscript / pyodide modules
 from pyodide.ffi import create_proxy, to_js
 # Import python module
 import math
+import numpy as np
+# Import local modules
+from lsystem import (TREE, TREE_RULES, SUBTREE_LEVELS, STEP, TURN_ANGLE, coordinate_offset, turtle_bounds,
+                     forest_instances)
+from forest_builder import tree_offsets, tree_levels, forest_chunks
+from lod import LodSelector, projected_sizes
+from spatial_chunks import ChunkCuller, tile_chunks, chunk_order, chunk_spheres
+from profiler_hud import download_trace
+
+#-----------------------------------------------------------------------
+# PROFILING
+# times the startup from the start of the page load and the phases of every frame
+profiler = page_profiler()
+# count every proxy that is created, a steady page creates none per frame
+create_proxy = profiler.counted("proxies", create_proxy)
+if ffi is not None:
+    ffi.attach(profiler)
+
+# the forest of an earlier page load with the same trees is loaded, not built
+snapshots = page_snapshots("webapp_2")
+
+# milliseconds of a frame that building the forest may take
+BUILD_BUDGET_MS = 8
+# pixel radii of a tree on screen below which it drops one more depth
+TREE_LOD_THRESHOLDS = (400, 200, 100, 50, 25, 12)
+# edge length of the square tiles of the ground the trees are chunked by
+TREE_CHUNK_SIZE = 500
 
 #-----------------------------------------------------------------------
 # MAIN FUNCTION
 def main():
     #-----------------------------------------------------------------------
     # VISUAL SETUP
-    # Declare the global variables
-    global renderer, scene, camera, controls,composer
-    
-    #Set up the renderer
-    renderer = THREE.WebGLRenderer.new()
-    renderer.setPixelRatio( window.devicePixelRatio )
-    renderer.setSize(window.innerWidth, window.innerHeight)
-    document.body.appendChild(renderer.domElement)
-
-    # Set up the scene
-    scene = THREE.Scene.new()
-    back_color = THREE.Color.new(0.1,0.1,0.1)
-    scene.background = back_color
-    camera = THREE.PerspectiveCamera.new(75, window.innerWidth/window.innerHeight, 0.1, 1000)
-    camera.position.z = 50
-    scene.add(camera)
+    # renderer, scene, camera and frame loop are shared with webapp_1
+    global runtime, renderer, scene, camera, controls, scheduler, hud
+    runtime = Runtime(profiler, background=(0.1, 0.1, 0.1))
+    renderer, scene, camera = runtime.renderer, runtime.scene, runtime.camera
+    scheduler, hud = runtime.scheduler, runtime.hud
 
     #create a plane to make visualization more three dimensional
     geometry = THREE.PlaneGeometry.new(2000, 2000)
@@ -39,13 +57,7 @@ def main():
     plane.receiveShadow = True
     scene.add(plane)
 
-    # Graphic Post Processing
-    global composer
-    post_process()
-
-    # Set up responsive window
-    resize_proxy = create_proxy(on_window_resize)
-    window.addEventListener('resize', resize_proxy) 
+    profiler.lap("renderer")
 
     #-----------------------------------------------------------------------
     # Geometry Creation
@@ -59,217 +71,370 @@ def main():
     max_it = 1
     number_trees = 5
     tree_height = 2
+    # every tree as (axiom, height, base point), drawn together after the loop
+    global forest_specs
+    forest_specs = []
     for tree in range(0, number_trees):
-        # create coordinate string
-        coordinate_string = translate_coordinates(0, max_it, "gh")
-        # translate the string into the coordinates for the 3d model
-        g, h = use_coordinates(coordinate_string)
-        # draw the tree
-        my_axiom_system = system(0, tree_height, "d")
-        draw_system((my_axiom_system), THREE.Vector3.new(g,-20,h))
+        # refuse a tree that is too large before anything is expanded
+        TREE.check_size("d", tree_height)
+        # the coordinates of "gh" after max_it iterations, counted from the
+        # rules instead of walking the expanded string
+        g, h = coordinate_offset("gh", max_it)
+        forest_specs.append(("d", tree_height, (g, -20, h)))
         
         # same tree setup, but placing it in negative coordinates
-        # create coordinate string with i and k to get negative value
-        coordinate_string = translate_coordinates(0, max_it, "ik")
-        # translate the string into the coordinates for the 3d model
-        g, h = use_coordinates(coordinate_string)
-        # draw the tree
-        my_axiom_system = system(0, tree_height, "d")
-        draw_system((my_axiom_system), THREE.Vector3.new(g,-20,h))
+        # i and k give negative values
+        g, h = coordinate_offset("ik", max_it)
+        forest_specs.append(("d", tree_height, (g, -20, h)))
 
         # increase variables for next round of loop
         max_it = max_it + 1
         tree_height = tree_height + 1
 
+    # the same line material for both modes, the instanced one reads one
+    # matrix per instance
+    global line_material, instanced_line_material
+    line_material = THREE.LineBasicMaterial.new( THREE.Color.new(0x0000ff))
+    instanced_line_material = line_material.clone()
+    instanced_line_material.defines = Object.fromEntries(to_js({"USE_INSTANCING": ""}))
+    # repeated trees and subtrees are drawn once and placed by instancing,
+    # the 'i' key switches to one buffer with every branch
+    global instanced_trees, forest_objects, forest_build, tree_geoms, tree_rows, tree_counts
+    instanced_trees = True
+    forest_objects = []
+    forest_build = None
+    tree_geoms = []
+    tree_rows = []
+    tree_counts = np.zeros(0, dtype=int)
+    # in the buffer mode far trees are drawn without their deepest branches,
+    # the 'l' key switches this off
+    global tree_lod, tree_lod_enabled
+    tree_lod = LodSelector(TREE_LOD_THRESHOLDS)
+    tree_lod_enabled = True
+    # the trees are grouped into chunks by their base point, the chunks that
+    # are off screen are hidden and skipped by the level of detail
+    global culler, chunk_groups, tree_chunks, chunk_segments
+    culler = ChunkCuller()
+    chunk_groups = []
+    tree_chunks = np.zeros(0, dtype=int)
+    chunk_segments = np.zeros(0, dtype=int)
+    build_forest()
+    profiler.lap("trees")
+
 
     #-----------------------------------------------------------------------
     # USER INTERFACE
     # Set up Mouse orbit control
     controls = THREE.OrbitControls.new(camera, renderer.domElement)
+    controls.addEventListener('change', create_proxy(scheduler.invalidate))
+
+    # frame profiler, 'h' shows the HUD and 't' saves a Chrome trace
+    # 'i' switches between instanced subtrees and one buffer, 'l' the level
+    # of detail of the trees in the buffer, 'f' logs the crossings of the
+    # boundary with ?ffi in the url
+    document.addEventListener('keydown', create_proxy(on_key_down))
     
     #-----------------------------------------------------------------------
     # RENDER + UPDATE THE SCENE AND GEOMETRIES
-    render()
+    # the post-processing is loaded behind the first frame
+    runtime.start(render)
     
 #-----------------------------------------------------------------------
 # HELPER FUNCTIONS
-''' GENERATE_COORDINATES
-define rules for coordinates for draw_system. a helper function
-that is used in the recursive function translate_coordinates()
-parameters: symbol: input string symbol to generate output string
-returns: output string'''
-def generate_coordinates(symbol):
-    if symbol == "g":
-        return "gg"
-    elif symbol == "h":
-        return "hh"
-    if symbol == "i":
-        return "ii"
-    elif symbol == "k":
-        return "kk"
-
 '''
-TRANSLATE_COORDINATES
-a recursive function that creates a string of coordinates for later
-tree creation.
-parameters:
-current_iteration: int, initially 0
-max_iterations: int, defining how many recursive calls we want
-axiom: string, axiom to start the string creation with
+DRAW_INSTANCES
+draws one subtree at every placement with a single draw call, the vertices
+are uploaded once and every placement is one matrix
+parameters: vertices: float32 array (2 * branches, 3) of the subtree
+matrices: float32 array (instances, 4, 4) from lsystem.forest_instances()
+parent: the Group of the chunk, the scene if None
+returns: the LineSegments object'''
+def draw_instances(vertices, matrices, parent=None):
+    subtree_geom = THREE.InstancedBufferGeometry.new()
+    subtree_geom.setAttribute('position', THREE.BufferAttribute.new(to_js(vertices.ravel()), 3))
+    subtree_geom.setAttribute('instanceMatrix', THREE.InstancedBufferAttribute.new(to_js(matrices.ravel()), 16))
+    subtree_geom.instanceCount = len(matrices)
+    subtrees = THREE.LineSegments.new(subtree_geom, instanced_line_material)
+    # the bounding sphere of one subtree says nothing about its instances
+    subtrees.frustumCulled = False
+    (scene if parent is None else parent).add(subtrees)
+    return subtrees
+
 '''
-def translate_coordinates(current_iteration, max_iterations, axiom):
-    current_iteration += 1
-    new_axiom = ""
-    for symbol in axiom:
-        new_axiom += generate_coordinates(symbol)
-    if current_iteration >= max_iterations:
-        return new_axiom
-    else:
-        return translate_coordinates(current_iteration, max_iterations, new_axiom)
+BUILD_FOREST
+starts drawing the trees of forest_specs, as instanced subtrees or as one
+buffer. The trees are built over the next frames by step_forest().
+parameters: none'''
+def build_forest():
+    global forest_build, forest_filled, forest_segments
+    clear_forest()
+    forest_filled = 0
+    forest_segments = int(tree_offsets(forest_specs)[-1]) // 2
+    set_chunks(forest_specs)
+    forest_build = place_subtrees(forest_specs) if instanced_trees else grow_forest(forest_specs)
+    scheduler.invalidate()
+
 '''
-USE_COORDINATES
-function that uses the previously created axiom for coordinate creation.
-parameters: axiom: string
-returns: start_g: int, to be used for tree placement on x-axis
-start_h: int, to be used for tree placement on second axis'''
-def use_coordinates(axiom):
-    start_g = 0
-    start_h = 0
-    for symbol in axiom:
-        if symbol == "g":
-            start_g = start_g + 25
-        if symbol == "h":
-            start_h = start_h + 10
-        if symbol == "i":
-            start_g = start_g - 25
-        if symbol == "k":
-            start_h = start_h - 10
-    return start_g, start_h
+SET_CHUNKS
+puts the trees into chunks by their base point, one Group per chunk, and
+gives the culler the bounding spheres of the chunks
+parameters: specs: list of (axiom, depth, base point)'''
+def set_chunks(specs):
+    global tree_chunks, chunk_segments
+    bases = np.array([base for _, _, base in specs], dtype=np.float64).reshape(-1, 3)
+    keys, tree_chunks = tile_chunks(bases[:, [0, 2]], TREE_CHUNK_SIZE)
+    order, starts = chunk_order(tree_chunks, len(keys))
+    centers, radii = tree_spheres(specs)
+    culler.set_spheres(*chunk_spheres(centers[order], radii[order], starts))
+    for _ in keys:
+        group = THREE.Group.new()
+        scene.add(group)
+        chunk_groups.append(group)
+    chunk_segments = np.zeros(len(keys), dtype=int)
 
+'''
+PLACE_SUBTREES
+draws the instanced subtrees of every chunk one after another, every chunk
+places its own subtrees
+parameters: specs: list of (axiom, depth, base point)
+returns: generator, one step per subtree'''
+def place_subtrees(specs):
+    for chunk, group in enumerate(chunk_groups):
+        chunk_specs = [spec for spec, n in zip(specs, tree_chunks) if n == chunk]
+        for vertices, matrices in chunk_instances(chunk_specs):
+            forest_objects.append(draw_instances(vertices, matrices, group))
+            chunk_segments[chunk] += len(vertices) // 2 * len(matrices)
+            yield
 
-#-----------------------------------------------------------------------
 '''
-GENERATE
-define the rules to be used in recursive function
-params: symbol: string
-returns: string or symbol (string)'''
-def generate(symbol):
-    if symbol == "d":
-        return "abcdfbedfabedfcd"
-    elif symbol == "a":
-        return "aa"
-    elif symbol == "b" or symbol == "c" or symbol == "e" or symbol == "f":
-        return symbol
-    
-'''SYSTEM
-A recursive function, which taken an AXIOM as an inout and runs the generate function for each symbol
+CHUNK_INSTANCES
+the subtrees of some trees and their placements, from the snapshot of the
+same trees or placed and saved
+parameters: specs: list of (axiom, depth, base point)
+returns: list of (vertices, matrices) like lsystem.forest_instances()'''
+def chunk_instances(specs):
+    params = forest_params(specs)
+    saved = snapshots.get("subtrees", params)
+    if saved is not None:
+        return [(saved["vertices {}".format(n)], saved["matrices {}".format(n)])
+                for n in range(len(saved.buffers) // 2)]
+    instances = list(forest_instances(specs).values())
+    buffers = {}
+    for n, (vertices, matrices) in enumerate(instances):
+        buffers["vertices {}".format(n)] = vertices
+        buffers["matrices {}".format(n)] = matrices
+    snapshots.put("subtrees", params, buffers)
+    return instances
+
 '''
-def system(current_iteration, max_iterations, axiom):
-    current_iteration += 1
-    new_axiom = ""
-    for symbol in axiom:
-        new_axiom += generate(symbol)
-    if current_iteration >= max_iterations:
-        return new_axiom
+GROW_FOREST
+builds the forest buffer piece by piece. The buffer on the GPU is allocated
+once in its final size and every piece is copied behind the previous one.
+Every tree is its own LineSegments on a slice of the buffer, its branches are
+ordered by depth, so its draw range grows while it is built and is cut
+short by update_tree_lod() when the tree is far away. Every tree is added to
+the Group of its chunk.
+A forest that was built before comes from its snapshot and is uploaded in one
+step, a new one is saved as a snapshot once it is built.
+parameters: specs: list of (axiom, depth, base point)
+returns: generator, one step per piece'''
+def grow_forest(specs):
+    global forest_position, forest_filled, tree_geoms, tree_starts, tree_rows, tree_tiers
+    global tree_centers, tree_radii, tree_counts
+    offsets = tree_offsets(specs)
+    tree_starts = offsets[:-1]
+    params = forest_params(specs)
+    saved = snapshots.get("forest", params)
+    if saved is not None:
+        tree_rows = np.split(saved["levels"], np.cumsum(saved["level_counts"])[:-1])
+        tree_centers, tree_radii = saved["centers"], saved["radii"]
     else:
-        return system(current_iteration, max_iterations, new_axiom)
+        # the vertices of every tree up to each depth
+        tree_rows = tree_levels(specs)
+        # the buffer is still empty, the bounding spheres come from the rules
+        tree_centers, tree_radii = tree_spheres(specs)
+    tree_tiers = np.full(len(specs), -1)
+    tree_counts = np.full(len(specs), -1)
+    forest_position = THREE.Float32BufferAttribute.new(int(offsets[-1]) * 3, 3)
+    forest_position.setUsage(THREE.DynamicDrawUsage)
+    tree_geoms = []
+    for chunk, center, radius in zip(tree_chunks.tolist(), tree_centers, tree_radii):
+        tree_geom = THREE.BufferGeometry.new()
+        tree_geom.setAttribute('position', forest_position)
+        tree_geom.setDrawRange(0, 0)
+        tree_geom.boundingSphere = THREE.Sphere.new(THREE.Vector3.new(*center), float(radius))
+        tree = THREE.LineSegments.new(tree_geom, line_material)
+        chunk_groups[chunk].add(tree)
+        forest_objects.append(tree)
+        tree_geoms.append(tree_geom)
+    yield
+    if saved is not None:
+        forest_position.array.set(to_js(saved["vertices"].ravel()), 0)
+        forest_filled = len(saved["vertices"])
+        return
+    # a copy in python for the snapshot, the buffer in javascript is not read back
+    built = np.empty((int(offsets[-1]), 3), dtype=np.float32)
+    for offset, vertices in forest_chunks(specs):
+        forest_position.array.set(to_js(vertices.ravel()), offset * 3)
+        built[offset:offset + len(vertices)] = vertices
+        forest_filled = offset + len(vertices)
+        yield
+    snapshots.put("forest", params, {
+        "vertices": built, "levels": np.concatenate(tree_rows),
+        "level_counts": np.array([len(rows) for rows in tree_rows]),
+        "centers": tree_centers, "radii": tree_radii})
 
 '''
-DRAW_SYSTEM'''
-def draw_system(axiom, initial_point):
-    # generate move_vec
-    move_vec = THREE.Vector3.new(0,15,0)
-    # empty list creation
-    old_states = []
-    old_move_vecs = []
-    lines = []
-
-    # for each symbol in our generated axiom, fulfill the respective task
-    for symbol in axiom:
-        # draws one branch of the tree
-        if symbol == "a" or symbol == "d":
-            start_point = THREE.Vector3.new(initial_point.x, initial_point.y, initial_point.z)
-            end_point = THREE.Vector3.new(initial_point.x, initial_point.y, initial_point.z)
-            end_point = end_point.add(move_vec)
-            line = []
-            line.append(start_point)
-            line.append(end_point)
-            lines.append(line)
-
-            initial_point = end_point
+FOREST_PARAMS
+everything the vertices of the forest depend on, the key of its snapshot
+parameters: specs: list of (axiom, depth, base point)
+returns: dictionary'''
+def forest_params(specs):
+    return {"specs": [[axiom, int(depth), [float(x) for x in base]] for axiom, depth, base in specs],
+            "rules": TREE_RULES, "split": SUBTREE_LEVELS, "step": list(STEP), "turn_angle": TURN_ANGLE}
 
-        # b saves current status
-        elif symbol == "b":
-            old_state = THREE.Vector3.new(initial_point.x, initial_point.y, initial_point.z)
-            old_move_vec = THREE.Vector3.new(move_vec.x, move_vec.y, move_vec.z)
-            old_states.append(old_state)
-            old_move_vecs.append(old_move_vec)
-
-        # applies a rotation to move_vec
-        elif symbol == "c": 
-            move_vec.applyAxisAngle(THREE.Vector3.new(0,0,1), math.pi/7)
-        # applies a rotation to move_vec
-        elif symbol == "e":
-            move_vec.applyAxisAngle(THREE.Vector3.new(0,0,1), -math.pi/7)
-        
-        # moves initial point to previous status 
-        elif symbol == "f":
-            initial_point = THREE.Vector3.new(old_states[-1].x, old_states[-1].y, old_states[-1].z)
-            move_vec = THREE.Vector3.new(old_move_vecs[-1].x, old_move_vecs[-1].y, old_move_vecs[-1].z)
-            old_states.pop(-1)
-            old_move_vecs.pop(-1)
-    # define global scene
-    global scene
-    # draw the previously generated lines to create a tree
-    line_material = THREE.LineBasicMaterial.new( THREE.Color.new(0x0000ff))
-    for points in lines:
-        line_geom = THREE.BufferGeometry.new()
-        points = to_js(points)
-        console.log(points)
-
-        line_geom.setFromPoints(points)
-        vis_line = THREE.Line.new(line_geom, line_material)
-        # add our tree
-        scene.add(vis_line)
+'''
+TREE_SPHERES
+bounding spheres of the trees, from the boxes of lsystem.turtle_bounds()
+parameters: specs: list of (axiom, depth, base point)
+returns: float arrays of the centers (n, 3) and the radii (n,)'''
+def tree_spheres(specs):
+    # trees of the same height have the same box around their base point
+    boxes = {}
+    for axiom, depth, _ in specs:
+        if (axiom, depth) not in boxes:
+            boxes[(axiom, depth)] = turtle_bounds(axiom, depth) or ((0, 0, 0), (0, 0, 0))
+    low = np.array([np.add(boxes[(axiom, depth)][0], base) for axiom, depth, base in specs], dtype=np.float64)
+    high = np.array([np.add(boxes[(axiom, depth)][1], base) for axiom, depth, base in specs], dtype=np.float64)
+    centers = (low + high) / 2
+    return centers, np.linalg.norm(high - centers, axis=1)
 
-# Simple render and animate
-def render(*args):
-    window.requestAnimationFrame(create_proxy(render))
-    #controls.update()
-    composer.render()
+'''
+STEP_FOREST
+runs the build of the forest for a part of the frame, at least one step.
+The pieces of this frame are uploaded together, as one update range of the
+position buffer.
+parameters: none'''
+def step_forest():
+    global forest_build
+    start = forest_filled
+    while True:
+        try:
+            next(forest_build)
+        except StopIteration:
+            forest_build = None
+            break
+        if scheduler.budget_ms - scheduler.remaining_ms() > BUILD_BUDGET_MS:
+            break
+    if forest_filled > start:
+        forest_position.updateRange.offset = start * 3
+        forest_position.updateRange.count = (forest_filled - start) * 3
+        forest_position.needsUpdate = True
+        set_tree_ranges()
+    if forest_build is not None:
+        scheduler.invalidate()
 
-# Graphical post-processing
-def post_process():
-    render_pass = THREE.RenderPass.new(scene, camera)
-    render_pass.clearColor = THREE.Color.new(0,0,0)
-    render_pass.ClearAlpha = 0
-    fxaa_pass = THREE.ShaderPass.new(THREE.FXAAShader)
+'''
+UPDATE_CHUNKS
+hides the chunks that left the frustum and shows the ones that entered it
+parameters: none'''
+def update_chunks():
+    for n in culler.update(runtime.view_projection()).tolist():
+        chunk_groups[n].visible = bool(culler.visible[n])
+    profiler.sample("chunks", culler.visible_count)
+    profiler.sample("chunks full", len(culler))
 
-    pixelRatio = window.devicePixelRatio
+'''
+UPDATE_TREE_LOD
+chooses the depth every tree is drawn to from its size on screen, every
+tier drops the deepest level of branches that is left. Only the draw ranges
+change, nothing is rebuilt or uploaded. The trees of chunks that are off
+screen keep their tier.
+parameters: none'''
+def update_tree_lod():
+    global tree_tiers
+    if instanced_trees or not tree_lod_enabled:
+        return
+    shown = culler.visible[tree_chunks]
+    if not shown.any():
+        return
+    eye = camera.position.toArray().to_py()
+    sizes = projected_sizes(tree_centers[shown], eye, tree_radii[shown], camera.fov, window.innerHeight)
+    tiers = tree_tiers.copy()
+    tiers[shown] = tree_lod.select(sizes, tree_tiers[shown], max(len(rows) - 1 for rows in tree_rows))
+    if not np.array_equal(tiers, tree_tiers):
+        tree_tiers = tiers
+        set_tree_ranges()
 
-    fxaa_pass.material.uniforms.resolution.value.x = 1 / ( window.innerWidth * pixelRatio )
-    fxaa_pass.material.uniforms.resolution.value.y = 1 / ( window.innerHeight * pixelRatio )
-   
-    global composer
-    composer = THREE.EffectComposer.new(renderer)
-    composer.addPass(render_pass)
-    composer.addPass(fxaa_pass)
+'''
+SET_TREE_RANGES
+draws every tree up to the vertices that are built and its tier allows
+parameters: none'''
+def set_tree_ranges():
+    for n, (start, rows, tier) in enumerate(zip(tree_starts, tree_rows, tree_tiers)):
+        count = min(max(forest_filled - int(start), 0), int(rows[-1]))
+        if tree_lod_enabled and tier > 0:
+            # the trunk is always drawn
+            count = min(count, int(rows[max(1, len(rows) - 1 - tier)]))
+        if count != tree_counts[n]:
+            tree_geoms[n].setDrawRange(int(start), count)
+            tree_counts[n] = count
 
-# Adjust display when window size changes
-def on_window_resize(event):
+'''
+SAMPLE_SEGMENTS
+the branches of the chunks on screen that are drawn in this frame and the
+branches of the whole forest, as samples of the profiler
+parameters: none'''
+def sample_segments():
+    if instanced_trees:
+        drawn = int(chunk_segments[culler.visible].sum())
+    else:
+        drawn = int(tree_counts[culler.visible[tree_chunks]].sum()) // 2
+    profiler.sample("segments", drawn)
+    profiler.sample("segments full", forest_segments)
 
-    event.preventDefault()
+def clear_forest():
+    for obj in forest_objects:
+        obj.removeFromParent()
+        obj.geometry.dispose()
+    forest_objects.clear()
+    for group in chunk_groups:
+        group.removeFromParent()
+    chunk_groups.clear()
 
-    global renderer
-    global camera
-    
-    camera.aspect = window.innerWidth / window.innerHeight
-    camera.updateProjectionMatrix()
+# Simple render, called by the runtime when the frame is outdated
+def render():
+    #controls.update()
+    if forest_build is not None:
+        with profiler.phase("build_forest"):
+            step_forest()
+    with profiler.phase("culling"):
+        update_chunks()
+    with profiler.phase("update_lod"):
+        update_tree_lod()
+    with profiler.phase("composer"):
+        runtime.render_scene()
+    sample_segments()
 
-    renderer.setSize( window.innerWidth, window.innerHeight )
+# Keyboard shortcuts of the profiler
+def on_key_down(event):
+    if event.key == 'h':
+        hud.toggle()
+    elif event.key == 't':
+        download_trace(profiler, "webapp_2-trace.json")
+    elif event.key == 'i':
+        global instanced_trees
+        instanced_trees = not instanced_trees
+        build_forest()
+    elif event.key == 'f' and ffi is not None:
+        console.log(ffi.report())
+    elif event.key == 'l':
+        global tree_lod_enabled
+        tree_lod_enabled = not tree_lod_enabled
+        if not instanced_trees:
+            set_tree_ranges()
+        scheduler.invalidate()
 
-    #post processing after resize
-    post_process()
 #-----------------------------------------------------------------------
 
 if __name__=='__main__':